@@ -0,0 +1,309 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import disambiguate
+import make_tr
+import prepare
+import process_dump
+from hyperparameters import sample, metaheuristic, combine, score
+from hyphenator import matcher
+from hyphenator.hyphenator import Hyphenator
+from train_test import NFoldCrossValidator
+
+# bundled datasets: directory within data/ -> (wordlist, shipped patterns or None if patterns are generated)
+DATASETS = {
+    "cs/cshyphen_ujc": ("cs-lemma-ujc-1.wlh", None),
+    "is/hyphenation-is": ("hyph_is_list.wlh", "hyph_is.pat"),
+    "th/orchid": ("orchid.wlh", None),
+    "uk/wiktionary": ("uk-full-wiktionary.wlh", None),
+}
+
+# metric -> True if higher values are better
+METRICS = {
+    "words_per_second": True,
+    "seconds": False,
+    "peak_bytes": False,
+}
+
+
+def measure(func, words: int = None, repeat: int = 3, memory: bool = True):
+    """
+    Run benchmarked function repeatedly and measure it
+    :param func: function without arguments
+    :param words: number of words processed by one call of the function, None if not applicable
+    :param repeat: number of timed runs, the fastest one is reported
+    :param memory: run the function once more under tracemalloc to measure its peak memory
+    :return: dictionary of ('seconds', 'words', 'words_per_second', 'peak_bytes'), only measured values are present
+    """
+    result = dict()
+    best = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    result["seconds"] = best
+    if words is not None:
+        result["words"] = words
+        result["words_per_second"] = words / best if best > 0 else 0.0
+    if memory:
+        # tracing slows the function down considerably, so the peak is measured in a separate untimed run
+        tracemalloc.start()
+        try:
+            func()
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def copy_lines(source: str, target: str, limit: int = 0, skip=None):
+    """
+    Copy beginning of a text file
+    :param source: path to file to be copied
+    :param target: path to the copy
+    :param limit: maximal number of copied lines, 0 for all
+    :param skip: function selecting lines not to be copied, None to copy all lines
+    :return: number of copied lines
+    """
+    copied = 0
+    with open(source) as src, open(target, "w") as dst:
+        for line in src:
+            if skip is not None and skip(line):
+                continue
+            dst.write(line)
+            copied += 1
+            if copied == limit:
+                break
+    return copied
+
+
+def read_words(wordlist: str):
+    """
+    Load wordlist into memory so that benchmarks do not measure disk access
+    :param wordlist: path to wordlist
+    :return: list of stripped lines
+    """
+    with open(wordlist) as wl:
+        return [line.strip() for line in wl if line.strip()]
+
+
+def dump_entries(words: list, hyphenation_mark: str = "-"):
+    """
+    Create synthetic Wiktionary entries from hyphenated words, hyphenation is wrapped in the same way as in the dump
+    :param words: hyphenated words
+    :param hyphenation_mark: string used as hyphenation mark
+    :return: list of (base word, hyphenation string)
+    """
+    entries = []
+    for word in words:
+        base = word.replace(hyphenation_mark, "").lower()
+        entries.append((base, word.replace(hyphenation_mark, "‧").lower()))
+    return entries
+
+
+def parse_dump_entries(entries: list, lang: str = "cs"):
+    """
+    Run the per-entry part of Wiktionary dump processing
+    :param entries: list of (base word, hyphenation string) as returned by dump_entries
+    :param lang: language whose processing rules are used (it and ru resolve accents)
+    """
+    for base, hyphenations in entries:
+        process_dump.entry_hyphenations({"word": base, "hyphenation": hyphenations}, lang)
+
+
+def hyphenate_words(hyphenator: Hyphenator, words: list):
+    """
+    Find hyphenation points of every word, bypassing the word cache
+    :param hyphenator: hyphenator to benchmark
+    :param words: list of words
+    """
+    for word in words:
+        hyphenator.hyphenate_mask(word)
+
+
+def train_model(wordlist: str, translate_file: str, params: str):
+    """
+    Create model generating patterns in-process with hyperparameters from file
+    :param wordlist: path to wordlist
+    :param translate_file: path to translate file
+    :param params: path to hyperparameter file
+    :return: SimpleCombiner object
+    """
+    scorer = score.LiangScorer(wordlist, translate_file)
+    meta = metaheuristic.NoMetaheuristic(scorer, sample.FileSampler(params))
+    return combine.SimpleCombiner(meta)
+
+
+def bench_dataset(name: str, data_dir: str, work_dir: str, params: str, limit: int, repeat: int, memory: bool, folds: int):
+    """
+    Run all benchmarks on one dataset
+    :param name: dataset name (<lang>/<dataset>)
+    :param data_dir: directory with bundled datasets
+    :param work_dir: directory for temporary files of the dataset
+    :param params: path to hyperparameter file used for pattern generation
+    :param limit: maximal number of wordlist lines used, 0 for all
+    :param repeat: number of timed runs of each benchmark
+    :param memory: measure peak memory
+    :param folds: number of folds of the cross-validation, one of them is benchmarked
+    :return: dictionary of benchmark name -> measured values
+    """
+    wordlist_name, shipped_patterns = DATASETS[name]
+    os.makedirs(work_dir, exist_ok=True)
+    results = dict()
+
+    raw = f"{work_dir}/{wordlist_name}"
+    copy_lines(f"{data_dir}/{name}/{wordlist_name}", raw, limit)
+    wordlist = raw[:-len(".wlh")] + "_dis.wlh"
+    raw_words = len(read_words(raw))
+
+    results["disambiguate"] = measure(lambda: disambiguate.disambiguate(raw, outfile=wordlist), raw_words, repeat, memory)
+    words = read_words(wordlist)
+    tr_args = argparse.Namespace(wordlist=wordlist, hyphmark="-", left_hyphen_min=None, right_hyphen_min=None)
+    results["make_tr"] = measure(lambda: make_tr.main(tr_args), len(words), repeat, memory)
+    translate_file = wordlist + ".tra"
+    # the same outputs in a single pass, written aside so that the benchmarked ones are kept
+    prepared = f"{work_dir}/prepared_dis.wlh"
+    results["prepare"] = measure(lambda: prepare.prepare(raw, outfile=prepared), raw_words, repeat, memory)
+
+    entries = dump_entries(words)
+    results["process_dump"] = measure(lambda: parse_dump_entries(entries), len(entries), repeat, memory)
+    results["process_dump_accents"] = measure(lambda: parse_dump_entries(entries, "it"), len(entries), repeat, memory)
+
+    patterns = f"{work_dir}/patterns.pat"
+    if shipped_patterns is not None:
+        # header lines (encoding, hyphen minima) are not patterns
+        copy_lines(f"{data_dir}/{name}/{shipped_patterns}", patterns, skip=lambda line: " " in line or line.isupper())
+    else:
+        model = train_model(wordlist, translate_file, params)
+
+        def train():
+            model.reset()
+            generated, _ = model.run(work_dir)
+            os.replace(generated, patterns)
+
+        results["train"] = measure(train, len(words), 1, memory)
+
+    results["load_trie"] = measure(lambda: Hyphenator(patterns, translate_file=translate_file), None, repeat, memory)
+    results["load_compiled"] = measure(
+        lambda: Hyphenator(patterns, translate_file=translate_file, compiled=True), None, repeat, memory
+    )
+    cache_dir = f"{work_dir}/ctrie"
+    Hyphenator(patterns, translate_file=translate_file, cache=True, cache_dir=cache_dir)
+    results["load_cached"] = measure(
+        lambda: Hyphenator(patterns, translate_file=translate_file, cache=True, cache_dir=cache_dir), None,
+        repeat, memory
+    )
+
+    for engine in matcher.MATCHERS:
+        hyphenator = Hyphenator(patterns, translate_file=translate_file, compiled=True, engine=engine)
+        results[f"hyphenate_{engine}"] = measure(lambda: hyphenate_words(hyphenator, words), len(words), repeat, memory)
+
+    validator = NFoldCrossValidator(train_model("", translate_file, params), translate_file, folds)
+    results["validate"] = measure(lambda: validator.validate_patterns(wordlist, patterns), len(words), repeat, memory)
+
+    validator.fold_files(wordlist)
+    results["fold"] = measure(lambda: validator.validate_fold(wordlist, 0), len(words), 1, memory)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """
+    Compare results with baseline, values worse by more than the threshold are regressions
+    :param results: benchmark results as written by this script
+    :param baseline: baseline results in the same format
+    :param threshold: tolerated relative change, e.g. 0.1 for 10 %
+    :return: list of (dataset, benchmark, metric, baseline value, new value, relative change, is regression)
+    """
+    rows = []
+    for dataset, benchmarks in results["results"].items():
+        for bench, values in benchmarks.items():
+            old_values = baseline.get("results", dict()).get(dataset, dict()).get(bench, dict())
+            for metric, higher_better in METRICS.items():
+                if metric not in values or not old_values.get(metric):
+                    continue
+                old, new = old_values[metric], values[metric]
+                change = (new - old) / old
+                worse = -change if higher_better else change
+                rows.append((dataset, bench, metric, old, new, change, worse > threshold))
+    return rows
+
+
+if __name__ == "__main__":
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--datasets", type=str, nargs="+", default=list(DATASETS), choices=list(DATASETS), help="Datasets to benchmark")
+    parser.add_argument("--data", type=str, default=f"{scripts_dir}/../data", required=False, help="Directory with bundled datasets")
+    parser.add_argument("-p", "--params", type=str, default="", required=False, help="Hyperparameters of pattern generation, <data>/patgen_params.in by default")
+    parser.add_argument("-l", "--limit", type=int, default=10000, required=False, help="Number of wordlist lines used from each dataset, 0 for all")
+    parser.add_argument("-r", "--repeat", type=int, default=3, required=False, help="Number of timed runs of each benchmark, the fastest one is reported")
+    parser.add_argument("-n", "--nfold", type=int, default=10, required=False, help="Number of folds of the benchmarked cross-validation fold")
+    parser.add_argument("--no-memory", action="store_true", help="Do not measure peak memory")
+    parser.add_argument("-o", "--outfile", type=str, default="", required=False, help="File to write results to (JSON)")
+    parser.add_argument("-c", "--compare", type=str, default="", required=False, help="Baseline results to compare with (JSON)")
+    parser.add_argument("--threshold", type=float, default=0.1, required=False, help="Tolerated relative slowdown or memory growth")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose printout")
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data)
+    params = os.path.abspath(args.params if args.params else f"{data_dir}/patgen_params.in")
+    work_root = tempfile.mkdtemp(prefix="hyph-bench-")
+    output = {
+        "meta": {
+            "timestamp": datetime.datetime.now().strftime('%Y%m%d%H%M%S'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "limit": args.limit,
+            "repeat": args.repeat,
+            "nfold": args.nfold,
+        },
+        "results": dict(),
+    }
+
+    cwd = os.getcwd()
+    try:
+        for dataset in args.datasets:
+            if args.verbose:
+                print(f"Benchmarking {dataset}...", file=sys.stderr)
+            work_dir = f"{work_root}/{dataset.replace('/', '_')}"
+            os.makedirs(work_dir)
+            os.chdir(work_dir)  # temporaries of the scorers are created next to the wordlist, fold files as well
+            output["results"][dataset] = bench_dataset(
+                dataset, data_dir, work_dir, params, args.limit, args.repeat, not args.no_memory, args.nfold
+            )
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    for dataset, benchmarks in output["results"].items():
+        for bench, values in benchmarks.items():
+            speed = f"{values['words_per_second']:12.0f} words/s" if "words_per_second" in values else " " * 20
+            memory = f"{values['peak_bytes'] / (1 << 20):9.2f} MiB" if "peak_bytes" in values else ""
+            print(f"{dataset:20} {bench:22} {values['seconds']:9.4f} s {speed} {memory}")
+
+    if args.outfile:
+        with open(args.outfile, "w") as out:
+            json.dump(output, out, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = 0
+        for dataset, bench, metric, old, new, change, regression in compare(output, baseline, args.threshold):
+            if regression:
+                regressions += 1
+            if regression or args.verbose:
+                flag = "REGRESSION" if regression else "ok"
+                print(f"{flag:10} {dataset:20} {bench:22} {metric:16} {old:14.4f} -> {new:14.4f} ({change:+.1%})")
+        print(f"{regressions} regressions against {args.compare} (threshold {args.threshold:.0%})")
+        if regressions:
+            sys.exit(1)
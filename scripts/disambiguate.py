@@ -1,87 +1,340 @@
+import heapq
+import io
+import itertools
+import os
 import re
+import shutil
+import sys
+import tempfile
+import zlib
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from shards import shard_offsets
 
 
 WORD_LEN_LIMIT = 50
+# approximate memory taken by one record of a sorted run besides its strings
+RECORD_OVERHEAD = 120
+# hyphenation marks containing these are matched as regular expressions
+REGEX_SPECIAL = ".^$*+?{}[]\\|()"
 
 
-def hyph_indices(word: str, hyphenation_mark: str = "-"):
+def word_splitter(hyphenation_mark: str = "-"):
     """
-    Find indices of hyphenation points within given word
-    :param word: string to be searched
-    :param hyphenation_mark: string used as hyphenation mark
+    Create function separating hyphenated word into the word and its hyphenation points
+    :param hyphenation_mark: string (regular expression) used as hyphenation mark
+    :return: function mapping hyphenated word to (word without marks, bitmask with i-th bit set if a mark starts at
+    index i of the hyphenated word)
+    """
+    if hyphenation_mark and not any(c in REGEX_SPECIAL for c in hyphenation_mark):
+        step = len(hyphenation_mark)
+
+        def split(hyphenated: str):
+            mask = 0
+            i = hyphenated.find(hyphenation_mark)
+            while i != -1:
+                mask |= 1 << i
+                i = hyphenated.find(hyphenation_mark, i + step)
+            return hyphenated.replace(hyphenation_mark, ""), mask
+    else:
+        pattern = re.compile(hyphenation_mark)
+
+        def split(hyphenated: str):
+            mask = 0
+            for match in pattern.finditer(hyphenated):
+                mask |= 1 << match.start()
+            return pattern.sub("", hyphenated), mask
+    return split
+
+
+def resolve(variants: list, new: str, new_mask: int):
+    """
+    Add hyphenation of a word to its already known variants, unless one of them is its superset or subset
+    :param variants: known hyphenations of the same word as (hyphenation, bitmask), modified in place
+    :param new: hyphenation to be added
+    :param new_mask: bitmask of the new hyphenation as returned by word_splitter
+    :return: True if the new hyphenation was resolved against a known variant, False if it was appended
     """
-    return set([match.start() for match in re.finditer(hyphenation_mark, word)])
+    for i, (_, mask) in enumerate(variants):
+        if new_mask & ~mask == 0:
+            return True
+        if mask & ~new_mask == 0:
+            variants[i] = (new, new_mask)
+            return True
+    variants.append((new, new_mask))
+    return False
 
 
-def superset(first: set, second: set):
+def write_variants(out, variants: list, accumulators: list = ()):
     """
-    Check whether there is a superset-subset relation between two sets
-    :param first: set to be checked
-    :param second: set to be checked
-    :return: 0 if relation is present and first is the superset 1 if second is the superset, -1 otherwise
+    Write resolved hyphenations of one word in sorted order, too long ones are left out
+    :param out: open output file
+    :param variants: resolved hyphenations of the word as (hyphenation, bitmask)
+    :param accumulators: objects whose add method is called with every written line, e.g. to collect statistics
     """
-    if first.issubset(second):
-        return 1
-    elif second.issubset(first):
-        return 0
-    return -1
+    for hyphenation, _ in sorted(variants):
+        if len(hyphenation) > WORD_LEN_LIMIT:
+            continue
+        line = hyphenation + "\n"
+        out.write(line)
+        for accumulator in accumulators:
+            accumulator.add(line)
 
 
-def disambiguate(file: str, hyphenation_mark: str = "-", outfile: str = ""):
+def disambiguate(file: str, hyphenation_mark: str = "-", outfile: str = "", accumulators: list = ()):
     """
     Check and resolve inconsistencies in given dataset by joining or keeping words with non-unique hyphenations
     :param file: path to word list to be processed
     :param hyphenation_mark: string used as hyphenation mark
     :param outfile: path to output file
+    :param accumulators: objects whose add method is called with every output line
     :return: number of ambiguities (before, after) processing
     """
+    split = word_splitter(hyphenation_mark)
     words = dict()
     found, disambiguated = 0, 0
     with open(file) as wl:
         for new in wl:
             new = new.strip()
-            word = re.sub(hyphenation_mark, "", new)
+            word, mask = split(new)
             if word not in words:
-                words[word] = [new]
+                words[word] = [(new, mask)]
                 continue
             found += 1
-            new_ind = hyph_indices(new, hyphenation_mark)
-            resolved = False
-            for i, hyphenation in enumerate(words[word]):
-                hyph_ind = hyph_indices(hyphenation, hyphenation_mark)
-                superset_index = superset(new_ind, hyph_ind)
-                if superset_index != -1:
-                    if superset_index == 0:
-                        words[word][i] = new
-                    disambiguated += 1
-                    resolved = True
-                    break
-            if not resolved:
-                words[word].append(new)
+            if resolve(words[word], new, mask):
+                disambiguated += 1
 
     if not outfile:
         outfile = file+"_dis.wlh"
 
     with open(outfile, "w") as out:
         for word in sorted(words.keys()):
-            for hyphenation in sorted(words[word]):
-                if len(hyphenation) > WORD_LEN_LIMIT:
-                    continue
-                out.write(hyphenation + "\n")
+            write_variants(out, words[word], accumulators)
+
+    return found, found - disambiguated
+
+
+def sorted_runs(file: str, hyphenation_mark: str = "-", memory_limit: int = 64 << 20, tmp_dir: str = ""):
+    """
+    Split word list into runs sorted by de-hyphenated word and line number, each run fits into memory limit. All
+    runs but the last one are stored in temporary files.
+    :param file: path to word list
+    :param hyphenation_mark: string used as hyphenation mark
+    :param memory_limit: approximate memory available for one run in bytes
+    :param tmp_dir: directory for temporary run files, system default if empty
+    :return: (list of run file paths, last run as sorted list of (word, line number, hyphenation, bitmask))
+    """
+    split = word_splitter(hyphenation_mark)
+    paths, run, size = [], [], 0
+    with open(file) as wl:
+        for index, new in enumerate(wl):
+            new = new.strip()
+            word, mask = split(new)
+            run.append((word, index, new, mask))
+            # strings, tuple and list slot
+            size += sys.getsizeof(new) + sys.getsizeof(word) + RECORD_OVERHEAD
+            if size >= memory_limit:
+                paths.append(write_run(sorted(run), tmp_dir))
+                run, size = [], 0
+    run.sort()
+    return paths, run
+
+
+def write_run(run, tmp_dir: str = ""):
+    """
+    Store sorted run in temporary file
+    :param run: iterable of (word, line number, hyphenation, bitmask) in sorted order
+    :param tmp_dir: directory for the file, system default if empty
+    :return: path to the run file
+    """
+    fd, path = tempfile.mkstemp(suffix=".run", dir=tmp_dir if tmp_dir else None)
+    with os.fdopen(fd, "w") as out:
+        for _, index, new, _ in run:
+            out.write(f"{index}\t{new}\n")
+    return path
+
+
+def read_run(path: str, hyphenation_mark: str = "-"):
+    """
+    Read sorted run from temporary file
+    :param path: path to the run file
+    :param hyphenation_mark: string used as hyphenation mark
+    :return: generator of (word, line number, hyphenation, bitmask)
+    """
+    split = word_splitter(hyphenation_mark)
+    with open(path) as run:
+        for line in run:
+            index, new = line[:-1].split("\t", 1)
+            word, mask = split(new)
+            yield word, int(index), new, mask
+
+
+def merge_runs(paths: list, hyphenation_mark: str = "-", tmp_dir: str = "", max_open: int = 128):
+    """
+    Merge run files until at most max_open of them remain
+    :param paths: paths to run files, merged files are deleted
+    :param hyphenation_mark: string used as hyphenation mark
+    :param tmp_dir: directory for merged run files, system default if empty
+    :param max_open: maximal number of run files open at once
+    :return: paths to remaining run files
+    """
+    while len(paths) > max_open:
+        group, paths = paths[:max_open], paths[max_open:]
+        paths.append(write_run(heapq.merge(*[read_run(p, hyphenation_mark) for p in group]), tmp_dir))
+        for p in group:
+            os.remove(p)
+    return paths
+
+
+def disambiguate_external(file: str, hyphenation_mark: str = "-", outfile: str = "", memory_limit: int = 64 << 20, tmp_dir: str = "",
+                          accumulators: list = ()):
+    """
+    Disambiguate word list in bounded memory: the list is sorted by de-hyphenated words in runs stored on disk,
+    the runs are merged and hyphenations of each word are resolved in their original order. The output is identical
+    to the output of disambiguate.
+    :param file: path to word list to be processed
+    :param hyphenation_mark: string used as hyphenation mark
+    :param outfile: path to output file
+    :param memory_limit: approximate memory available for sorting in bytes
+    :param tmp_dir: directory for temporary run files, system default if empty
+    :param accumulators: objects whose add method is called with every output line
+    :return: number of ambiguities (before, after) processing
+    """
+    paths, last = sorted_runs(file, hyphenation_mark, memory_limit, tmp_dir)
+    found, disambiguated = 0, 0
+
+    if not outfile:
+        outfile = file+"_dis.wlh"
+
+    try:
+        paths = merge_runs(paths, hyphenation_mark, tmp_dir)
+        with open(outfile, "w") as out:
+            records = heapq.merge(*[read_run(p, hyphenation_mark) for p in paths], last)
+            for _, group in itertools.groupby(records, key=lambda record: record[0]):
+                _, _, first, first_mask = next(group)
+                variants = [(first, first_mask)]
+                for _, _, new, mask in group:
+                    found += 1
+                    if resolve(variants, new, mask):
+                        disambiguated += 1
+                write_variants(out, variants, accumulators)
+    finally:
+        for p in paths:
+            os.remove(p)
 
     return found, found - disambiguated
 
 
+def _partition_shard(file: str, start: int, end: int, hyphenation_mark: str, paths: list):
+    """
+    Distribute lines of a part of word list into partitions by hash of their de-hyphenated word, lines keep their order
+    :param file: path to word list
+    :param start: first byte of the part
+    :param end: first byte after the part
+    :param hyphenation_mark: string used as hyphenation mark
+    :param paths: partition files of the part to be written
+    """
+    split = word_splitter(hyphenation_mark)
+    outs = [open(path, "w") for path in paths]
+    with open(file, "rb") as wl:
+        wl.seek(start)
+        for new in io.TextIOWrapper(io.BytesIO(wl.read(end - start))):
+            new = new.strip()
+            word, _ = split(new)
+            outs[zlib.crc32(word.encode()) % len(outs)].write(new + "\n")
+    for out in outs:
+        out.close()
+
+
+def _disambiguate_partition(paths: list, hyphenation_mark: str, outfile: str, memory_limit: int, tmp_dir: str):
+    """
+    Join partition files of all parts in their order and disambiguate them
+    :param paths: partition files, one from each part of the word list
+    :param hyphenation_mark: string used as hyphenation mark
+    :param outfile: path to output file
+    :param memory_limit: memory budget of external sorting in bytes, sorted in memory if 0
+    :param tmp_dir: directory for temporary run files
+    :return: number of ambiguities (before, after) processing
+    """
+    joined = outfile + ".in"
+    with open(joined, "wb") as out:
+        for path in paths:
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, out)
+            os.remove(path)
+    try:
+        if memory_limit > 0:
+            return disambiguate_external(joined, hyphenation_mark, outfile, memory_limit, tmp_dir)
+        return disambiguate(joined, hyphenation_mark, outfile)
+    finally:
+        os.remove(joined)
+
+
+def disambiguate_parallel(file: str, hyphenation_mark: str = "-", outfile: str = "", workers: int = 2, memory_limit: int = 0, tmp_dir: str = "",
+                          accumulators: list = ()):
+    """
+    Disambiguate word list by several processes. Words are partitioned by hash, so that all hyphenations of a word
+    are resolved by the same process, and sorted partitions are merged. The output is identical to the output of
+    disambiguate.
+    :param file: path to word list to be processed
+    :param hyphenation_mark: string used as hyphenation mark
+    :param outfile: path to output file
+    :param workers: number of processes
+    :param memory_limit: memory budget of external sorting of each process in bytes, sorted in memory if 0
+    :param tmp_dir: directory for temporary files, system default if empty
+    :param accumulators: objects whose add method is called with every output line, in the output order
+    :return: number of ambiguities (before, after) processing
+    """
+    if not outfile:
+        outfile = file+"_dis.wlh"
+
+    work_dir = tempfile.mkdtemp(prefix="disambiguate", dir=tmp_dir if tmp_dir else None)
+    try:
+        shards = shard_offsets(file, workers)
+        parts = [[f"{work_dir}/{i}.{j}" for j in range(workers)] for i in range(len(shards))]
+        outfiles = [f"{work_dir}/{j}.dis" for j in range(workers)]
+        with ProcessPoolExecutor(workers) as pool:
+            list(pool.map(_partition_shard, [file] * len(shards), *zip(*shards), [hyphenation_mark] * len(shards), parts))
+            counts = list(pool.map(_disambiguate_partition, [list(column) for column in zip(*parts)],
+                                   [hyphenation_mark] * workers, outfiles, [memory_limit] * workers, [work_dir] * workers))
+
+        split = word_splitter(hyphenation_mark)
+        partitions = [open(path) for path in outfiles]
+        # words of different partitions are distinct, so ordering by word alone restores the complete order
+        with open(outfile, "w") as out:
+            for line in heapq.merge(*partitions, key=lambda line: split(line[:-1])[0]):
+                out.write(line)
+                for accumulator in accumulators:
+                    accumulator.add(line)
+        for partition in partitions:
+            partition.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    before = sum(before for before, _ in counts)
+    return before, sum(after for _, after in counts)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("file", type=str, help="File to be disambiguated")
     parser.add_argument("-m", "--hyphmark", type=str, required=False, default="-", help="String used as hyphenation mark")
     parser.add_argument("-o", "--outfile", type=str, required=False, default="", help="File to write output")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable more verbose printout")
+    parser.add_argument("--memory", type=int, required=False, default=0, help="Memory budget in MiB, word list is sorted externally within the budget (in memory if 0)")
+    parser.add_argument("--tmpdir", type=str, required=False, default="", help="Directory for temporary files of external sorting")
+    parser.add_argument("-j", "--jobs", type=int, required=False, default=1, help="Number of processes, words are partitioned among them")
     args = parser.parse_args()
 
-    before, after = disambiguate(args.file, hyphenation_mark=args.hyphmark, outfile=args.outfile)
+    if args.jobs > 1:
+        before, after = disambiguate_parallel(args.file, hyphenation_mark=args.hyphmark, outfile=args.outfile,
+                                              workers=args.jobs, memory_limit=args.memory << 20, tmp_dir=args.tmpdir)
+    elif args.memory > 0:
+        before, after = disambiguate_external(args.file, hyphenation_mark=args.hyphmark, outfile=args.outfile,
+                                              memory_limit=args.memory << 20, tmp_dir=args.tmpdir)
+    else:
+        before, after = disambiguate(args.file, hyphenation_mark=args.hyphmark, outfile=args.outfile)
     if args.verbose:
         print(f"Disambiguated {args.file} into {args.outfile if args.outfile else args.file+'_dis.wlh'}, ambiguous hyphenations reduced from {before} to {after}")
     else:
@@ -2,7 +2,7 @@ import time
 import argparse
 import os
 
-from hyperparameters import sample, metaheuristic, combine, score, stats
+from hyperparameters import sample, metaheuristic, combine, score, stats, trace
 
 if __name__ == "__main__":
     t = time.time()
@@ -11,7 +11,15 @@ if __name__ == "__main__":
     parser.add_argument("-p", "--profile", type=str, required=False, default="", help="Parameter profile to use")
     parser.add_argument("-v", "--verbose", action="store_true", default=False, help="Use verbose printout.")
     parser.add_argument("-d", "--dynamic", action="store_true", help="Whether to use hill climbing metaheuristic.")
+    parser.add_argument("-b", "--bayes", type=int, required=False, default=0, help="Use Bayesian optimization with given number of evaluations per level.")
+    parser.add_argument("-g", "--genetic", type=int, required=False, default=0, help="Use genetic algorithm with given population size.")
+    parser.add_argument("-s", "--halving", type=int, required=False, default=0, help="Use successive halving over wordlist subsamples with given number of candidates per level.")
+    parser.add_argument("--profiles", type=str, nargs="+", required=False, default=[], help="Parameter profiles sampled in turns (instead of --profile).")
+    parser.add_argument("-j", "--jobs", type=int, required=False, default=1, help="Number of patgen processes run at once.")
+    parser.add_argument("--trace", type=str, required=False, default="", help="File to write timing trace to (Chrome trace, JSON lines if it ends with .jsonl).")
     args = parser.parse_args()
+    if args.trace:
+        trace.configure()
 
     datadir = args.datadir.rstrip("/")
     wl_file, tr_file = "", ""
@@ -26,10 +34,10 @@ if __name__ == "__main__":
         exit(1)
 
     scorer = score.PatgenScorer(
-        "patgen", wl_file, tr_file, verbose=True
+        "patgen", wl_file, tr_file, verbose=True, workers=args.jobs
     )
 
-    if not args.profile:
+    if not args.profile and not args.profiles:
         par_file = ""
         par_dir = datadir
         for _ in range(3):  # assume the directory structure .../data/<lang>/<dataset>
@@ -44,10 +52,25 @@ if __name__ == "__main__":
     else:
         par_file = args.profile
 
-    sampler = sample.FileSampler(par_file)
+    if args.profiles:
+        sampler = sample.MultiFileSampler(args.profiles)
+    else:
+        sampler = sample.FileSampler(par_file)
     statistic = stats.LearningInfo()
 
-    if not args.dynamic:
+    if args.halving:
+        meta = metaheuristic.SuccessiveHalving(
+            scorer, sampler, statistic=statistic, n_candidates=args.halving
+        )
+    elif args.genetic:
+        meta = metaheuristic.GeneticAlgorithm(
+            scorer, sampler, n_samples=args.genetic, statistic=statistic
+        )
+    elif args.bayes:
+        meta = metaheuristic.BayesianOptimization(
+            scorer, sampler, statistic=statistic, budget=args.bayes, batch_size=args.jobs
+        )
+    elif not args.dynamic:
         meta = metaheuristic.NoMetaheuristic(
             scorer, sampler, statistic=statistic
         )
@@ -58,7 +81,10 @@ if __name__ == "__main__":
 
     comb = combine.SimpleCombiner(meta, verbose=args.verbose)
 
-    comb.run()
+    with trace.span("run"):
+        comb.run()
+    if args.trace:
+        trace.tracer.write(args.trace)
     #print([(pop.f_score(1.0), pop.f_score(100.0)) for pop in meta.population])
     meta.statistic.visualise(metric=["precision", "recall"])
     print([(l[0].level, l[0].stats["tp"], l[0].stats["fp"], l[0].stats["fn"], l[0].stats["level_patterns"]) for l in meta.statistic.level_outputs])
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import shutil
+from stat import S_ISREG
+
+from . import sample
+
+CACHE_VERSION = 1
+
+
+def file_hash(path: str):
+    """
+    Compute SHA-256 of file content
+    :param path: path to file
+    :return: hexadecimal digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ScoreCache:
+    """
+    On-disk cache of pattern generation results addressed by content of the inputs. Each entry consists of statistics
+    (<key>.json) and generated patterns (<key>.pat), least recently used entries are evicted when the cache exceeds its
+    size limit. The cache may be shared by concurrently running processes.
+    """
+    def __init__(self, directory: str, max_size: int = 1 << 30):
+        """
+        Create cache in given directory
+        :param directory: cache directory, created if missing
+        :param max_size: maximal total size of cached files in bytes
+        """
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+        self._hashes: dict = dict()
+        self._size = None
+
+    def content_hash(self, path: str):
+        """
+        Hash of file content, remembered while the file keeps its size and modification time
+        :param path: path to file
+        :return: hexadecimal digest, None if the path is not a regular file (e.g. named pipe)
+        """
+        st = os.stat(path)
+        if not S_ISREG(st.st_mode):
+            return None
+        stamp = (st.st_size, st.st_mtime_ns)
+        if path not in self._hashes or self._hashes[path][0] != stamp:
+            self._hashes[path] = (stamp, file_hash(path))
+        return self._hashes[path][1]
+
+    def key(self, wordlist_path: str, translate_path: str, prev_pattern_path: str, s: sample.Sample):
+        """
+        Compute cache key of a pattern generation run
+        :param wordlist_path: path to wordlist
+        :param translate_path: path to translate file
+        :param prev_pattern_path: path to patterns the run starts from
+        :param s: hyperparameter values of the run
+        :return: hexadecimal key, None if some of the inputs cannot be hashed
+        """
+        hashes = [self.content_hash(wordlist_path), self.content_hash(translate_path), file_hash(prev_pattern_path)]
+        if None in hashes:
+            return None
+        params = [s.level, s.pat_start, s.pat_finish, s.good_weight, s.bad_weight, s.threshold]
+        content = " ".join([str(CACHE_VERSION)] + hashes + [str(p) for p in params])
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def path(self, key: str):
+        """
+        Get path of an entry without extension
+        :param key: cache key
+        :return: path prefix of the entry files
+        """
+        return f"{self.directory}/{key[:2]}/{key}"
+
+    def get(self, key: str, pattern_file: str):
+        """
+        Look up cached result and copy its patterns out of the cache
+        :param key: cache key
+        :param pattern_file: where to copy cached patterns
+        :return: cached statistics, None if not present
+        """
+        entry = self.path(key)
+        try:
+            with open(entry + ".json") as f:
+                stats = json.load(f)
+            shutil.copyfile(entry + ".pat", pattern_file)
+            os.utime(entry + ".json")
+        except (OSError, ValueError):  # missing, evicted meanwhile or incomplete entry
+            return None
+        return stats
+
+    def put(self, key: str, stats: dict, pattern_file: str):
+        """
+        Store result in the cache, evict old entries if the cache grows too big
+        :param key: cache key
+        :param stats: statistics of the run
+        :param pattern_file: patterns generated by the run
+        """
+        entry = self.path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = f"{entry}.{os.getpid()}.tmp"
+        # statistics are written last, entry is valid only when they are present
+        shutil.copyfile(pattern_file, tmp)
+        os.replace(tmp, entry + ".pat")
+        with open(tmp, "w") as f:
+            json.dump(stats, f)
+        os.replace(tmp, entry + ".json")
+
+        if self._size is None:
+            self._size = sum(size for _, _, size in self.entries())
+        else:
+            self._size += os.path.getsize(entry + ".pat") + os.path.getsize(entry + ".json")
+        if self._size > self.max_size:
+            self.evict()
+
+    def entries(self):
+        """
+        List cache entries
+        :return: list of (last use time, path prefix, size in bytes)
+        """
+        entries = []
+        for subdir in os.scandir(self.directory):
+            if not subdir.is_dir():
+                continue
+            for file in os.scandir(subdir.path):
+                if not file.name.endswith(".json"):
+                    continue
+                entry = file.path[:-len(".json")]
+                try:
+                    st = file.stat()
+                    entries.append((st.st_mtime, entry, st.st_size + os.path.getsize(entry + ".pat")))
+                except OSError:
+                    continue
+        return entries
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache takes at most 90 % of its size limit
+        """
+        entries = sorted(self.entries())
+        self._size = sum(size for _, _, size in entries)
+        for _, entry, size in entries:
+            if self._size <= 0.9 * self.max_size:
+                break
+            for ext in (".json", ".pat"):
+                try:
+                    os.remove(entry + ext)
+                except FileNotFoundError:
+                    pass
+            self._size -= size
+
+    def clear(self):
+        """
+        Delete all cached entries
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = 0
@@ -1,6 +1,16 @@
-import os
+from . import metaheuristic, trace
 
-from . import metaheuristic
+
+def outranked(bounds: dict, finished: list, size: int):
+    """
+    Check that a run cannot get into population of given size ranked by the number of patterns first, i.e. enough
+    finished runs have fewer patterns than the run will end with
+    :param bounds: precision and recall upper bounds and pattern count lower bound of the run
+    :param finished: statistics of finished runs of the same batch
+    :param size: population size
+    :return: True if the run cannot be selected
+    """
+    return sum(1 for st in finished if st["n_patterns"] < bounds["n_patterns"]) >= size
 
 
 class Combiner:
@@ -25,15 +35,15 @@ class Combiner:
         Determine the best sample out of the final population and move its generated patterns into specified directory.
         Afterward the temporaries are cleaned.<timestamp>-<run_id>.pat
         :param out_dir: output directory name (. by default)
-        :return: pattern file name, the number of nodes in pattern trie
+        :return: pattern file name, the number of nodes in pattern trie (None if patgen run of the best sample failed)
         """
         best = self.meta.population[0] #TODO determine the best sample out of the final population
         pattern_file = f"{best.timestamp}-{best.run_id}.pat"
         if not out_dir:
             out_dir = "."
         new_patfile = f"{out_dir}/{pattern_file}"
-        command = f"mv {self.meta.scorer.temp_dir}/{best.run_id}.pat {new_patfile}"
-        os.system(command)
+        with trace.span("export_patterns", run_id=best.run_id):
+            self.meta.scorer.export_patterns(best.run_id, new_patfile)
         return new_patfile, best.stats["trie_nodes"]
 
     def reset(self, tmp_suffix: str = ""):
@@ -60,13 +70,14 @@ class SimpleCombiner(Combiner):
             if self.verbose:
                 print("Running metaheuristic on level", self.level)
 
-            prev = self.meta.get_ids().pop()
-            candidate = s.copy({"level": self.level, "prev": prev})
-            self.meta.scorer.score(candidate)
+            with trace.span("level", level=self.level):
+                prev = self.meta.population[0].run_id if self.meta.population else 0
+                candidate = s.copy({"level": self.level, "prev": prev})
+                self.meta.scorer.score(candidate)
 
-            self.meta.population = [candidate]
+                self.meta.population = [candidate]
 
-            self.meta.run_level()
+                self.meta.run_level()
             if self.verbose:
                 print("Population selected for next level:", [str(pop) for pop in self.meta.population])
             if self.meta.statistic is not None:
@@ -88,19 +99,24 @@ class AllWithAllCombiner(Combiner):
             self.level += 1
             if self.verbose:
                 print("Running metaheuristic on level", self.level)
-            fresh = self.meta.sampler.sample_n(self.meta.population_size)
-            candidates = []
-
-            for prev in self.meta.get_ids():
-                for f in fresh:
-                    candidate = f.copy({"level": self.level, "prev": prev})
-                    self.meta.scorer.score(candidate)
-                    candidates.append(candidate)
-
-            candidates.sort(key=lambda x: (x.n_patterns, x.precision(), x.recall()))
-            self.meta.population = candidates[:self.meta.population_size]
-
-            self.meta.run_level()
+            with trace.span("level", level=self.level):
+                fresh = self.meta.sampler.sample_n(self.meta.population_size)
+                candidates = []
+
+                for prev in self.meta.get_ids():
+                    for f in fresh:
+                        candidates.append(f.copy({"level": self.level, "prev": prev}))
+                size = self.meta.population_size
+                self.meta.scorer.prune = lambda s, bounds, finished: outranked(bounds, finished, size)
+                try:
+                    self.meta.scorer.score_many(candidates)
+                finally:
+                    self.meta.scorer.prune = None
+
+                candidates.sort(key=lambda x: (x.n_patterns(), x.precision(), x.recall()))
+                self.meta.population = candidates[:self.meta.population_size]
+
+                self.meta.run_level()
             if self.verbose:
                 print("Population selected for next level:", [str(pop) for pop in self.meta.population])
             if self.meta.statistic is not None:
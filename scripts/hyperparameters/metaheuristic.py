@@ -1,16 +1,35 @@
+import math
+import os
+import random
+
 from . import sample
 from . import score
 from . import stats
+from . import surrogate
+from . import trace
 
 PATGEN_MAX_LEVELS = 9
 
+
+def f_score_dominated(bounds: dict, incumbent: sample.Sample):
+    """
+    Check that a run cannot beat incumbent under default hill climbing evaluation (higher F1 score and fewer patterns)
+    :param bounds: precision and recall upper bounds and pattern count lower bound of the run
+    :param incumbent: sample to beat
+    :return: True if the run cannot beat incumbent
+    """
+    p, r = bounds["precision"], bounds["recall"]
+    f_bound = 0 if p + r == 0 else 2 * p * r / (p + r)
+    return f_bound + 1e-9 <= incumbent.f_score(1) or bounds["n_patterns"] >= incumbent.n_patterns()
+
+
 class Metaheuristic:
     """
     Abstract class encompassing all metaheuristics. Should not be instantiated itself.
     """
-    def __init__(self, scorer: score.PatgenScorer, sampler: sample.Sampler, n_samples: int, statistic: stats.LearningInfo = None):
+    def __init__(self, scorer: score.Scorer, sampler: sample.Sampler, n_samples: int, statistic: stats.LearningInfo = None):
         self.sampler: sample.Sampler = sampler
-        self.scorer: score.PatgenScorer = scorer
+        self.scorer: score.Scorer = scorer
         self.population: list = []
         self.population_size: int = n_samples
         self.statistic = statistic
@@ -26,8 +45,12 @@ class Metaheuristic:
         """
         Compute final population for one level of patgen generation and then remove unused temporary files
         """
-        while self.new_population():
-            continue
+        name = type(self).__name__
+        while True:
+            with trace.span("iteration", metaheuristic=name):
+                changed = self.new_population()
+            if not changed:
+                break
         #self.scorer.clean_unused(self.get_ids())
         self.scorer.clear_cache()
 
@@ -57,27 +80,50 @@ class HillClimbing(Metaheuristic):
     """
     Hill climbing metaheuristic: always choose the best neighbour
     """
-    def __init__(self, scorer: score.PatgenScorer, sampler: sample.Sampler, n_samples: int = 1, statistic: stats.LearningInfo = None, eval_func = None):
+    def __init__(self, scorer: score.Scorer, sampler: sample.Sampler, n_samples: int = 1, statistic: stats.LearningInfo = None, eval_func = None, dominated = None):
+        """
+        Create hill climbing metaheuristic
+        :param scorer: scorer evaluating the samples
+        :param sampler: sampler of the hyperparameter space
+        :param n_samples: population size
+        :param statistic: optional collector of learning statistics
+        :param eval_func: eval_func(x, y) is True if sample x is better than sample y
+        :param dominated: dominated(bounds, y) is True if no sample with statistics within bounds (see
+        score.PatgenLogParser.bounds) is better than sample y, used to stop hopeless runs early. Derived from default
+        eval_func, not used with custom eval_func unless given
+        """
         super().__init__(scorer, sampler, n_samples, statistic)
         self.visited = set()
         if eval_func is None:
-            self.eval_func = (lambda x, y: x.f_score(1) > y.f_score(1) and x.stats.get("n_patterns", -1) < y.stats.get("n_patterns", -1))
+            self.eval_func = (lambda x, y: x.f_score(1) > y.f_score(1) and x.n_patterns() < y.n_patterns())
+            self.dominated = dominated if dominated is not None else f_score_dominated
         else:
             self.eval_func = eval_func
+            self.dominated = dominated
 
-    def reset(self):
-        Metaheuristic.reset(self)
+    def reset(self, tmp_suffix: str = ""):
+        Metaheuristic.reset(self, tmp_suffix)
         self.visited = set()
 
     def new_population(self):
         climbed = False
 
+        # neighbours do not depend on scores, so all of them are scored in one batch
+        neighbours = [self.get_neighbours(i) for i in range(self.population_size)]
+        if self.dominated is not None:
+            # members are only replaced by better samples, so a neighbour dominated by its original member stays dominated
+            member = {id(n): self.population[i] for i in range(self.population_size) for n in neighbours[i]}
+            self.scorer.prune = lambda s, bounds, finished: self.dominated(bounds, member[id(s)])
+        try:
+            self.scorer.score_many([n for ns in neighbours for n in ns])
+        finally:
+            self.scorer.prune = None
+
         for i in range(self.population_size):
 
             old = self.population[i]
 
-            for n in self.get_neighbours(i):
-                self.scorer.score(n)
+            for n in neighbours[i]:
                 if self.eval_func(n, old):
                     self.population[i] = n
                     old = n
@@ -115,11 +161,394 @@ class HillClimbing(Metaheuristic):
         Metaheuristic.run_level(self)
 
 
+class BayesianOptimization(Metaheuristic):
+    """
+    Bayesian optimization: Gaussian process fitted to the samples scored on the level predicts the objective of
+    unscored samples, the ones with the highest expected improvement are scored next until the evaluation budget of the
+    level is spent
+    """
+    PARAMS = ["pat_start", "pat_finish", "good_weight", "bad_weight", "threshold"]
+
+    def __init__(self, scorer: score.Scorer, sampler: sample.Sampler, n_samples: int = 1, statistic: stats.LearningInfo = None,
+                 budget: int = 20, batch_size: int = 1, n_candidates: int = 256, objective = None, eval_func = None,
+                 random_state = None):
+        """
+        Create Bayesian optimization metaheuristic
+        :param scorer: scorer evaluating the samples
+        :param sampler: sampler of the hyperparameter space, its ranges bound the search
+        :param n_samples: population size
+        :param statistic: optional collector of learning statistics
+        :param budget: number of samples scored on each level
+        :param batch_size: number of samples proposed and scored at once
+        :param n_candidates: number of random samples the acquisition function is maximized over
+        :param objective: objective(x) is the value of scored sample x to maximize, F1 score by default
+        :param eval_func: eval_func(x, y) is True if sample x should replace population member y, the same as in
+        HillClimbing by default
+        :param random_state: seed of candidate generation
+        """
+        super().__init__(scorer, sampler, n_samples, statistic)
+        self.budget = budget
+        self.batch_size = batch_size
+        self.n_candidates = n_candidates
+        self.objective = objective if objective is not None else (lambda x: x.f_score(1))
+        if eval_func is None:
+            self.eval_func = (lambda x, y: x.f_score(1) > y.f_score(1) and x.n_patterns() < y.n_patterns())
+        else:
+            self.eval_func = eval_func
+        self.random_state = random_state
+        self.random = random.Random(random_state)
+        self.observed: list = []
+        self.spent = 0
+
+    def reset(self, tmp_suffix: str = ""):
+        Metaheuristic.reset(self, tmp_suffix)
+        self.random.seed(self.random_state)
+        self.observed = []
+        self.spent = 0
+
+    def run_level(self):
+        self.observed = [[pop] for pop in self.population]
+        self.spent = 0
+        Metaheuristic.run_level(self)
+
+    def new_population(self):
+        """
+        Score one batch of proposed samples and replace population members by better ones
+        :return: True while the budget of the level is not spent
+        """
+        proposals = []
+        for j in range(min(self.batch_size, self.budget - self.spent)):
+            i = j % self.population_size
+            s = self.propose(i, [p for k, p in proposals if k == i])
+            if s is not None:
+                proposals.append((i, s))
+        if not proposals:
+            return False
+
+        self.scorer.score_many([s for _, s in proposals])
+        self.spent += len(proposals)
+        for i, s in proposals:
+            self.observed[i].append(s)
+            if self.eval_func(s, self.population[i]):
+                self.population[i] = s
+        return self.spent < self.budget
+
+    def encode(self, s: sample.Sample):
+        """
+        Scale hyperparameters of a sample into unit cube
+        :param s: sample
+        :return: list of scaled values
+        """
+        x = []
+        for param in self.PARAMS:
+            low, high = getattr(self.sampler, param + "_range")
+            x.append(0.0 if high == low else (s.param_dict[param] - low) / (high - low))
+        return x
+
+    def candidates(self, i: int, seen: set):
+        """
+        Generate unscored samples around population member: random samples from sampler ranges and neighbours
+        (one hyperparameter differs by one) of the best sample observed so far
+        :param i: index of the member in self.population
+        :param seen: hashes of samples already scored or proposed
+        :return: list of samples with level and previous patterns of the member
+        """
+        member = self.population[i]
+        best = max(self.observed[i], key=self.objective)
+        new_vals = []
+        for param, val in best.param_dict.items():
+            if param in self.PARAMS:
+                new_vals.extend([{param: val + 1}, {param: val - 1}])
+        for _ in range(self.n_candidates):
+            values = {param: self.random.randint(*getattr(self.sampler, param + "_range")) for param in self.PARAMS}
+            if values["pat_start"] > values["pat_finish"]:
+                values["pat_start"], values["pat_finish"] = values["pat_finish"], values["pat_start"]
+            new_vals.append(values)
+
+        candidates = []
+        for values in new_vals:
+            c = (best if len(values) == 1 else member).copy(values)
+            if not all(self.sampler.is_ok_value(c, param, c.param_dict[param]) for param in values):
+                continue
+            c_hash = c.__hash__()
+            if c_hash in seen:
+                continue
+            seen.add(c_hash)
+            candidates.append(c)
+        return candidates
+
+    def propose(self, i: int, pending: list):
+        """
+        Find unscored sample with the highest expected improvement for population member
+        :param i: index of the member in self.population
+        :param pending: samples already proposed for the member in current batch
+        :return: proposed sample, None if there is none left
+        """
+        observed = self.observed[i]
+        candidates = self.candidates(i, {s.__hash__() for s in observed + pending})
+        if not candidates:
+            return None
+
+        xs = [self.encode(s) for s in observed]
+        ys = [self.objective(s) for s in observed]
+        gp = surrogate.GaussianProcess().fit(xs, ys)
+        best = max(ys)
+        # pending proposals are assumed to score as predicted, so that the batch does not collapse into one point
+        for p in pending:
+            xs.append(self.encode(p))
+            ys.append(gp.predict(xs[-1])[0])
+        if pending:
+            gp = surrogate.GaussianProcess().fit(xs, ys)
+        return max(candidates, key=lambda c: surrogate.expected_improvement(*gp.predict(self.encode(c)), best))
+
+
+class GeneticAlgorithm(Metaheuristic):
+    """
+    Genetic algorithm: each generation, children are bred from parents picked by tournament selection, by uniform
+    crossover and mutation. The whole generation is scored in one batch and the best .elite members survive into the
+    next generation unchanged. Population is kept sorted from the fittest member.
+    """
+    PARAMS = ["pat_start", "pat_finish", "good_weight", "bad_weight", "threshold"]
+
+    def __init__(self, scorer: score.Scorer, sampler: sample.Sampler, n_samples: int = 8, statistic: stats.LearningInfo = None,
+                 generations: int = 5, tournament_size: int = 2, crossover_rate: float = 0.9, mutation_rate: float = 0.2,
+                 elite: int = 1, fitness = None, random_state = None):
+        """
+        Create genetic algorithm
+        :param scorer: scorer evaluating the samples
+        :param sampler: sampler of the hyperparameter space, its ranges bound the mutations
+        :param n_samples: population size
+        :param statistic: optional collector of learning statistics
+        :param generations: number of generations bred on each level
+        :param tournament_size: number of members competing for being a parent
+        :param crossover_rate: probability that a child is bred from two parents instead of copying one
+        :param mutation_rate: probability that a hyperparameter of a child is mutated
+        :param elite: number of best members that survive into next generation
+        :param fitness: fitness(x) is a comparable value of scored sample x to maximize, F1 score with fewer patterns
+        breaking ties by default
+        :param random_state: seed of the random choices
+        """
+        super().__init__(scorer, sampler, n_samples, statistic)
+        self.generations = generations
+        self.tournament_size = tournament_size
+        self.crossover_rate = crossover_rate
+        self.mutation_rate = mutation_rate
+        self.elite = elite
+        if fitness is None:
+            self.fitness = (lambda x: (x.f_score(1), -x.n_patterns()))
+        else:
+            self.fitness = fitness
+        self.random_state = random_state
+        self.random = random.Random(random_state)
+        self.visited = set()
+        self.generation = 0
+
+    def reset(self, tmp_suffix: str = ""):
+        Metaheuristic.reset(self, tmp_suffix)
+        self.random.seed(self.random_state)
+        self.visited = set()
+        self.generation = 0
+
+    def run_level(self):
+        self.visited = set(pop.__hash__() for pop in self.population)
+        self.generation = 0
+        # population from combiner may be smaller than required, fill it with mutants of its members
+        mutants = self.breed(self.population_size - len(self.population), crossover=False)
+        self.scorer.score_many(mutants)
+        self.population = sorted(self.population + mutants, key=self.fitness, reverse=True)
+        Metaheuristic.run_level(self)
+
+    def new_population(self):
+        """
+        Breed and score one generation
+        :return: True while there are generations left to breed on the level
+        """
+        if self.generation >= self.generations:
+            return False
+        self.generation += 1
+        elite = self.population[:self.elite]
+        children = self.breed(self.population_size - len(elite))
+        self.scorer.score_many(children)
+        # if there are not enough new children, the best of old members fill the population
+        rest = self.population[self.elite:][:self.population_size - len(elite) - len(children)]
+        self.population = sorted(elite + children + rest, key=self.fitness, reverse=True)
+        return self.generation < self.generations
+
+    def select(self):
+        """
+        Tournament selection
+        :return: the fittest of .tournament_size randomly chosen members
+        """
+        contestants = [self.random.choice(self.population) for _ in range(self.tournament_size)]
+        return max(contestants, key=self.fitness)
+
+    def breed(self, n: int, crossover: bool = True):
+        """
+        Create new unscored children, samples scored before on the level are not repeated
+        :param n: number of children
+        :param crossover: whether crossover is used, children are mutated copies of parents otherwise
+        :return: list of at most n children
+        """
+        children = []
+        attempts = 0
+        while len(children) < n and attempts < 20 * max(n, 1):
+            attempts += 1
+            first = self.select()
+            values = {param: first.param_dict[param] for param in self.PARAMS}
+            if crossover and self.random.random() < self.crossover_rate:
+                second = self.select()
+                for param in self.PARAMS:
+                    if self.random.random() < 0.5:
+                        values[param] = second.param_dict[param]
+                if values["pat_start"] > values["pat_finish"]:
+                    values["pat_start"], values["pat_finish"] = values["pat_finish"], values["pat_start"]
+            child = first.copy(values)
+            child = self.mutate(child, force=not crossover)
+
+            c_hash = child.__hash__()
+            if c_hash in self.visited:
+                continue
+            self.visited.add(c_hash)
+            children.append(child)
+        return children
+
+    def mutate(self, child: sample.Sample, force: bool = False):
+        """
+        Shift each hyperparameter by one or two with probability .mutation_rate, keeping values valid for the sampler
+        :param child: sample to mutate
+        :param force: mutate at least one hyperparameter
+        :return: mutated sample
+        """
+        params = [param for param in self.PARAMS if self.random.random() < self.mutation_rate]
+        if force and not params:
+            params = [self.random.choice(self.PARAMS)]
+        for param in params:
+            new_val = child.param_dict[param] + self.random.choice([-2, -1, 1, 2])
+            if self.sampler.is_ok_value(child, param, new_val):
+                child = child.copy({param: new_val})
+        return child
+
+
+class SuccessiveHalving(Metaheuristic):
+    """
+    Successive halving over training set size: many candidates of a level (population from combiner and fresh samples
+    from sampler) are scored on a small random subsample of the wordlist, only the best 1/.eta of them are scored again
+    on .eta times larger subsample, and so on until the full wordlist, where .population_size best are kept
+    """
+    def __init__(self, scorer: score.Scorer, sampler: sample.Sampler, n_samples: int = 1, statistic: stats.LearningInfo = None,
+                 n_candidates: int = 9, eta: int = 3, min_fraction: float = None, fitness = None, random_state = None):
+        """
+        Create successive halving metaheuristic
+        :param scorer: scorer evaluating the samples
+        :param sampler: source of fresh candidates, e.g. MultiFileSampler over profiles with n_candidates profiles
+        :param n_samples: population size
+        :param statistic: optional collector of learning statistics
+        :param n_candidates: number of candidates on each level, including population from combiner
+        :param eta: reduction factor of candidates between rounds
+        :param min_fraction: fraction of the wordlist used in the first round, by default such that the rounds end with
+        the full wordlist and .population_size candidates
+        :param fitness: fitness(x) is a comparable value of scored sample x to maximize, F1 score with fewer patterns
+        breaking ties by default
+        :param random_state: seed of the subsampling
+        """
+        super().__init__(scorer, sampler, n_samples, statistic)
+        self.n_candidates = n_candidates
+        self.eta = eta
+        self.min_fraction = min_fraction
+        if fitness is None:
+            self.fitness = (lambda x: (x.f_score(1), -x.n_patterns()))
+        else:
+            self.fitness = fitness
+        self.random_state = random_state
+        self._order = None
+
+    def reset(self, tmp_suffix: str = ""):
+        Metaheuristic.reset(self, tmp_suffix)
+        self._order = None
+
+    def fractions(self, n: int):
+        """
+        Wordlist fractions of the rounds
+        :param n: number of candidates in the first round
+        :return: increasing list of fractions ending with 1
+        """
+        rounds = 1
+        while n > self.population_size:
+            n = math.ceil(n / self.eta)
+            rounds += 1
+        rounds = max(rounds - 1, 1)
+        if self.min_fraction is not None:
+            rounds = min(rounds, max(1, 1 + math.ceil(math.log(1 / self.min_fraction, self.eta))))
+        return [self.eta ** -(rounds - 1 - r) for r in range(rounds)]
+
+    def subsample(self, fraction: float):
+        """
+        Write random subsample of the scorer's wordlist into temporary directory, smaller subsamples are contained in
+        larger ones
+        :param fraction: fraction of wordlist lines to keep
+        :return: path to subsample
+        """
+        wordlist = self.scorer.wordlist_path
+        stamp = (wordlist, os.path.getmtime(wordlist), os.path.getsize(wordlist))
+        if self._order is None or self._order[0] != stamp:
+            with open(wordlist) as f:
+                n_lines = sum(1 for _ in f)
+            order = list(range(n_lines))
+            random.Random(self.random_state).shuffle(order)
+            rank = [0] * n_lines
+            for r, i in enumerate(order):
+                rank[i] = r
+            self._order = (stamp, rank)
+
+        rank = self._order[1]
+        limit = max(1, round(fraction * len(rank)))
+        path = f"{self.scorer.temp_dir}/subsample{limit}.wlh"
+        with open(wordlist) as f, open(path, "w") as out:
+            for i, line in enumerate(f):
+                if rank[i] < limit:
+                    out.write(line)
+        return path
+
+    def run_level(self):
+        member = self.population[0]
+        fresh = [f for f in self.sampler.sample_n(max(self.n_candidates - len(self.population), 0)) if f is not None]
+        # population from combiner is already scored on the full wordlist
+        full = {pop.__hash__(): pop for pop in self.population}
+        candidates = self.population + [f.copy({"level": member.level, "prev": member.prev}) for f in fresh]
+
+        wordlist = self.scorer.wordlist_path
+        fractions = self.fractions(len(candidates))
+        try:
+            for r, fraction in enumerate(fractions):
+                with trace.span("rung", fraction=fraction, candidates=len(candidates)):
+                    if fraction < 1:
+                        self.scorer.wordlist_path = self.subsample(fraction)
+                        keep = max(self.population_size, math.ceil(len(candidates) / self.eta))
+                    else:
+                        self.scorer.wordlist_path = wordlist
+                        keep = self.population_size
+                    # scores of different wordlists must not mix
+                    self.scorer.clear_cache()
+                    rescored = [full[c.__hash__()] if fraction >= 1 and c.__hash__() in full else c.copy() for c in candidates]
+                    self.scorer.score_many([c for c in rescored if c.run_id == -1])
+                    candidates = sorted(rescored, key=self.fitness, reverse=True)[:keep]
+        finally:
+            self.scorer.wordlist_path = wordlist
+            for f in os.listdir(self.scorer.temp_dir):
+                if f.startswith("subsample"):
+                    os.remove(f"{self.scorer.temp_dir}/{f}")
+        self.population = candidates
+        Metaheuristic.run_level(self)
+
+    def new_population(self):
+        return False
+
+
 class NoMetaheuristic(Metaheuristic):
     """
     No metaheuristic
     """
-    def __init__(self, scorer: score.PatgenScorer, sampler: sample.Sampler, statistic: stats.LearningInfo = None):
+    def __init__(self, scorer: score.Scorer, sampler: sample.Sampler, statistic: stats.LearningInfo = None):
         super().__init__(scorer, sampler, n_samples=1, statistic=statistic)
 
     def new_population(self):
@@ -1,5 +1,6 @@
 import random
 import re
+import sys
 
 MAX_PAT_FINISH = 15
 
@@ -115,12 +116,22 @@ class Sample:
             return 0
         return self.stats["tp"]/(self.stats["tp"]+self.stats["fn"])
 
+    def n_patterns(self):
+        """
+        Number of patterns for comparison of samples, if previously run through scorer (.stats are set)
+        :return: number of patterns if .stats set, sys.maxsize if the run failed, else -1
+        """
+        n_patterns = self.stats.get("n_patterns", -1)
+        return sys.maxsize if n_patterns is None else n_patterns
+
     def f_score(self, n: float):
         if n <= 0:
             return -1
         p, r = self.precision(), self.recall()
         if p == -1 or r == -1:
             return -1
+        if p == 0 and r == 0:
+            return 0
         return (1 + n*n) * p * r / ((n*n * p) + r)
 
 
@@ -241,3 +252,24 @@ class FileSampler(Sampler):
         self.file_ptr.close()
         self.file_ptr = open(self.file)
         self.file_open = True
+
+
+class MultiFileSampler(Sampler):
+    """
+    Produce samples from several files (e.g. parameter profiles) in turns, n consecutive samples of n files are the
+    same line of each file. Returns None when the file in turn is exhausted, see FileSampler.
+    """
+    def __init__(self, files: list, repeat: bool = False):
+        super().__init__(ranges=dict())
+        self.samplers = [FileSampler(file, repeat) for file in files]
+        self.turn = 0
+
+    def sample(self):
+        s = self.samplers[self.turn].sample()
+        self.turn = (self.turn + 1) % len(self.samplers)
+        return s
+
+    def reset(self):
+        for sampler in self.samplers:
+            sampler.reset()
+        self.turn = 0
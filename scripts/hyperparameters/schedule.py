@@ -0,0 +1,251 @@
+import asyncio
+import os
+import signal
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows, memory limit is not applied there
+    resource = None
+
+# messages of failed allocations (web2c xmalloc, C library, C++ runtime), searched for in error output of jobs run
+# under memory limit
+ALLOCATION_ERRORS = (b"memory exhausted", b"Cannot allocate memory", b"out of memory", b"std::bad_alloc")
+# signals killing a process over its memory limit (by the kernel, or on access beyond a failed stack extension)
+MEMORY_SIGNALS = (signal.SIGKILL, signal.SIGSEGV)
+
+
+class Job:
+    """
+    Single external program run with input redirected from a file. Output is either written to a file, or streamed
+    line by line to a callback (and optionally also written to the file)
+    """
+    def __init__(self, argv: list, stdin_path: str, stdout_path: str = None, cwd: str = None, on_line=None, on_exit=None):
+        """
+        Create job
+        :param argv: program and its arguments
+        :param stdin_path: file passed to standard input
+        :param stdout_path: file standard output is written to, None to discard the output
+        :param cwd: working directory of the program
+        :param on_line: function called with every decoded output line while the program runs, the program is stopped
+        if it returns True
+        :param on_exit: function called with JobResult as soon as the job ends
+        """
+        self.argv = argv
+        self.stdin_path = stdin_path
+        self.stdout_path = stdout_path
+        self.cwd = cwd
+        self.on_line = on_line
+        self.on_exit = on_exit
+
+
+class JobResult:
+    """
+    Outcome of a job. Status is one of 'ok', 'failed' (nonzero exit status), 'timeout', 'memory' (killed by a signal or
+    failed to allocate under memory limit), 'aborted' (stopped by output callback), 'cancelled' and 'error' (program
+    could not be started)
+    """
+    def __init__(self, status: str, returncode: int = None, elapsed: float = 0.0, message: str = ""):
+        self.status = status
+        self.returncode = returncode
+        self.elapsed = elapsed
+        self.message = message
+
+    def ok(self):
+        """
+        :return: True if the job finished successfully
+        """
+        return self.status == "ok"
+
+    def __str__(self):
+        return f"{self.status} (exit status {self.returncode}, {round(self.elapsed, 2)} s){': ' if self.message else ''}{self.message}"
+
+
+class Scheduler:
+    """
+    Run jobs as subprocesses driven by asyncio event loop, at most .workers at once. Every job is limited in wall-clock
+    time and address space, jobs exceeding the limits are killed and reported in their results.
+    """
+    def __init__(self, workers: int = 1, timeout: float = None, memory_limit: int = None):
+        """
+        Create scheduler
+        :param workers: maximal number of concurrently running jobs
+        :param timeout: wall-clock time limit of one job in seconds, None for no limit
+        :param memory_limit: address space limit of one job in bytes, None for no limit
+        """
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._loop = None
+        self._tasks = []
+
+    def limit_memory(self):
+        """
+        Apply memory limit in the child process before the program is executed
+        """
+        resource.setrlimit(resource.RLIMIT_AS, (self.memory_limit, self.memory_limit))
+
+    async def run_job(self, job: Job, semaphore: asyncio.Semaphore):
+        """
+        Run one job once a slot is free, call its .on_exit when it ends
+        :param job: job to run
+        :param semaphore: semaphore bounding the number of running jobs
+        :return: JobResult
+        """
+        result = await self.run_process(job, semaphore)
+        if job.on_exit is not None:
+            job.on_exit(result)
+        return result
+
+    async def run_process(self, job: Job, semaphore: asyncio.Semaphore):
+        """
+        Run program of one job once a slot is free
+        :param job: job to run
+        :param semaphore: semaphore bounding the number of running jobs
+        :return: JobResult
+        """
+        async with semaphore:
+            start = time.monotonic()
+            preexec = self.limit_memory if self.memory_limit is not None and resource is not None else None
+            log = None
+            # error output is captured under memory limit to recognize allocation failures, its last line is reported
+            stderr = asyncio.subprocess.PIPE if self.memory_limit is not None else None
+            try:
+                if job.stdout_path is not None:
+                    log = open(job.stdout_path, "wb")
+                if job.on_line is not None:
+                    stdout = asyncio.subprocess.PIPE
+                else:
+                    stdout = log if log is not None else asyncio.subprocess.DEVNULL
+                with open(job.stdin_path, "rb") as stdin:
+                    process = await asyncio.create_subprocess_exec(
+                        *job.argv, stdin=stdin, stdout=stdout, stderr=stderr, cwd=job.cwd, preexec_fn=preexec,
+                        start_new_session=True
+                    )
+            except OSError as e:
+                if log is not None:
+                    log.close()
+                return JobResult("error", elapsed=time.monotonic() - start, message=str(e))
+
+            errors = asyncio.ensure_future(self.tail(process.stderr)) if stderr is not None else None
+            try:
+                return await self.wait_process(process, job, log, start, errors)
+            finally:
+                if errors is not None:
+                    # the tail is only consumed by failed runs, the reader must not outlive the job otherwise
+                    errors.cancel()
+                    await asyncio.gather(errors, return_exceptions=True)
+
+    async def wait_process(self, process, job: Job, log, start: float, errors):
+        """
+        Wait for started program of one job to finish, kill it on timeout or when its output callback asks to stop it
+        :param process: asyncio subprocess
+        :param job: job the process runs
+        :param log: open binary file the output is copied to, None if not stored
+        :param start: time.monotonic() when the job started
+        :param errors: task reading the tail of error output, None if error output is not captured
+        :return: JobResult
+        """
+        try:
+            returncode = await asyncio.wait_for(self.drain(process, job, log), self.timeout)
+        except asyncio.TimeoutError:
+            await self.kill(process)
+            return JobResult("timeout", process.returncode, time.monotonic() - start)
+        except asyncio.CancelledError:
+            await asyncio.shield(self.kill(process))
+            raise
+        finally:
+            if log is not None:
+                log.close()
+
+        elapsed = time.monotonic() - start
+        if returncode is None:
+            await self.kill(process)
+            return JobResult("aborted", process.returncode, time.monotonic() - start)
+        if returncode == 0:
+            return JobResult("ok", returncode, elapsed)
+        if errors is not None:
+            error_tail = await errors
+            message = error_tail.decode(errors="replace").strip().rsplit("\n", 1)[-1]
+            if -returncode in MEMORY_SIGNALS or any(error in error_tail for error in ALLOCATION_ERRORS):
+                return JobResult("memory", returncode, elapsed, message)
+            return JobResult("failed", returncode, elapsed, message)
+        return JobResult("failed", returncode, elapsed)
+
+    @staticmethod
+    async def drain(process, job: Job, log):
+        """
+        Pass output of running process to the job callback and wait for the process to finish
+        :param process: asyncio subprocess
+        :param job: job the process runs
+        :param log: open binary file the output is copied to, None if not stored
+        :return: exit status of the process, None if the callback asked to stop it
+        """
+        if job.on_line is not None:
+            async for line in process.stdout:
+                if log is not None:
+                    log.write(line)
+                if job.on_line(line.decode(errors="replace")):
+                    return None
+        return await process.wait()
+
+    @staticmethod
+    async def tail(stream, size: int = 1 << 12):
+        """
+        Read stream to its end
+        :param stream: asyncio stream reader
+        :param size: number of bytes to keep
+        :return: last size bytes of the stream
+        """
+        tail = b""
+        while True:
+            chunk = await stream.read(1 << 16)
+            if not chunk:
+                return tail
+            tail = (tail + chunk)[-size:]
+
+    @staticmethod
+    async def kill(process):
+        """
+        Kill running process together with its children (the process leads its own session) and wait for it
+        :param process: asyncio subprocess
+        """
+        if process.returncode is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await process.wait()
+
+    async def run_jobs(self, jobs: list):
+        """
+        Run all jobs, cancelled ones are reported as such
+        :param jobs: list of Job objects
+        :return: list of JobResult objects in the order of jobs
+        """
+        self._loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.workers)
+        self._tasks = [asyncio.ensure_future(self.run_job(job, semaphore)) for job in jobs]
+        results = await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks, self._loop = [], None
+        return [
+            JobResult("cancelled") if isinstance(result, asyncio.CancelledError) else
+            JobResult("error", message=repr(result)) if isinstance(result, BaseException) else result
+            for result in results
+        ]
+
+    def run(self, jobs: list):
+        """
+        Run all jobs and wait for them
+        :param jobs: list of Job objects
+        :return: list of JobResult objects in the order of jobs
+        """
+        return asyncio.run(self.run_jobs(jobs))
+
+    def cancel(self):
+        """
+        Cancel jobs of the current .run, running jobs are killed. May be called from another thread
+        """
+        if self._loop is not None:
+            for task in self._tasks:
+                self._loop.call_soon_threadsafe(task.cancel)
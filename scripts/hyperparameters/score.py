@@ -1,16 +1,23 @@
+import collections
 import datetime
 import os
 import re
+import shutil
+import sys
+import time
+from array import array
+from stat import S_ISFIFO
 
-from . import sample
+from . import sample, schedule, trace
+from .cache import ScoreCache
 
 
-class PatgenScorer:
+class Scorer:
     """
-    Class for patgen hyperparameter setting evaluation
+    Class for hyphenation pattern generation and hyperparameter setting evaluation. Abstract class, instantiate one of
+    its subclasses
     """
-    def __init__(self, patgen_path: str, wordlist_path: str, translate_path: str, verbose: bool = False, tmp_suffix: str = ""):
-        self.patgen_path: str = patgen_path
+    def __init__(self, wordlist_path: str, translate_path: str, verbose: bool = False, tmp_suffix: str = ""):
         self.wordlist_path: str = wordlist_path
         self.translate_path: str = translate_path
         self.verbose = verbose
@@ -32,11 +39,228 @@ class PatgenScorer:
 
         self._cached: dict = dict()
 
+        # prune(sample, bounds, finished) -> True if the sample cannot be selected given bounds of its statistics
+        # (see PatgenLogParser.bounds) and statistics of runs finished in the same batch, set by metaheuristics
+        self.prune = None
+
+    def score(self, s: sample.Sample):
+        """
+        Evaluate hyperparameter setting and set corresponding attributes in sample. Exact implementation differs for
+        each scorer
+        :param s: hyperparameter values in Sample object
+        """
+        return NotImplemented
+
+    def score_many(self, samples: list):
+        """
+        Evaluate multiple hyperparameter settings, samples get the same IDs and attributes as if they were scored one by
+        one in the given order
+        :param samples: list of Sample objects
+        """
+        for s in samples:
+            self.score(s)
+
+    def export_patterns(self, run_id: int, pattern_file: str):
+        """
+        Move patterns generated in given run out of temporary directory
+        :param run_id: ID of the execution
+        :param pattern_file: path to output pattern file
+        """
+        command = f"mv {self.temp_dir}/{run_id}.pat {pattern_file}"
+        os.system(command)
+
+    def clean(self):
+        """
+        Delete al temporary files used during computations.
+        """
+        os.system("rm -rf "+self.temp_dir)
+
+    def clean_unused(self, ids: set):
+        """
+        Delete temporary files that are not used anymore
+        :param ids: IDs that are still in use
+        """
+        for file in os.listdir(self.temp_dir):
+            match = re.match(r"(?P<id>\d+).pat", file)
+            if match is not None and int(match["id"]) not in ids:
+                os.remove(f"{self.temp_dir}/{file}")
+                if int(match["id"]) == 0:
+                    continue
+                # runs answered from persistent cache have no log
+                for ext in ("log", "in"):
+                    if os.path.isfile(f"{self.temp_dir}/{match['id']}.{ext}"):
+                        os.remove(f"{self.temp_dir}/{match['id']}.{ext}")
+
+    def clear_cache(self):
+        """
+        Clear cached scores
+        """
+        self._cached.clear()
+
+    def reset(self, tmp_suffix: str = ""):
+        """
+        Reset the object to initial state
+        :param tmp_suffix: suffix to temporary directory name
+        """
+        wl_dir = self.wordlist_path.split("/")
+        if len(wl_dir) > 1:
+            tmp_path = "/".join(wl_dir[:-1])
+        else:
+            tmp_path = "."
+        if "tmp"+tmp_suffix not in os.listdir(tmp_path):
+            os.mkdir(tmp_path + "/tmp" + tmp_suffix)
+
+        self.temp_dir: str = tmp_path + "/tmp" + tmp_suffix
+
+        if "0.pat" not in os.listdir(self.temp_dir):
+            os.system(f"touch {self.temp_dir}/0.pat")
+
+        self.max_id: int = 0
+
+        self.clear_cache()
+
+
+GOOD_BAD_MISSED = re.compile(r"(\d+) good, (\d+) bad, (\d+) missed")
+TRIE_NODES = re.compile(r"pattern trie has (\d+) nodes, trie_max = \d+, \d+ outputs")
+LEVEL_PATTERNS = re.compile(r"total of (\d+) patterns at hyph_level \d+")
+NODES_DELETED = re.compile(r"(\d+) nodes and \d+ outputs deleted")
+PATTERNS_READ = re.compile(r"(\d+) patterns read in")
+PATTERNS_ADDED = re.compile(r"(\d+) good and \d+ bad patterns added")
+
+
+class PatgenLogParser:
+    """
+    Incremental parser of patgen output, lines are fed one by one as patgen prints them
+    """
+    def __init__(self, level: int = 1):
+        """
+        Create parser
+        :param level: hyphenation level generated by the run
+        """
+        self.level = level
+        self.tp, self.fp, self.fn = 0, 0, 0
+        self.trie_nodes = 0
+        self.level_patterns = 0
+        self.counted = False
+        self.patterns_read = 0
+        self.pass_patterns = 0
+
+    def feed(self, line: str):
+        """
+        Process one line of patgen output
+        :param line: output line
+        :return: True if the line changed bounds of the final statistics
+        """
+        if line[:1].isdigit():
+            stat = GOOD_BAD_MISSED.match(line)
+            if stat is not None:
+                self.tp, self.fp, self.fn = int(stat[1]), int(stat[2]), int(stat[3])
+                self.counted = True
+                return True
+            stat = PATTERNS_ADDED.match(line)
+            if stat is not None:
+                self.pass_patterns = max(self.pass_patterns, int(stat[1]))
+                return True
+            stat = NODES_DELETED.match(line)
+            if stat is not None:
+                self.trie_nodes -= int(stat[1])
+                return False
+            stat = PATTERNS_READ.match(line)
+            if stat is not None:
+                self.patterns_read = int(stat[1])
+                return True
+        elif line.startswith("pattern trie has"):
+            stat = TRIE_NODES.match(line)
+            if stat is not None:
+                self.trie_nodes = int(stat[1])
+        elif line.startswith("total of"):
+            stat = LEVEL_PATTERNS.match(line)
+            if stat is not None:
+                self.level_patterns = int(stat[1])
+        return False
+
+    def stats(self):
+        """
+        :return: dictionary of ('tp' true positives, 'fp' false positives, 'fn' false negatives, 'trie_nodes'
+        the number of nodes in pattern trie, 'level_patterns' the number of patterns generated on the level)
+        """
+        return {"tp": self.tp, "fp": self.fp, "fn": self.fn, "trie_nodes": self.trie_nodes,
+                "level_patterns": self.level_patterns}
+
+    def bounds(self):
+        """
+        Bound the statistics the run ends with by what has been printed so far. Odd levels only add hyphens, so true
+        positives never exceed all hyphens and false positives never decrease. Even levels only remove hyphens, so true
+        positives never increase. Patterns of previous levels are kept and patterns selected in one pass are distinct.
+        :return: dictionary of ('precision' upper bound, 'recall' upper bound, 'n_patterns' lower bound)
+        """
+        precision, recall = 1.0, 1.0
+        total = self.tp + self.fn
+        if self.counted and total > 0:
+            if self.level % 2 == 1:
+                precision = total / (total + self.fp)
+            else:
+                recall = self.tp / total
+        return {"precision": precision, "recall": recall, "n_patterns": max(self.patterns_read, self.pass_patterns)}
+
+
+class PatgenScorer(Scorer):
+    """
+    Class for patgen hyperparameter setting evaluation
+    """
+    def __init__(self, patgen_path: str, wordlist_path: str, translate_path: str, verbose: bool = False, tmp_suffix: str = "",
+                 cache_dir: str = "", cache_size: int = 1 << 30, workers: int = 1, timeout: float = None,
+                 memory_limit: int = None, keep_logs: bool = False):
+        """
+        Create scorer
+        :param patgen_path: path to patgen executable
+        :param wordlist_path: path to wordlist
+        :param translate_path: path to translate file
+        :param verbose: print out every scored sample
+        :param tmp_suffix: suffix to temporary directory name
+        :param cache_dir: directory of persistent score cache shared between runs, disabled if empty
+        :param cache_size: maximal size of persistent score cache in bytes
+        :param workers: maximal number of patgen processes run at once by .score_many
+        :param timeout: wall-clock time limit of one patgen run in seconds, None for no limit
+        :param memory_limit: address space limit of one patgen run in bytes, None for no limit
+        :param keep_logs: store patgen output of every run in <run_id>.log, it is only parsed on the fly otherwise
+        """
+        super().__init__(wordlist_path, translate_path, verbose, tmp_suffix)
+        self.patgen_path: str = patgen_path
+        self.scheduler = schedule.Scheduler(workers, timeout, memory_limit)
+        self.keep_logs = keep_logs
+        self._finished: dict = dict()
+        self.disk_cache = ScoreCache(cache_dir, cache_size) if cache_dir else None
+
     def score(self, s: sample.Sample):
         """
         Evaluate hyperparameter setting and set corresponding attributes in sample
         :param s: hyperparameter values in Sample object
         """
+        self.score_many([s])
+
+    def score_many(self, samples: list):
+        """
+        Evaluate multiple hyperparameter settings, patgen processes are run by .scheduler. Samples get the same
+        IDs and attributes as if they were scored one by one in the given order
+        :param samples: list of Sample objects
+        """
+        with trace.span("score_batch", samples=len(samples)):
+            prepared = [self.prepare(s) for s in samples]
+            to_run = [s for s, (_, stats) in zip(samples, prepared) if stats is None]
+            for s, (_, stats) in zip(samples, prepared):
+                if stats is not None:
+                    self._finished[s.run_id] = stats
+            results = dict(zip([s.run_id for s in to_run], self.scheduler.run([self.job(s) for s in to_run])))
+            for s, (key, stats) in zip(samples, prepared):
+                self.finish(s, key, stats, results.get(s.run_id))
+
+    def prepare(self, s: sample.Sample):
+        """
+        Assign ID to the sample, write its patgen input and look it up in persistent cache
+        :param s: hyperparameter values in Sample object
+        :return: (cache key or None, cached statistics or None)
+        """
         run_id = self.max_id + 1
         s.run_id = run_id
         self.max_id += 1
@@ -55,22 +279,95 @@ class PatgenScorer:
                                 )
                       )
 
-        command = " ".join([f"cat {self.temp_dir}/{run_id}.in | (",
-                            self.patgen_path,
-                            self.wordlist_path,
-                            f"{self.temp_dir}/{s.prev}.pat",
-                            f"{self.temp_dir}/{run_id}.pat",
-                            self.translate_path, ") >",
-                            f"{self.temp_dir}/{run_id}.log"])
-        os.system(command)
+        key, stats = None, None
+        if self.disk_cache is not None:
+            key = self.disk_cache.key(self.wordlist_path, self.translate_path, f"{self.temp_dir}/{s.prev}.pat", s)
+            if key is not None:
+                stats = self.disk_cache.get(key, f"{self.temp_dir}/{run_id}.pat")
+                trace.count("cache_misses" if stats is None else "cache_hits")
+        return key, stats
+
+    def job(self, s: sample.Sample):
+        """
+        Create patgen job for prepared sample
+        :param s: hyperparameter values in Sample object, with ID assigned by .prepare
+        :return: schedule.Job
+        """
+        # every patgen run has its own working directory, so that its pattmp.* files do not collide with other runs
+        temp_dir = os.path.abspath(self.temp_dir)
+        work_dir = f"{temp_dir}/run{s.run_id}"
+        os.makedirs(work_dir, exist_ok=True)
+        argv = [self.patgen_path,
+                os.path.abspath(self.wordlist_path),
+                f"{temp_dir}/{s.prev}.pat",
+                f"{temp_dir}/{s.run_id}.pat",
+                os.path.abspath(self.translate_path)]
+        parser = PatgenLogParser(s.level)
+        output_bytes = 0
+
+        def on_line(line: str):
+            nonlocal output_bytes
+            output_bytes += len(line)
+            # True stops the run
+            return parser.feed(line) and self.prune is not None and self.prune(s, parser.bounds(), list(self._finished.values()))
 
-        for f in os.listdir():
-            if f.startswith("pattmp."):
-                os.system(f"mv {f} {self.temp_dir}/{run_id}.pattmp")
+        def on_exit(result: schedule.JobResult):
+            if result.ok():
+                stats = parser.stats()
+                # the output does not tell patterns sharing their letters (one line of pattern file) apart, they are
+                # counted exactly in the pattern file
+                stats["n_patterns"] = self.count_patterns(s.run_id)
+                self._finished[s.run_id] = stats
+            if trace.tracer.enabled:
+                trace.tracer.add_span("patgen", time.perf_counter() - result.elapsed, result.elapsed, run_id=s.run_id,
+                                      level=s.level, status=result.status)
+                trace.count("patgen_runs")
+                if not result.ok():
+                    trace.count(f"patgen_{result.status}")
+                trace.count("patgen_output_bytes", output_bytes)
+                # inputs are read by patgen, the wordlist may be a named pipe of unknown size
+                inputs = [argv[1], argv[2], argv[4]]
+                trace.count("patgen_bytes_read", sum(os.path.getsize(f) for f in inputs if os.path.isfile(f)))
+                if os.path.isfile(argv[3]):
+                    trace.count("patgen_bytes_written", os.path.getsize(argv[3]))
 
-        stats = self.get_statistics(run_id)
-        stats["n_patterns"] = self.count_patterns(run_id)
-        self._cached[s_hash] = stats
+        log = f"{temp_dir}/{s.run_id}.log" if self.keep_logs else None
+        return schedule.Job(argv, f"{temp_dir}/{s.run_id}.in", log, cwd=work_dir, on_line=on_line, on_exit=on_exit)
+
+    def finish(self, s: sample.Sample, key, stats, result: schedule.JobResult = None):
+        """
+        Collect statistics of a finished run and store them into the sample and caches. A failed or dominated (stopped
+        by .prune) run is scored with no true positives and unknown (None) trie nodes and number of patterns, its patterns
+        are those of the previous level and 'status' tells the reason
+        :param s: hyperparameter values in Sample object
+        :param key: persistent cache key as returned by .prepare
+        :param stats: cached statistics as returned by .prepare, None if patgen was run
+        :param result: result of patgen job, None if patgen was not run
+        """
+        if result is not None:
+            work_dir = f"{self.temp_dir}/run{s.run_id}"
+            for f in os.listdir(work_dir):
+                if f.startswith("pattmp."):
+                    os.replace(f"{work_dir}/{f}", f"{self.temp_dir}/{s.run_id}.pattmp")
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        if stats is None and not result.ok():
+            shutil.copyfile(f"{self.temp_dir}/{s.prev}.pat", f"{self.temp_dir}/{s.run_id}.pat")
+            # sizes of the patterns are not known, see sample.Sample.n_patterns for comparisons
+            stats = {"tp": 0, "fp": 0, "fn": 0, "trie_nodes": None, "level_patterns": 0, "n_patterns": None}
+            if result.status == "aborted":
+                stats["status"] = "dominated"
+            else:
+                stats["status"] = result.status
+                stats["failure"] = str(result)
+                if self.verbose:
+                    print(f"Patgen run {s.run_id} failed: {result}", file=sys.stderr)
+        elif stats is None:
+            stats = self._finished[s.run_id]
+            if key is not None:
+                self.disk_cache.put(key, stats, f"{self.temp_dir}/{s.run_id}.pat")
+        self._cached[s.__hash__()] = stats
+        self._finished.pop(s.run_id, None)
 
         s.stats = stats
         s.timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
@@ -85,9 +382,9 @@ class PatgenScorer:
         :return: number of patterns read
         """
         n_patterns = 0
-        with open(f"{self.temp_dir}/{run_id}.pat") as outfile:
-            for _ in outfile:
-                n_patterns += 1
+        with open(f"{self.temp_dir}/{run_id}.pat", "rb") as outfile:
+            for chunk in iter(lambda: outfile.read(1 << 16), b""):
+                n_patterns += chunk.count(b"\n")
         return n_patterns
 
     def get_statistics(self, run_id: int):
@@ -96,72 +393,332 @@ class PatgenScorer:
         :return: dictionary of ('tp' true positives, 'fp' false positives, 'fn' false negatives, 'trie_nodes'
         the number of nodes in pattern trie)
         """
-        tp, fp, fn = 0, 0, 0
-        trie_nodes = 0
-
+        parser = PatgenLogParser()
         with open(f"{self.temp_dir}/{run_id}.log") as out:
             for line in out:
-                stat = re.match(r"(?P<tp>\d+) good, (?P<fp>\d+) bad, (?P<fn>\d+) missed", line)
-                if stat is not None:
-                    tp = int(stat["tp"])
-                    fp = int(stat["fp"])
-                    fn = int(stat["fn"])
-                stat = re.match(r"pattern trie has (?P<trie_nodes>\d+) nodes, trie_max = \d+, \d+ outputs", line)
-                if stat is not None:
-                    trie_nodes = int(stat["trie_nodes"])
-                stat = re.match(r"total of (?P<level_patterns>\d+) patterns at hyph_level \d+", line)
-                if stat is not None:
-                    level_patterns = int(stat["level_patterns"])
-                stat = re.match(r"(?P<nodes_deleted>\d+) nodes and \d+ outputs deleted", line)
-                if stat is not None:
-                    trie_nodes -= int(stat["nodes_deleted"])
-
-        return {"tp": tp, "fp": fp, "fn": fn, "trie_nodes" : trie_nodes, "level_patterns": level_patterns}
+                parser.feed(line)
+        return parser.stats()
 
-    def clean(self):
+
+def dot_order(pat_len: int):
+    """
+    Order in which patgen tries hyphen positions within patterns of given length (from the middle outwards)
+    :param pat_len: pattern length
+    :return: list of dot positions
+    """
+    order = []
+    pat_dot = pat_len // 2
+    dot1 = pat_dot * 2
+    while True:
+        pat_dot = dot1 - pat_dot
+        dot1 = pat_len * 2 - dot1 - 1
+        order.append(pat_dot)
+        if pat_dot == pat_len:
+            return order
+
+
+class LiangScorer(Scorer):
+    """
+    In-process pattern generation by Liang's algorithm with the same selection rules as patgen. The wordlist and all
+    generated patterns stay in memory between levels and candidate evaluations, patterns are written to disk only
+    when exported.
+    """
+    def __init__(self, wordlist_path: str, translate_path: str, verbose: bool = False, tmp_suffix: str = "", hyphenation_mark: str = "-"):
+        super().__init__(wordlist_path, translate_path, verbose, tmp_suffix)
+        self.hyphenation_mark = hyphenation_mark
+        self._wordlist = None
+        # internal letters of the words that are written differently in patterns (see .translation)
+        self._letters: dict = dict()
+        self._runs: dict = {0: (None, dict())}
+        self._levels = collections.OrderedDict()
+
+    def score(self, s: sample.Sample):
+        run_id = self.max_id + 1
+        s.run_id = run_id
+        self.max_id += 1
+
+        key = (s.__hash__(), s.level)
+        if key not in self._cached:
+            with trace.span("liang", run_id=run_id, level=s.level):
+                self._cached[key] = self.generate(s)
+            trace.count("liang_runs")
+        else:
+            trace.count("memory_cache_hits")
+        stats, added = self._cached[key]
+        self._runs[run_id] = (s.prev, added)
+
+        s.stats = stats.copy()
+        s.timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+
+        if self.verbose:
+            print(str(s))
+
+    def generate(self, s: sample.Sample):
         """
-        Delete al temporary files used during computations.
+        Generate patterns of one level on top of the patterns of run s.prev
+        :param s: hyperparameter values in Sample object
+        :return: (dictionary of ('tp', 'fp', 'fn', 'trie_nodes', 'level_patterns', 'n_patterns'), patterns added
+        in this level as dictionary of letters to {dot: level})
         """
-        os.system("rm -rf "+self.temp_dir)
+        words, hyphens = self.load_wordlist()
+        left_hyphen_min, right_hyphen_min = self.hyphen_min()
+        levels = self.word_levels(s.prev)
+        hyph_level = s.level
+        hyphenating = hyph_level % 2 == 1
 
-    def clean_unused(self, ids: set):
+        # positions that patterns of this level can still change, encoded as word index << 16 | letter index
+        good, bad = array("q"), array("q")
+        tp, fp, fn = 0, 0, 0
+        for w, word in enumerate(words):
+            n = len(word) - 2
+            if n >= 1 << 16:
+                raise ValueError(f"Word {word} is too long")
+            for k in range(max(left_hyphen_min, 1), min(n - right_hyphen_min, n - 1) + 1):
+                is_hyf = hyphens[w] >> k & 1 == 1
+                found = levels[w][k] % 2 == 1
+                tp += is_hyf and found
+                fp += found and not is_hyf
+                fn += is_hyf and not found
+                if found == hyphenating:
+                    continue
+                if is_hyf == hyphenating:
+                    good.append(w << 16 | k)
+                else:
+                    bad.append(w << 16 | k)
+
+        added = dict()
+        level_patterns = 0
+        more_this_level = [True] * (s.pat_finish + 2)
+        for pat_len in range(s.pat_start, s.pat_finish + 1):
+            for pat_dot in dot_order(pat_len):
+                if not more_this_level[pat_dot]:
+                    continue
+                good_count = collections.Counter(self.candidates(good, pat_len, pat_dot))
+                bad_count = collections.Counter(self.candidates(bad, pat_len, pat_dot))
+                selected = set()
+                more_to_come = False
+                for candidate in good_count.keys() | bad_count.keys():
+                    g, b = good_count.get(candidate, 0), bad_count.get(candidate, 0)
+                    if s.good_weight * g < s.threshold:
+                        continue  # cannot be selected, neither can any longer pattern containing it
+                    if s.good_weight * g - s.bad_weight * b >= s.threshold:
+                        selected.add(candidate)
+                    else:
+                        more_to_come = True
+                more_this_level[pat_dot] = more_to_come
+                if not selected:
+                    continue
+
+                level_patterns += len(selected)
+                for candidate in selected:
+                    added.setdefault(candidate, dict())[pat_dot] = hyph_level
+                good, resolved_good = self.resolve(good, selected, pat_len, pat_dot)
+                bad, resolved_bad = self.resolve(bad, selected, pat_len, pat_dot)
+                if hyphenating:
+                    tp, fn, fp = tp + resolved_good, fn - resolved_good, fp + resolved_bad
+                else:
+                    fp, tp, fn = fp - resolved_good, tp - resolved_bad, fn + resolved_bad
+            for k in range(len(more_this_level) - 1, 0, -1):
+                if not more_this_level[k - 1]:
+                    more_this_level[k] = False
+
+        patterns = self.patterns(s.prev)
+        for letters, outputs in added.items():
+            patterns.setdefault(letters, dict()).update(outputs)
+        prefixes = set()
+        for letters in patterns:
+            for i in range(1, len(letters) + 1):
+                prefixes.add(letters[:i])
+
+        stats = {"tp": tp, "fp": fp, "fn": fn, "trie_nodes": len(prefixes), "level_patterns": level_patterns,
+                 "n_patterns": len(patterns)}
+        return stats, added
+
+    def candidates(self, positions: array, pat_len: int, pat_dot: int):
         """
-        Delete temporary files that are not used anymore
-        :param ids: IDs that are still in use
+        Cut candidate patterns around given positions
+        :param positions: encoded word positions
+        :param pat_len: pattern length
+        :param pat_dot: hyphen position within pattern
+        :return: list of candidate patterns (letters only) fitting into their words
         """
-        for file in os.listdir(self.temp_dir):
-            match = re.match(r"(?P<id>\d+).pat", file)
-            if match is not None and int(match["id"]) not in ids:
-                os.remove(f"{self.temp_dir}/{file}")
-                if int(match["id"]) == 0:
+        words = self._wordlist[1]
+        offset = 1 - pat_dot
+        return [candidate for p in positions
+                if len(candidate := words[p >> 16][max((p & 0xffff) + offset, 0):(p & 0xffff) + offset + pat_len]) == pat_len
+                and (p & 0xffff) + offset >= 0]
+
+    def resolve(self, positions: array, selected: set, pat_len: int, pat_dot: int):
+        """
+        Remove positions covered by newly selected patterns
+        :param positions: encoded word positions
+        :param selected: selected patterns
+        :param pat_len: pattern length
+        :param pat_dot: hyphen position within selected patterns
+        :return: (remaining positions, number of removed positions)
+        """
+        words = self._wordlist[1]
+        offset = 1 - pat_dot
+        remaining = array("q", [p for p in positions
+                                if (p & 0xffff) + offset < 0
+                                or words[p >> 16][(p & 0xffff) + offset:(p & 0xffff) + offset + pat_len] not in selected])
+        return remaining, len(positions) - len(remaining)
+
+    def load_wordlist(self):
+        """
+        Read wordlist into memory, the wordlist is read again only if the path or the file (or translate file) changes.
+        Letters are translated as by patgen according to the translate file, see .translation
+        :return: (list of words in internal letters with word boundaries, list of hyphenation bitmasks)
+        """
+        st = os.stat(self.wordlist_path)
+        tr = os.stat(self.translate_path)
+        # named pipe can be read only once per writer, its content is assumed to be fixed until reset
+        stamp = (self.wordlist_path, None, None) if S_ISFIFO(st.st_mode) else (self.wordlist_path, st.st_mtime, st.st_size)
+        stamp += (tr.st_mtime, tr.st_size)
+        if self._wordlist is None or self._wordlist[0] != stamp:
+            translation, self._letters = self.translation()
+            if translation:
+                representations = sorted(list(translation) + [self.hyphenation_mark], key=len, reverse=True)
+                tokenizer = re.compile("|".join(re.escape(r) for r in representations))
+            words, hyphens = [], []
+            with trace.span("load_wordlist"), open(self.wordlist_path) as wl:
+                for line in wl:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    if translation:
+                        tokens = tokenizer.findall(line)
+                        if sum(len(token) for token in tokens) != len(line):
+                            raise ValueError(f"Word {line} contains letters missing in {self.translate_path}")
+                        parts = "".join(translation.get(token, "\0") for token in tokens).split("\0")
+                    else:
+                        parts = line.lower().split(self.hyphenation_mark)
+                    mask, position = 0, 0
+                    for part in parts[:-1]:
+                        position += len(part)
+                        mask |= 1 << position
+                    words.append("." + "".join(parts) + ".")
+                    hyphens.append(mask)
+            self._wordlist = (stamp, words, hyphens)
+            self._levels.clear()
+        return self._wordlist[1], self._wordlist[2]
+
+    def translation(self):
+        """
+        Read letters from translate file. Each line after the first one lists representations of one letter separated
+        by its first character, the first representation is used in patterns and the others (e.g. upper case) are
+        mapped to it. Letters are represented internally by single characters, letters of more characters by characters
+        of private use area
+        :return: (dictionary of representations to internal letters, empty if the file lists no letters (letters are
+        lowercased then), dictionary of internal letters to their representation in patterns if they differ)
+        """
+        translation, letters = dict(), dict()
+        with open(self.translate_path) as tr:
+            tr.readline()
+            for line in tr:
+                line = line.rstrip("\n")
+                if len(line) < 2:
+                    continue
+                representations = []
+                for representation in line[1:].split(line[0]):
+                    if not representation:
+                        break
+                    representations.append(representation)
+                if not representations:
                     continue
-                os.remove(f"{self.temp_dir}/{match['id']}.log")
-                os.remove(f"{self.temp_dir}/{match['id']}.in")
+                letter = representations[0]
+                if len(letter) > 1:
+                    letters[chr(0xE000 + len(letters))] = letter
+                    letter = chr(0xE000 + len(letters) - 1)
+                for representation in representations:
+                    translation.setdefault(representation, letter)
+        return translation, letters
 
-    def clear_cache(self):
+    def hyphen_min(self):
         """
-        Clear cached scores
+        Read left_hyphen_min and right_hyphen_min from translate file
+        :return: (left_hyphen_min, right_hyphen_min), (1, 1) if not specified
         """
-        self._cached.clear()
+        with open(self.translate_path) as tr:
+            line = tr.readline().split()
+        if len(line) >= 2 and line[0].isnumeric() and line[1].isnumeric():
+            return int(line[0]), int(line[1])
+        return 1, 1
 
-    def reset(self, tmp_suffix: str = ""):
+    def patterns(self, run_id: int):
         """
-        Reset the object to initial state
-        :param tmp_suffix: suffix to temporary directory name
+        Collect all patterns valid after given run
+        :param run_id: ID of the execution
+        :return: dictionary of pattern letters to {dot: level}
         """
-        wl_dir = self.wordlist_path.split("/")
-        if len(wl_dir) > 1:
-            tmp_path = "/".join(wl_dir[:-1])
-        else:
-            tmp_path = "."
-        if "tmp"+tmp_suffix not in os.listdir(tmp_path):
-            os.mkdir(tmp_path + "/tmp" + tmp_suffix)
+        chain = []
+        while run_id is not None:
+            run_id, added = self._runs[run_id]
+            chain.append(added)
+        patterns = dict()
+        for added in reversed(chain):
+            for letters, outputs in added.items():
+                patterns.setdefault(letters, dict()).update(outputs)
+        return patterns
 
-        self.temp_dir: str = tmp_path + "/tmp" + tmp_suffix
+    def word_levels(self, run_id: int):
+        """
+        Hyphenate all words of the wordlist with patterns valid after given run. Levels of a few recent runs are kept
+        :param run_id: ID of the execution
+        :return: list of bytearrays, i-th item holds for each letter the level before it in i-th word
+        """
+        if run_id in self._levels:
+            self._levels.move_to_end(run_id)
+            return self._levels[run_id]
+        words, _ = self.load_wordlist()
+        patterns = self.patterns(run_id)
+        prefixes = set()
+        for letters in patterns:
+            for i in range(1, len(letters) + 1):
+                prefixes.add(letters[:i])
+        levels = []
+        for word in words:
+            word_levels = bytearray(len(word) - 1)
+            for start in range(len(word)):
+                for end in range(start + 1, len(word) + 1):
+                    letters = word[start:end]
+                    if letters not in prefixes:
+                        break
+                    for dot, level in patterns.get(letters, dict()).items():
+                        if 0 <= start + dot - 1 < len(word_levels) and level > word_levels[start + dot - 1]:
+                            word_levels[start + dot - 1] = level
+            levels.append(word_levels)
+        self._levels[run_id] = levels
+        if len(self._levels) > 2:
+            self._levels.popitem(last=False)
+        return levels
 
-        if "0.pat" not in os.listdir(self.temp_dir):
-            os.system(f"touch {self.temp_dir}/0.pat")
+    def export_patterns(self, run_id: int, pattern_file: str):
+        with open(pattern_file, "w") as out:
+            for letters, outputs in sorted(self.patterns(run_id).items()):
+                pattern = ""
+                for dot, letter in enumerate(letters):
+                    if outputs.get(dot, 0) > 0:
+                        pattern += str(outputs[dot])
+                    pattern += self._letters.get(letter, letter)
+                if outputs.get(len(letters), 0) > 0:
+                    pattern += str(outputs[len(letters)])
+                out.write(pattern + "\n")
 
-        self.max_id: int = 0
+    def clean_unused(self, ids: set):
+        Scorer.clean_unused(self, ids)
+        used = {0}
+        for run_id in ids:
+            while run_id is not None and run_id not in used:
+                used.add(run_id)
+                run_id = self._runs[run_id][0]
+        for run_id in set(self._runs) - used:
+            del self._runs[run_id]
+            self._levels.pop(run_id, None)
 
-        self.clear_cache()
+    def reset(self, tmp_suffix: str = ""):
+        Scorer.reset(self, tmp_suffix)
+        self._runs = {0: (None, dict())}
+        self._levels.clear()
+        if self._wordlist is not None and self._wordlist[0][1] is None:
+            self._wordlist = None
@@ -1,43 +1,77 @@
 import os
 import re
-import matplotlib
-import matplotlib.pyplot as plt
 import sys
 
 from . import sample
 
 class DatasetInfo:
-    def __init__(self, file: str):
+    def __init__(self, file: str = ""):
+        """
+        Collect statistics of dataset
+        :param file: path to word list to be read, if empty lines are passed by add and statistics finished by finish
+        """
+        self.lang = ""
+        self.dataset_name = ""
+        self.size_lines = 0
+        self.size_bytes = 0
+        self.ambiguous = 0
+        self.len_min, self.len_max = -1, -1
+        self.len_avg, self.hyph_avg = 0.0, 0.0
+        self.len_total = 0
+        self.hyph_total = 0
+        # word without hyphens -> bitmask of hyphen positions of its hyphenation (identifies the line), set of bitmasks
+        # if the word has more hyphenations
+        self.words = dict()
+        if file:
+            with open(file, "r") as f:
+                for line in f:
+                    self.add(line)
+            self.finish(file)
+
+    def add(self, line: str):
+        """
+        Account for one line of the dataset
+        :param line: line as read from the word list (including line break)
+        """
+        self.size_lines += 1
+        line_len = len(line.strip())
+        self.len_total += line_len
+        mask = 0
+        i = line.find("-")
+        while i != -1:
+            self.hyph_total += 1
+            mask |= 1 << i
+            i = line.find("-", i + 1)
+        line_nohyph = line.replace("-", "") if mask else line
+        masks = self.words.get(line_nohyph)
+        if masks is None:
+            self.words[line_nohyph] = mask
+        elif isinstance(masks, int):
+            if mask != masks:
+                self.ambiguous += 1
+                self.words[line_nohyph] = {masks, mask}
+        elif mask not in masks:
+            self.ambiguous += 1
+            masks.add(mask)
+        if self.len_min == -1 or line_len < self.len_min:
+            self.len_min = line_len
+        if self.len_max == -1 or line_len > self.len_max:
+            self.len_max = line_len
+
+    def finish(self, file: str):
+        """
+        Compute final statistics after all lines were added
+        :param file: path to the word list, its size is measured and dataset name is derived from its path
+        """
         abspath = os.path.abspath(file)
         abspath = re.sub(r"\\+", "/", abspath)
         path = abspath.split("/")
         self.lang = "" if len(path) < 3 else path[-3]
         self.dataset_name = "" if len(path) < 2 else path[-2]
-        self.size_lines = 0
-        len_total = 0
-        hyph_total = 0
-        words = set()
-        hyphenations = set()
-        self.ambiguous = 0
-        self.len_min, self.len_max = -1, -1
-        with open(file, "r") as f:
-            for line in f:
-                self.size_lines += 1
-                line_len = len(line.strip())
-                len_total += line_len
-                hyph_total += line.count("-")
-                line_nohyph = re.sub("-", "", line)
-                if line_nohyph in words and line not in hyphenations:
-                    self.ambiguous += 1
-                words.add(line_nohyph)
-                hyphenations.add(line)
-                if self.len_min == -1 or line_len < self.len_min:
-                    self.len_min = line_len
-                if self.len_max == -1 or line_len > self.len_max:
-                    self.len_max = line_len
-        self.len_avg = len_total / self.size_lines
-        self.hyph_avg = hyph_total / self.size_lines
+        self.len_avg = self.len_total / self.size_lines
+        self.hyph_avg = self.hyph_total / self.size_lines
         self.size_bytes = os.path.getsize(file)
+        self.words = dict()  # not needed anymore
 
     def report(self, tabular: bool = True):
         """
@@ -120,7 +154,10 @@ class LearningInfo:
             else:
                 print(f"Unknown metric {m} provided", file=sys.stderr)
 
+        # imported only for plotting, dataset statistics do not need it
+        import matplotlib
         matplotlib.use('TkAgg')
+        import matplotlib.pyplot as plt
 
         for name, func in metric_funcs:
             data = dict(level=list(), metric=list())
@@ -149,14 +186,18 @@ class PatternsInfo:
         self.size_bytes = os.path.getsize(file)
         self.levels = 0
         len_total = 0
+        n_lines = 0
         with open(file) as f:
             for line in f:
+                n_lines += 1
                 len_line = len(line.strip())
                 len_total += len_line
                 levels = re.findall("\d+", line)
                 for level in levels:
                     if int(level) > self.levels:
                         self.levels = int(level)
+        if self.n_patterns is None:  # failed run, patterns of the previous level
+            self.n_patterns = n_lines
         self.len_avg = len_total / self.n_patterns
         self.s = s
 
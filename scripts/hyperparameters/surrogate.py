@@ -0,0 +1,127 @@
+import math
+
+
+def cholesky(a: list):
+    """
+    Cholesky decomposition of symmetric positive definite matrix
+    :param a: matrix as list of rows
+    :return: lower triangular matrix l such that a = l * l^T
+    """
+    n = len(a)
+    l = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1):
+            s = a[i][j] - sum(l[i][k] * l[j][k] for k in range(j))
+            if i == j:
+                if s <= 0:
+                    raise ValueError("Matrix is not positive definite")
+                l[i][i] = math.sqrt(s)
+            else:
+                l[i][j] = s / l[j][j]
+    return l
+
+
+def solve_lower(l: list, b: list):
+    """
+    Solve l * x = b by forward substitution
+    :param l: lower triangular matrix
+    :param b: right-hand side
+    :return: x
+    """
+    x = [0.0] * len(b)
+    for i in range(len(b)):
+        x[i] = (b[i] - sum(l[i][k] * x[k] for k in range(i))) / l[i][i]
+    return x
+
+
+def solve_upper_transposed(l: list, b: list):
+    """
+    Solve l^T * x = b by backward substitution
+    :param l: lower triangular matrix
+    :param b: right-hand side
+    :return: x
+    """
+    n = len(b)
+    x = [0.0] * n
+    for i in reversed(range(n)):
+        x[i] = (b[i] - sum(l[k][i] * x[k] for k in range(i + 1, n))) / l[i][i]
+    return x
+
+
+def expected_improvement(mean: float, sd: float, best: float, xi: float = 0.0):
+    """
+    Expected improvement of a normally distributed value over the best value found so far
+    :param mean: predicted mean
+    :param sd: predicted standard deviation
+    :param best: best value observed so far
+    :param xi: minimal improvement worth exploring
+    :return: expected improvement
+    """
+    improvement = mean - best - xi
+    if sd <= 0:
+        return max(improvement, 0.0)
+    z = improvement / sd
+    cdf = 0.5 * (1 + math.erf(z / math.sqrt(2)))
+    pdf = math.exp(-0.5 * z * z) / math.sqrt(2 * math.pi)
+    return improvement * cdf + sd * pdf
+
+
+class GaussianProcess:
+    """
+    Gaussian process regression with squared exponential kernel. Inputs are expected to be scaled into unit cube,
+    outputs are standardized internally.
+    """
+    def __init__(self, length_scale: float = 0.25, noise: float = 1e-6):
+        """
+        Create unfitted process
+        :param length_scale: kernel length scale
+        :param noise: variance of observation noise (relative to output variance)
+        """
+        self.length_scale = length_scale
+        self.noise = noise
+        self.xs = []
+        self.chol = []
+        self.alpha = []
+        self.mean = 0.0
+        self.scale = 1.0
+
+    def kernel(self, a: list, b: list):
+        """
+        Squared exponential covariance of two inputs
+        """
+        return math.exp(-sum((x - y) ** 2 for x, y in zip(a, b)) / (2 * self.length_scale ** 2))
+
+    def fit(self, xs: list, ys: list):
+        """
+        Condition the process on observations
+        :param xs: list of input vectors
+        :param ys: list of observed values
+        :return: self
+        """
+        self.xs = list(xs)
+        self.mean = sum(ys) / len(ys)
+        self.scale = math.sqrt(sum((y - self.mean) ** 2 for y in ys) / len(ys)) or 1.0
+        ys = [(y - self.mean) / self.scale for y in ys]
+
+        noise = self.noise
+        while True:
+            k = [[self.kernel(a, b) + (noise if i == j else 0.0) for j, b in enumerate(xs)] for i, a in enumerate(xs)]
+            try:
+                self.chol = cholesky(k)
+                break
+            except ValueError:  # numerically singular, e.g. nearly identical inputs
+                noise *= 10
+        self.alpha = solve_upper_transposed(self.chol, solve_lower(self.chol, ys))
+        return self
+
+    def predict(self, x: list):
+        """
+        Predict value at given input
+        :param x: input vector
+        :return: (mean, standard deviation)
+        """
+        ks = [self.kernel(x, xi) for xi in self.xs]
+        mean = sum(k * a for k, a in zip(ks, self.alpha))
+        v = solve_lower(self.chol, ks)
+        variance = max(1.0 - sum(vi * vi for vi in v), 0.0)
+        return mean * self.scale + self.mean, math.sqrt(variance) * self.scale
@@ -0,0 +1,249 @@
+import collections
+import contextlib
+import cProfile
+import json
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows, spans are recorded without resource usage there
+    resource = None
+
+PROC_IO = "/proc/self/io"
+
+
+def io_counters():
+    """
+    Read I/O counters of the current process (Linux only)
+    :return: (bytes read, bytes written) including cached I/O, None if not available
+    """
+    try:
+        with open(PROC_IO) as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        return int(values["rchar"]), int(values["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def usage():
+    """
+    Get resource usage of the current process and of its finished children
+    :return: dictionary of ('cpu', 'maxrss', 'child_cpu', 'child_maxrss'), CPU time in seconds, RSS in KiB, empty
+    if not available
+    """
+    if resource is None:
+        return dict()
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "cpu": own.ru_utime + own.ru_stime,
+        "maxrss": own.ru_maxrss,
+        "child_cpu": children.ru_utime + children.ru_stime,
+        "child_maxrss": children.ru_maxrss,
+    }
+
+
+class Tracer:
+    """
+    Collect timing spans and counters of pipeline phases. Every span records wall-clock time, CPU time of the process
+    and of its finished children (e.g. patgen), peak RSS and bytes read and written. Selected phases may be profiled
+    by cProfile. A disabled tracer records nothing.
+    """
+    def __init__(self, enabled: bool = False, profile_phases=(), profile_dir: str = ""):
+        """
+        Create tracer
+        :param enabled: record spans and counters
+        :param profile_phases: names of spans profiled by cProfile
+        :param profile_dir: directory for profiles (<phase>-<pid>-<n>.prof), current directory if empty
+        """
+        self.enabled = enabled
+        self.profile_phases = set(profile_phases)
+        self.profile_dir = profile_dir if profile_dir else "."
+        self.events = []
+        self.counters = collections.Counter()
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self._profiling = False
+        self._profiles = 0
+        self._lock = threading.Lock()
+
+    def timestamp(self, t: float = None):
+        """
+        Convert perf_counter time to trace timestamp
+        :param t: perf_counter time, now if None
+        :return: microseconds since the tracer was created
+        """
+        return ((time.perf_counter() if t is None else t) - self.origin) * 1e6
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args):
+        """
+        Record the enclosed block as a span
+        :param name: phase name
+        :param args: additional values stored with the span (e.g. level, fold index)
+        """
+        if not self.enabled:
+            yield
+            return
+
+        profiler = None
+        if name in self.profile_phases and not self._profiling:  # only one profiler may be active at once
+            profiler = cProfile.Profile()
+            self._profiling = True
+        before, io_before = usage(), io_counters()
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            end = time.perf_counter()
+            after, io_after = usage(), io_counters()
+            if before:
+                args["cpu"] = after["cpu"] - before["cpu"]
+                args["child_cpu"] = after["child_cpu"] - before["child_cpu"]
+                args["maxrss_kb"] = after["maxrss"]
+                args["child_maxrss_kb"] = after["child_maxrss"]
+            if io_before is not None and io_after is not None:
+                args["bytes_read"] = io_after[0] - io_before[0]
+                args["bytes_written"] = io_after[1] - io_before[1]
+            if profiler is not None:
+                self._profiling = False
+                os.makedirs(self.profile_dir, exist_ok=True)
+                self._profiles += 1
+                profile = f"{self.profile_dir}/{name}-{os.getpid()}-{self._profiles}.prof"
+                profiler.dump_stats(profile)
+                args["profile"] = profile
+            self.add_span(name, start, end - start, **args)
+
+    def add_span(self, name: str, start: float, duration: float, **args):
+        """
+        Record span measured elsewhere, e.g. a job run by the scheduler
+        :param name: phase name
+        :param start: perf_counter time of the span start
+        :param duration: duration in seconds
+        :param args: additional values stored with the span
+        """
+        if not self.enabled:
+            return
+        event = {"name": name, "ph": "X", "ts": self.timestamp(start), "dur": duration * 1e6,
+                 "pid": os.getpid(), "tid": threading.get_ident(), "args": args}
+        with self._lock:
+            self.events.append(event)
+
+    def count(self, name: str, value: int = 1):
+        """
+        Increase counter
+        :param name: counter name
+        :param value: increment
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += value
+            self.events.append({"name": name, "ph": "C", "ts": self.timestamp(), "pid": os.getpid(),
+                                "args": {name: self.counters[name]}})
+
+    def fork_reset(self):
+        """
+        Forget records inherited from parent process, called in worker processes before they start recording
+        """
+        if os.getpid() != self.pid:
+            self.pid = os.getpid()
+            self.events = []
+            self.counters = collections.Counter()
+            self._profiling = False
+
+    def take(self):
+        """
+        Remove records collected so far, e.g. to send them from worker process to its parent
+        :return: (list of events, dictionary of counters)
+        """
+        with self._lock:
+            events, counters = self.events, dict(self.counters)
+            self.events, self.counters = [], collections.Counter()
+        return events, counters
+
+    def merge(self, events: list, counters: dict):
+        """
+        Add records taken from another tracer (worker process)
+        :param events: list of events
+        :param counters: dictionary of counters
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.events.extend(events)
+            self.counters.update(counters)
+
+    def summary(self):
+        """
+        Aggregate spans by phase
+        :return: dictionary of phase -> ('count', 'seconds', 'cpu', 'child_cpu') and counter -> value
+        """
+        phases = dict()
+        for event in self.events:
+            if event["ph"] != "X":
+                continue
+            phase = phases.setdefault(event["name"], {"count": 0, "seconds": 0.0, "cpu": 0.0, "child_cpu": 0.0})
+            phase["count"] += 1
+            phase["seconds"] += event["dur"] / 1e6
+            phase["cpu"] += event["args"].get("cpu", 0.0)
+            phase["child_cpu"] += event["args"].get("child_cpu", 0.0)
+        return {"phases": phases, "counters": dict(self.counters)}
+
+    def write(self, path: str, trace_format: str = ""):
+        """
+        Export records
+        :param path: output file
+        :param trace_format: 'chrome' (Trace Event Format, viewable in chrome://tracing or Perfetto) or 'jsonl' (one
+        event per line followed by summary), guessed from file extension if empty
+        """
+        if not trace_format:
+            trace_format = "jsonl" if path.endswith(".jsonl") else "chrome"
+        with open(path, "w") as out:
+            if trace_format == "jsonl":
+                for event in sorted(self.events, key=lambda e: e["ts"]):
+                    out.write(json.dumps(event) + "\n")
+                out.write(json.dumps({"name": "summary", "ph": "M", "args": self.summary()}) + "\n")
+            else:
+                json.dump({"traceEvents": self.events, "displayTimeUnit": "ms", "otherData": self.summary()}, out)
+
+
+# tracer shared by the whole pipeline, replaced by configure
+tracer = Tracer()
+
+
+def configure(enabled: bool = True, profile_phases=(), profile_dir: str = ""):
+    """
+    Replace shared tracer by a new one
+    :param enabled: record spans and counters
+    :param profile_phases: names of spans profiled by cProfile
+    :param profile_dir: directory for profiles
+    :return: the new tracer
+    """
+    global tracer
+    tracer = Tracer(enabled, profile_phases, profile_dir)
+    return tracer
+
+
+def span(name: str, **args):
+    """
+    Record the enclosed block as a span of the shared tracer
+    :param name: phase name
+    :param args: additional values stored with the span
+    """
+    return tracer.span(name, **args)
+
+
+def count(name: str, value: int = 1):
+    """
+    Increase counter of the shared tracer
+    :param name: counter name
+    :param value: increment
+    """
+    tracer.count(name, value)
@@ -1,15 +1,77 @@
+import functools
+import hashlib
+import os
 import re
+import string
+
+from . import matcher, trie
+
+# running text is split into words on whitespace and punctuation (hyphenation mark included)
+WORD_PATTERN = re.compile(r"[^\s" + re.escape(string.punctuation + "«»„“”‘’‚‹›…–—") + r"]+")
+
+
+def cached_patterns(patterns: str, translate_file = None, cache_dir: str = ""):
+    """
+    Load compiled patterns from binary cache, the cache is (re)built when missing or stale
+    :param patterns: path to pattern file
+    :param translate_file: path to translate file, part of the cache key
+    :param cache_dir: directory with cached patterns (<content hash>.ctrie), beside pattern file (<patterns>.ctrie) if empty
+    :return: CompiledTrie object
+    """
+    key = hashlib.sha256()
+    for file in (patterns, translate_file):
+        if file is None:
+            continue
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                key.update(chunk)
+        key.update(b"\0")
+    key = key.digest()
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_file = f"{cache_dir}/{key.hex()}.ctrie"
+    else:
+        cache_file = patterns + ".ctrie"
+
+    compiled = trie.CompiledTrie.load(cache_file, key)
+    if compiled is None:
+        compiled = trie.CompiledTrie.from_file(patterns)
+        compiled.dump(cache_file, key)
+    return compiled
+
+
+def hyphen_mask(hyphenated: str, hyphenation_mark: str = "-"):
+    """
+    Convert hyphenated word into bitmask of its hyphenation points, marks after the last letter are ignored
+    :param hyphenated: word with hyphenation marks
+    :param hyphenation_mark: string used as hyphenation mark
+    :return: bitmask with i-th bit set if hyphenation mark is before i-th letter of the word without marks
+    """
+    mask = 0
+    position = 0
+    parts = hyphenated.split(hyphenation_mark)
+    for part in parts[:-1]:
+        position += len(part)
+        mask |= 1 << position
+    if not parts[-1]:
+        mask &= ~(1 << position)
+    return mask
 
-from . import trie
 
 class Hyphenator:
     """
     Simple word hyphenator
     """
-    def __init__(self, patterns: str = "", word_boundary: str = ".", hyphenation_mark: str = "-", left_hyphen_min: int = 1, right_hyphen_min: int = 1, translate_file = None):
-        self.patterns = trie.Trie()
-        if patterns:
-            self.patterns.populate(patterns)
+    def __init__(self, patterns: str = "", word_boundary: str = ".", hyphenation_mark: str = "-", left_hyphen_min: int = 1, right_hyphen_min: int = 1, translate_file = None, compiled: bool = False, engine: str = "naive", cache_size: int = 65536, cache: bool = False, cache_dir: str = ""):
+        if patterns and cache:
+            self.patterns = cached_patterns(patterns, translate_file, cache_dir)
+        elif compiled:
+            self.patterns = trie.CompiledTrie.from_file(patterns) if patterns else trie.CompiledTrie.from_patterns(dict())
+        else:
+            self.patterns = trie.Trie()
+            if patterns:
+                self.patterns.populate(patterns)
         self.word_boundary = word_boundary if word_boundary else "."
         self.hyphenation_mark = hyphenation_mark
         if translate_file is not None:
@@ -20,6 +82,10 @@ class Hyphenator:
                     right_hyphen_min = int(line[1])
         self.left_hyphen_min = left_hyphen_min
         self.right_hyphen_min = right_hyphen_min
+        if engine not in matcher.MATCHERS:
+            raise ValueError(f"Unknown matching engine {engine}, choose one of {', '.join(matcher.MATCHERS)}")
+        self.matcher = matcher.MATCHERS[engine](self.patterns, self.hyphenation_mark)
+        self.hyphenate_mask_cached = functools.lru_cache(maxsize=cache_size)(self.hyphenate_mask)
 
     def hyphenate(self, word: str):
         """
@@ -27,20 +93,85 @@ class Hyphenator:
         :param word: string to be hyphenated
         :return: word with injected hyphenation marks
         """
+        return self.apply_mask(word, self.hyphenate_mask(word))
+
+    def hyphenate_cached(self, word: str):
+        """
+        Hyphenate a word, reusing the result for recently seen words
+        :param word: string to be hyphenated
+        :return: word with injected hyphenation marks
+        """
+        return self.apply_mask(word, self.hyphenate_mask_cached(word))
+
+    def hyphenate_mask(self, word: str):
+        """
+        Find hyphenation points of a word using stored patterns
+        :param word: string to be hyphenated
+        :return: bitmask with i-th bit set if hyphenation mark belongs before i-th letter of the word without marks
+        """
         word_bounded = self.word_boundary + re.sub(self.hyphenation_mark, "", word.lower()) + self.word_boundary
-        levels = [0 for _ in range(len(word_bounded)-1)]
-
-        for i in range(len(word_bounded)-1):
-            for j in range(i+1, len(word_bounded) + 1):
-                subword = word_bounded[i:] if j == len(word_bounded) else word_bounded[i:j]
-                outputs = self.patterns.find(subword, self.hyphenation_mark)
-                if outputs is None:
-                    continue
-                for index, value in outputs:
-                    levels[i + index - 1] = max(int(value), levels[i + index - 1])
+        levels = self.matcher.levels(word_bounded)
+        mask = 0
+        for i in range(max(self.left_hyphen_min, 0), min(len(re.sub(self.hyphenation_mark, "", word)), len(word) - self.right_hyphen_min + 1)):
+            if levels[i] % 2 == 1:
+                mask |= 1 << i
+        return mask
+
+    def hyphenate_positions(self, word: str):
+        """
+        Find hyphenation points of a word using stored patterns
+        :param word: string to be hyphenated
+        :return: list of indices i, hyphenation mark belongs before i-th letter of the word without marks
+        """
+        mask = self.hyphenate_mask(word)
+        return [i for i in range(mask.bit_length()) if mask >> i & 1]
+
+    def apply_mask(self, word: str, mask: int):
+        """
+        Inject hyphenation marks into a word
+        :param word: string to be hyphenated, present hyphenation marks are removed
+        :param mask: hyphenation points as returned by hyphenate_mask
+        :return: word with injected hyphenation marks
+        """
         hyphenated = ""
         for i,letter in enumerate(re.sub(self.hyphenation_mark, "", word)):
-            if levels[i] > 0 and levels[i] % 2 == 1 and self.left_hyphen_min <= i <= len(word) - self.right_hyphen_min:
+            if mask >> i & 1:
                 hyphenated += self.hyphenation_mark
             hyphenated += letter
         return hyphenated
+
+    def hyphenate_many(self, words):
+        """
+        Hyphenate a sequence of words, each distinct word is hyphenated only once while it stays in the cache
+        :param words: iterable of words, e.g. open wordlist file (surrounding whitespace is stripped)
+        :return: generator of words with injected hyphenation marks
+        """
+        for word in words:
+            yield self.hyphenate_cached(word.strip())
+
+    def hyphenate_stream(self, text):
+        """
+        Hyphenate running text line by line, everything except the words is kept untouched
+        :param text: path to text file, open text stream or any other iterable of lines
+        :return: generator of lines with hyphenated words
+        """
+        if isinstance(text, str):
+            with open(text) as stream:
+                yield from self.hyphenate_stream(stream)
+            return
+        for line in text:
+            yield WORD_PATTERN.sub(lambda match: self.hyphenate_cached(match.group()), line)
+
+    def cache_info(self):
+        """
+        Report usage of the word cache
+        :return: dictionary of ('hits', 'misses', 'size' currently cached words, 'max_size')
+        """
+        info = self.hyphenate_mask_cached.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+    def clear_cache(self):
+        """
+        Clear cached hyphenations and reset cache counters
+        """
+        self.hyphenate_mask_cached.cache_clear()
@@ -0,0 +1,139 @@
+class Matcher:
+    """
+    Compute hyphenation levels of a word from stored patterns. Abstract class, instantiate one of its subclasses.
+    """
+    def __init__(self, patterns, ignore: str = "-"):
+        """
+        Create matcher over given patterns
+        :param patterns: pattern trie (Trie or CompiledTrie)
+        :param ignore: symbols in the word to be ignored
+        """
+        self.patterns = patterns
+        self.ignore = ignore
+
+    def levels(self, word_bounded: str):
+        """
+        Find maximal pattern output for each position of a word. Exact implementation differs for each matcher
+        :param word_bounded: lowercase word with word boundaries on both sides and no hyphenation marks
+        :return: list of levels, levels[i] is the level before i-th letter of the unbounded word
+        """
+        return NotImplemented
+
+
+class NaiveMatcher(Matcher):
+    """
+    Look up every substring of the word from the trie root
+    """
+    def levels(self, word_bounded: str):
+        levels = [0 for _ in range(len(word_bounded)-1)]
+
+        for i in range(len(word_bounded)-1):
+            for j in range(i+1, len(word_bounded) + 1):
+                subword = word_bounded[i:] if j == len(word_bounded) else word_bounded[i:j]
+                outputs = self.patterns.find(subword, self.ignore)
+                if outputs is None:
+                    continue
+                for index, value in outputs:
+                    levels[i + index - 1] = max(int(value), levels[i + index - 1])
+        return levels
+
+
+class DescentMatcher(Matcher):
+    """
+    Single trie descent from every start position, stopped as soon as the trie has no matching transition
+    """
+    def __init__(self, patterns, ignore: str = "-"):
+        super().__init__(patterns, ignore)
+        self._outputs = dict()
+
+    def outputs(self, state):
+        """
+        Get output of a trie state with levels converted to integers
+        :param state: trie state
+        :return: tuple of (index, level) pairs, empty if the state has no output
+        """
+        if state not in self._outputs:
+            output = self.patterns.output_at(state)
+            self._outputs[state] = tuple() if output is None else tuple((index, int(value)) for index, value in output)
+        return self._outputs[state]
+
+    def levels(self, word_bounded: str):
+        levels = [0 for _ in range(len(word_bounded)-1)]
+        start = self.patterns.start()
+
+        for i in range(len(word_bounded)-1):
+            state = start
+            for j in range(i, len(word_bounded)):
+                letter = word_bounded[j]
+                if letter not in self.ignore:
+                    state = self.patterns.step(state, letter)
+                    if state is None:
+                        break
+                for index, value in self.outputs(state):
+                    if value > levels[i + index - 1]:
+                        levels[i + index - 1] = value
+        return levels
+
+
+class AhoCorasickMatcher(Matcher):
+    """
+    Aho-Corasick automaton built over the pattern trie, walks each word exactly once
+    """
+    def __init__(self, patterns, ignore: str = "-"):
+        super().__init__(patterns, ignore)
+        self.goto = [dict()]
+        self.fail = [0]
+        self.depth = [0]
+        self.outputs = [tuple()]
+        self._fallback = DescentMatcher(patterns, ignore)
+
+        own = [patterns.output_at(patterns.start())]
+        queue = [(patterns.start(), 0)]
+        for trie_state, state in queue:
+            for letter, child in patterns.children(trie_state):
+                new = len(self.goto)
+                self.goto.append(dict())
+                self.fail.append(0)
+                self.depth.append(self.depth[state] + 1)
+                self.outputs.append(tuple())
+                own.append(patterns.output_at(child))
+                self.goto[state][letter] = new
+                queue.append((child, new))
+
+        # states are numbered in breadth-first order, failure links of shallower states are always ready
+        for state in range(len(self.goto)):
+            for letter, child in self.goto[state].items():
+                if state != 0:
+                    f = self.fail[state]
+                    while f and letter not in self.goto[f]:
+                        f = self.fail[f]
+                    self.fail[child] = self.goto[f].get(letter, 0)
+            output = tuple() if own[state] is None else tuple(
+                (index - self.depth[state], int(value), self.depth[state]) for index, value in own[state]
+            )
+            self.outputs[state] = output + (self.outputs[self.fail[state]] if state != 0 else tuple())
+
+    def levels(self, word_bounded: str):
+        if len(self.ignore) > 1 and any(letter in self.ignore for letter in word_bounded):
+            return self._fallback.levels(word_bounded)
+
+        levels = [0 for _ in range(len(word_bounded)-1)]
+        last = len(word_bounded) - 1
+        state = 0
+        for j, letter in enumerate(word_bounded):
+            while state and letter not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(letter, 0)
+            for delta, value, depth in self.outputs[state]:
+                if j == last and depth == 1:
+                    continue  # no pattern may start at the closing word boundary
+                if value > levels[j + delta]:
+                    levels[j + delta] = value
+        return levels
+
+
+MATCHERS = {
+    "naive": NaiveMatcher,
+    "descent": DescentMatcher,
+    "automaton": AhoCorasickMatcher,
+}
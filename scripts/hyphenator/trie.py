@@ -1,3 +1,15 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+# header of serialized CompiledTrie: magic, format version, content key, alphabet bytes, states, level storage size
+CACHE_HEADER = struct.Struct("=8sI32sIII")
+CACHE_MAGIC = b"HYPHTRIE"
+CACHE_VERSION = 1
+
+
 class TrieNode:
     """
     Single node of a trie structure
@@ -69,6 +81,38 @@ class Trie:
             current = current.children[letter]
         return current.output
 
+    def start(self):
+        """
+        Get initial state for walking the trie letter by letter
+        :return: root node
+        """
+        return self.root
+
+    def step(self, state: TrieNode, letter: str):
+        """
+        Walk from given state over one letter
+        :param state: current node
+        :param letter: letter to walk over
+        :return: next node, None if there is no such transition
+        """
+        return state.children.get(letter)
+
+    def output_at(self, state: TrieNode):
+        """
+        Get output stored in given state
+        :param state: trie node
+        :return: output of the node (list of (index, output) pairs), None if not set
+        """
+        return state.output
+
+    def children(self, state: TrieNode):
+        """
+        List all transitions from given state
+        :param state: trie node
+        :return: list of (letter, next node) pairs
+        """
+        return list(state.children.items())
+
     def populate(self, wordlist: str, outputs: str = "12345678"):
         """
         Insert all words from a wordlist (one per line) into trie
@@ -79,3 +123,293 @@ class Trie:
             for line in wl:
                 if not self.insert(line.strip(), outputs=outputs):
                     break
+
+    def size_bytes(self):
+        """
+        Estimate memory occupied by the whole object graph
+        :return: size in bytes
+        """
+        size = sys.getsizeof(self)
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            size += sys.getsizeof(node) + sys.getsizeof(node.__dict__) + sys.getsizeof(node.children)
+            if node.output is not None:
+                size += sys.getsizeof(node.output) + sum(sys.getsizeof(out) for out in node.output)
+            stack.extend(node.children.values())
+        return size
+
+
+def split_pattern(word: str, outputs: str = "123456789"):
+    """
+    Separate letters of a pattern from its outputs
+    :param word: pattern string with interleaved outputs
+    :param outputs: symbols in the string to be treated as outputs
+    :return: (letters, list of (index, output) pairs in the same format as stored in Trie)
+    """
+    letters = []
+    output = []
+    for i, letter in enumerate(word):
+        if letter in outputs:
+            output.append((i - len(output), letter))
+        else:
+            letters.append(letter)
+    return "".join(letters), output
+
+
+class CompiledTrie:
+    """
+    Immutable trie packed into double-array (base/check) form over an integer alphabet. Node outputs are stored
+    as compact vectors of (index, level) pairs shared between all nodes with equal outputs.
+    """
+    def __init__(self, alphabet: dict, base, check, output, levels):
+        """
+        Create compiled trie from already packed arrays. Use one of the from_* constructors instead.
+        :param alphabet: mapping of letters to integer codes (starting at 1)
+        :param base: base array, child of state s over letter code c is base[s] + c
+        :param check: check array, check[t] holds parent state of t (-1 for unused cells)
+        :param output: offset of the state output in levels (-1 if the state has no output)
+        :param levels: output vectors stored as [n, index_1, level_1, ..., index_n, level_n]
+        """
+        self.alphabet = alphabet
+        self.base = base
+        self.check = check
+        self.output = output
+        self.levels = levels
+        self.mapped = None
+
+    @classmethod
+    def from_patterns(cls, patterns: dict):
+        """
+        Build compiled trie in bulk
+        :param patterns: mapping of pattern letters to outputs as returned by split_pattern
+        :return: new CompiledTrie object
+        """
+        keys = sorted(patterns.keys())
+        alphabet = {letter: code for code, letter in enumerate(sorted(set("".join(keys))), start=1)}
+        base, check, output = array("i", [0]), array("i", [-1]), array("i", [-1])
+        levels = array("B")
+        used = bytearray(1)
+        used[0] = 1
+        offsets = dict()
+        next_free = 1
+
+        stack = [(0, 0, len(keys), 0)]
+        while stack:
+            state, lo, hi, depth = stack.pop()
+            if lo < hi and len(keys[lo]) == depth:
+                output[state] = cls._store_output(patterns[keys[lo]], levels, offsets)
+                lo += 1
+            if lo == hi:
+                continue
+
+            children = []
+            start = lo
+            while start < hi:
+                letter = keys[start][depth]
+                end = start + 1
+                while end < hi and keys[end][depth] == letter:
+                    end += 1
+                children.append((alphabet[letter], start, end))
+                start = end
+
+            first = children[0][0]
+            position = max(next_free, first)
+            while True:
+                b = position - first
+                if all(b + code >= len(used) or not used[b + code] for code, _, _ in children):
+                    break
+                position = used.find(0, position + 1)
+                if position == -1:
+                    position = len(used)
+
+            last = b + children[-1][0]
+            if last >= len(used):
+                grow = last + 1 - len(used)
+                used.extend(bytes(grow))
+                base.extend([0] * grow)
+                check.extend([-1] * grow)
+                output.extend([-1] * grow)
+            base[state] = b
+            for code, start, end in children:
+                used[b + code] = 1
+                check[b + code] = state
+                stack.append((b + code, start, end, depth + 1))
+            next_free = used.find(0, next_free)
+            if next_free == -1:
+                next_free = len(used)
+
+        return cls(alphabet, base, check, output, levels)
+
+    @staticmethod
+    def _store_output(output: list, levels: array, offsets: dict):
+        """
+        Append output vector to levels storage unless the same vector is already present
+        :param output: list of (index, output) pairs
+        :param levels: packed output storage
+        :param offsets: already stored vectors and their offsets
+        :return: offset of the vector in levels
+        """
+        vector = tuple((index, int(value)) for index, value in output)
+        if vector not in offsets:
+            offsets[vector] = len(levels)
+            levels.append(len(vector))
+            for index, value in vector:
+                if index > 255 or value > 255:
+                    raise ValueError(f"Pattern output {index}:{value} does not fit into compact level vector")
+                levels.extend((index, value))
+        return offsets[vector]
+
+    @classmethod
+    def from_file(cls, wordlist: str, outputs: str = "12345678"):
+        """
+        Build compiled trie from a wordlist (one per line), behaves as Trie.populate
+        :param wordlist: path to possibly hyphenated wordlist
+        :param outputs: all symbols representing output
+        :return: new CompiledTrie object
+        """
+        patterns = dict()
+        with open(wordlist) as wl:
+            for line in wl:
+                letters, output = split_pattern(line.strip(), outputs)
+                if letters in patterns:
+                    print("Output was already set")
+                    break
+                patterns[letters] = output
+        return cls.from_patterns(patterns)
+
+    @classmethod
+    def from_trie(cls, source: Trie):
+        """
+        Compile an existing trie
+        :param source: trie to be compiled
+        :return: new CompiledTrie object
+        """
+        patterns = dict()
+        stack = [("", source.root)]
+        while stack:
+            prefix, node = stack.pop()
+            if node.output is not None:
+                patterns[prefix] = node.output
+            for letter, child in node.children.items():
+                stack.append((prefix + letter, child))
+        return cls.from_patterns(patterns)
+
+    def find(self, word: str, ignore: str = "-"):
+        """
+        Find trie entry for given word
+        :param word: string to be searched
+        :param ignore: symbols in the string to be ignored
+        :return: output of corresponding trie node if present (list of (index, output) pairs), else None
+        """
+        state = 0
+        for letter in word:
+            if letter in ignore:
+                continue
+            state = self.step(state, letter)
+            if state is None:
+                return None
+        return self.output_at(state)
+
+    def start(self):
+        """
+        Get initial state for walking the trie letter by letter
+        :return: root state
+        """
+        return 0
+
+    def step(self, state: int, letter: str):
+        """
+        Walk from given state over one letter
+        :param state: current state
+        :param letter: letter to walk over
+        :return: next state, None if there is no such transition
+        """
+        code = self.alphabet.get(letter)
+        if code is None:
+            return None
+        child = self.base[state] + code
+        if child >= len(self.check) or self.check[child] != state:
+            return None
+        return child
+
+    def output_at(self, state: int):
+        """
+        Get output stored in given state
+        :param state: trie state
+        :return: list of (index, output) pairs, None if the state has no output
+        """
+        offset = self.output[state]
+        if offset == -1:
+            return None
+        return [(self.levels[offset + 2*k + 1], str(self.levels[offset + 2*k + 2])) for k in range(self.levels[offset])]
+
+    def children(self, state: int):
+        """
+        List all transitions from given state
+        :param state: trie state
+        :return: list of (letter, next state) pairs
+        """
+        transitions = []
+        for letter, code in self.alphabet.items():
+            child = self.base[state] + code
+            if child < len(self.check) and self.check[child] == state:
+                transitions.append((letter, child))
+        return transitions
+
+    def dump(self, path: str, key: bytes = b""):
+        """
+        Serialize the trie into binary file loadable by CompiledTrie.load. The file is replaced atomically.
+        :param path: path to output file
+        :param key: up to 32 bytes identifying the source of the patterns (e.g. content hash)
+        """
+        alphabet = "".join(sorted(self.alphabet, key=self.alphabet.get)).encode()
+        padding = bytes(-(CACHE_HEADER.size + len(alphabet)) % 4)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, key, len(alphabet), len(self.base), len(self.levels)))
+            out.write(alphabet + padding)
+            for packed in (self.base, self.check, self.output, self.levels):
+                out.write(packed if isinstance(packed, array) else packed.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, key: bytes = b""):
+        """
+        Map serialized trie into memory, the arrays are used directly from the mapped file without parsing
+        :param path: path to file created by CompiledTrie.dump
+        :param key: expected key of the patterns
+        :return: new CompiledTrie object, None if the file does not exist, is corrupted or its key differs
+        """
+        if not os.path.isfile(path) or os.path.getsize(path) < CACHE_HEADER.size:
+            return None
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, stored_key, n_alphabet, n_states, n_levels = CACHE_HEADER.unpack_from(mapped)
+        offset = CACHE_HEADER.size + n_alphabet
+        offset += -offset % 4
+        if (magic != CACHE_MAGIC or version != CACHE_VERSION or stored_key != key.ljust(32, b"\0")
+                or len(mapped) != offset + 12*n_states + n_levels):
+            mapped.close()
+            return None
+        view = memoryview(mapped)
+        alphabet = {letter: code for code, letter in enumerate(bytes(view[CACHE_HEADER.size:CACHE_HEADER.size + n_alphabet]).decode(), start=1)}
+        arrays = []
+        for _ in range(3):
+            arrays.append(view[offset:offset + 4*n_states].cast("i"))
+            offset += 4*n_states
+        compiled = cls(alphabet, *arrays, view[offset:offset + n_levels])
+        compiled.mapped = mapped
+        return compiled
+
+    def size_bytes(self):
+        """
+        Estimate memory occupied by the structure
+        :return: size in bytes
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self.alphabet)
+        for letter in self.alphabet:
+            size += sys.getsizeof(letter)
+        for packed in (self.base, self.check, self.output, self.levels):
+            size += sys.getsizeof(packed) if isinstance(packed, array) else packed.nbytes
+        return size
@@ -1,43 +1,63 @@
 import sys
 import argparse
 
+class TranslateInfo:
+    def __init__(self, hyphmark: str = "-"):
+        """
+        Collect alphabet and hyphen minima of a word list, lines are passed by add
+        :param hyphmark: hyphenation mark used in the word list
+        """
+        self.hyphmark = hyphmark
+        self.chars = set()  # characters as found in the word list, lowercased when translate file is written
+        self.left_hyph_min, self.right_hyph_min = -1, -1
+
+    def add(self, line: str):
+        """
+        Account for one line of the word list
+        :param line: line of the word list, comments (starting with #) are skipped
+        """
+        if line.startswith("#"):
+            return
+        line = line.strip()
+        self.chars.update(line)
+        if len(self.hyphmark) == 1 and self.hyphmark in line:  # longer marks are not found among characters
+            first, last = line.find(self.hyphmark), line.rfind(self.hyphmark)
+            if self.left_hyph_min == -1 or first < self.left_hyph_min:
+                self.left_hyph_min = first
+            if self.right_hyph_min == -1 or len(line) - last - 1 < self.right_hyph_min:
+                self.right_hyph_min = len(line) - last - 1
+
+    def write(self, path: str, left_hyphen_min: int = None, right_hyphen_min: int = None):
+        """
+        Write translate file
+        :param path: path to the translate file
+        :param left_hyphen_min: fixed value of left_hyphen_min, the collected minimum if None
+        :param right_hyphen_min: fixed value of right_hyphen_min, the collected minimum if None
+        """
+        left_hyph_min = self.left_hyph_min if left_hyphen_min is None else left_hyphen_min
+        right_hyph_min = self.right_hyph_min if right_hyphen_min is None else right_hyphen_min
+
+        # characters are lowercased one by one, lowercasing whole lines may differ (e.g. final sigma)
+        chars = set(c.lower() for c in self.chars if c != self.hyphmark)
+        upper_used = set()
+        with open(path, "w") as tra:
+            print(f" {left_hyph_min:<2}{right_hyph_min:<2}  {self.hyphmark}", file=tra)
+            for char in sorted(chars):
+                if char != char.upper() and len(char.upper()) == 1 and char.upper() not in upper_used:
+                    print(f" {char} {char.upper()}", file=tra)
+                    upper_used.add(char.upper())
+                else:
+                    print(f" {char}", file=tra)
+
 def main(args):
     if args.wordlist is None or args.hyphmark is None:
         print("Required arguments missing. Please provide wordlist to translate and hyphenation mark.", file=sys.stderr)
         return
-    chars = set()
-    left_hyph_min, right_hyph_min = -1, -1
+    info = TranslateInfo(args.hyphmark)
     with open(args.wordlist) as wlh:
         for line in wlh:
-            if line.startswith("#"):
-                continue
-            hyph_indices = []
-            line = line.strip()
-            for i, c in enumerate(line):
-                if c == args.hyphmark:
-                    hyph_indices.append(i)
-                    continue
-                chars.add(c.lower())
-            if hyph_indices and (left_hyph_min == -1 or hyph_indices[0] < left_hyph_min):
-                left_hyph_min = hyph_indices[0]
-            if hyph_indices and (right_hyph_min == -1 or len(line) - hyph_indices[-1] - 1 < right_hyph_min):
-                right_hyph_min = len(line) - hyph_indices[-1] - 1
-
-    if args.left_hyphen_min is not None:
-        left_hyph_min = args.left_hyphen_min
-    if args.right_hyphen_min is not None:
-        right_hyph_min = args.right_hyphen_min
-
-    upper_used = set()
-    with open(args.wordlist + ".tra", "w") as tra:
-        print(f" {left_hyph_min:<2}{right_hyph_min:<2}  {args.hyphmark}", file=tra)
-        for char in sorted(chars):
-            if char != char.upper() and len(char.upper()) == 1 and char.upper() not in upper_used:
-                print(f" {char} {char.upper()}", file=tra)
-                upper_used.add(char.upper())
-            else:
-                print(f" {char}", file=tra)
-
+            info.add(line)
+    info.write(args.wordlist + ".tra", args.left_hyphen_min, args.right_hyphen_min)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
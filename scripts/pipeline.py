@@ -0,0 +1,427 @@
+import argparse
+import concurrent.futures
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+
+import process_dump
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# code read by the scripts besides the script itself, relative to the scripts directory
+PREPARE_CODE = ["disambiguate.py", "shards.py", "make_tr.py", "hyperparameters/stats.py", "hyperparameters/sample.py"]
+VALIDATION_CODE = ["shards.py", "hyperparameters/*.py", "hyphenator/*.py"]
+# results of stages that failed or were not run because a stage they depend on failed
+FAILED = ("failed", "blocked")
+
+
+def file_digest(path: str, block_size: int = 1 << 20):
+    """
+    Compute content hash of a file
+    :param path: path to the file
+    :param block_size: number of bytes read at once
+    :return: hexadecimal SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def code_files(patterns: list):
+    """
+    Expand patterns of code files
+    :param patterns: glob patterns relative to the scripts directory
+    :return: sorted list of matching files
+    """
+    files = []
+    for pattern in patterns:
+        files += glob.glob(f"{SCRIPTS_DIR}/{pattern}")
+    return sorted(files)
+
+
+class Stage:
+    """
+    Single step of the pipeline, a script run with declared input and output files
+    """
+    def __init__(self, name: str, script: str, args: list, inputs: list, outputs: list, deps: list = (),
+                 code: list = (), report: str = "", lock: str = ""):
+        """
+        Create stage
+        :param name: unique name of the stage, <dataset>:<step>
+        :param script: script in the scripts directory
+        :param args: command line arguments of the script
+        :param inputs: files read by the script, members of zip archives as <archive>:<member>
+        :param outputs: files written by the script
+        :param deps: names of stages producing the inputs
+        :param code: patterns of other code files read by the script (see code_files)
+        :param report: file to store standard output of the script to, it is an output of the stage as well
+        :param lock: name of a resource (e.g. directory with temporary files of the script), stages with the same
+        lock are not run at once
+        """
+        self.name = name
+        self.command = [f"{SCRIPTS_DIR}/{script}"] + list(args)
+        self.inputs = list(inputs) + [self.command[0]] + code_files(code)
+        self.outputs = list(outputs) + ([report] if report else [])
+        self.deps = list(deps)
+        self.report = report
+        self.lock = lock
+
+
+class State:
+    """
+    Content hashes of inputs and outputs of stages from their last successful runs, kept in a JSON file. Hash of a
+    file is reused while its size and modification time stay the same.
+    """
+    def __init__(self, path: str):
+        """
+        Load state, empty if the file does not exist
+        :param path: path to the state file
+        """
+        self.path = path
+        self.stages = dict()
+        self.files = dict()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.stages = state.get("stages", dict())
+            self.files = state.get("files", dict())
+
+    def digest(self, path: str):
+        """
+        Get content hash of a file or of a zip archive member
+        :param path: path to the file or <archive>:<member>
+        :return: hash as string, None if the file does not exist
+        """
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            with self._lock:
+                cached = self.files.get(path)
+            if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+                return cached[2]
+            digest = file_digest(path)
+            with self._lock:
+                self.files[path] = [stat.st_size, stat.st_mtime_ns, digest]
+            return digest
+        archive, _, member = path.rpartition(":")
+        if archive and zipfile.is_zipfile(archive):
+            # members are not decompressed, CRC from the archive directory identifies their content
+            with zipfile.ZipFile(archive) as z:
+                try:
+                    info = z.getinfo(member)
+                except KeyError:
+                    return None
+            return f"crc32:{info.CRC:08x}:{info.file_size}"
+        return None
+
+    def up_to_date(self, stage: Stage):
+        """
+        Check whether stage was run with the same command on inputs of the same content and its outputs are unchanged
+        :param stage: stage to be checked
+        :return: True if the stage need not be run
+        """
+        with self._lock:
+            record = self.stages.get(stage.name)
+        if record is None or record["command"] != stage.command[1:]:
+            return False
+        for files, recorded in ((stage.inputs, record["inputs"]), (stage.outputs, record["outputs"])):
+            if sorted(files) != sorted(recorded):
+                return False
+            if any(self.digest(path) != recorded[path] for path in files):
+                return False
+        return True
+
+    def record(self, stage: Stage, inputs: dict):
+        """
+        Record successful run of stage and save the state
+        :param stage: stage that was run
+        :param inputs: hashes of its inputs taken before the run
+        """
+        outputs = {path: self.digest(path) for path in stage.outputs}
+        with self._lock:
+            # the script path is not recorded, so that moving the repository does not invalidate the state
+            self.stages[stage.name] = {"command": stage.command[1:], "inputs": inputs, "outputs": outputs}
+        self.save()
+
+    def forget(self, stage: Stage):
+        """
+        Remove record of stage, e.g. after its failure, and save the state
+        :param stage: stage to be forgotten
+        """
+        with self._lock:
+            self.stages.pop(stage.name, None)
+        self.save()
+
+    def save(self):
+        """
+        Write state to its file, the file is replaced atomically
+        """
+        with self._lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"stages": self.stages, "files": self.files}, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+def find_sources(data_dir: str):
+    """
+    Find source word lists of datasets in data directory, i.e. weighted word lists (.wlhw) or word lists (.wlh) not
+    created by the pipeline
+    :param data_dir: directory with datasets in <lang>/<name> subdirectories
+    :return: dictionary of dataset (<lang>/<name>) -> path to its source word list
+    """
+    sources = dict()
+    for directory in sorted(glob.glob(f"{data_dir}/*/*/")):
+        files = sorted(os.listdir(directory))
+        weighted = [f for f in files if f.endswith(".wlhw")]
+        plain = [f for f in files if f.endswith(".wlh") and not f.endswith(("_dis.wlh", "_expanded.wlh"))]
+        candidates = weighted if weighted else plain
+        dataset = os.path.relpath(directory, data_dir).replace(os.sep, "/")
+        if len(candidates) > 1:
+            print(f"Skipping {dataset}, more than one source word list found: {', '.join(candidates)}", file=sys.stderr)
+        elif candidates:
+            sources[dataset] = f"{directory}{candidates[0]}"
+    return sources
+
+
+def dataset_stages(dataset: str, data_dir: str, source: str, deps: list, report_dir: str, stats: bool = False,
+                   profiles: list = (), nfold: int = 10, score_cache: str = "", dis_memory: int = 0,
+                   generator: str = "patgen"):
+    """
+    Create stages preparing and evaluating one dataset: plain word list is disambiguated together with creating its
+    translate file and statistics in one pass, weighted word list is expanded and its translate file created, both
+    are cross-validated
+    :param dataset: dataset name, <lang>/<name>
+    :param data_dir: directory with datasets
+    :param source: source word list
+    :param deps: names of stages producing the source word list
+    :param report_dir: directory to store statistics and cross-validation results to
+    :param stats: compute statistics of disambiguated word list
+    :param profiles: parameter profiles to cross-validate with
+    :param nfold: number of cross-validation folds
+    :param score_cache: directory of persistent patgen score cache, not used if empty
+    :param dis_memory: memory budget of disambiguation in MiB, see disambiguate.py
+    :param generator: pattern generator used in cross-validation, see train_test.py
+    :return: list of stages
+    """
+    stages = []
+    if source.endswith(".wlhw"):
+        wordlist = f"{source}_expanded.wlh"
+        stages.append(Stage(f"{dataset}:expand", "expand_weights.py", [source, "--outfile", wordlist],
+                            [source], [wordlist], deps))
+        stages.append(Stage(f"{dataset}:translate", "make_tr.py", [wordlist], [wordlist], [f"{wordlist}.tra"],
+                            [stages[-1].name]))
+    else:
+        wordlist = f"{source}_dis.wlh"
+        stages.append(Stage(f"{dataset}:prepare", "prepare.py",
+                            [source, "-o", wordlist] + (["--memory", str(dis_memory)] if dis_memory else [])
+                            + (["-s", "-t"] if stats else []),
+                            [source], [wordlist, f"{wordlist}.tra"], deps, PREPARE_CODE,
+                            f"{report_dir}/{dataset}/stats.txt" if stats else ""))
+    prepared = stages[-1].name
+    for profile in profiles:
+        profile_name = os.path.splitext(os.path.basename(profile))[0]
+        stages.append(Stage(f"{dataset}:validate:{profile_name}", "train_test.py",
+                            ["-t", "-n", str(nfold), "-p", profile, f"{data_dir}/{dataset}"]
+                            + (["--score-cache", score_cache] if score_cache else [])
+                            + (["-g", generator] if generator != "patgen" else []),
+                            [wordlist, f"{wordlist}.tra", profile], [], [prepared],
+                            VALIDATION_CODE, f"{report_dir}/{dataset}/{profile_name}.txt",
+                            # train_test.py uses the same temporary files in the dataset directory for all profiles
+                            lock=f"{data_dir}/{dataset}"))
+    return stages
+
+
+def build_stages(data_dir: str, dump: str, langs: list, patterns: list, report_dir: str, **options):
+    """
+    Create stages of all selected datasets
+    :param data_dir: directory with datasets
+    :param dump: zip archive or directory with Wiktionary dump files, Wiktionary datasets are not parsed if empty
+    :param langs: languages of the dump to be parsed
+    :param patterns: glob patterns of selected datasets (e.g. cs/*), all datasets if empty
+    :param report_dir: directory to store statistics and cross-validation results to
+    :param options: options of dataset_stages
+    :return: list of stages
+    """
+    sources = find_sources(data_dir)
+    deps = {dataset: [] for dataset in sources}
+    stages = []
+    for lang in (langs if dump else []):
+        dataset = f"{lang}/wiktionary"
+        try:
+            stream, dump_file = process_dump.open_dump(dump, lang)
+            stream.close()
+        except FileNotFoundError as e:
+            print(f"Skipping {dataset}: {e}", file=sys.stderr)
+            continue
+        wordlist = f"{data_dir}/{dataset}/{process_dump.DUMP_FILES[lang].split('.')[0]}.wlh"
+        stages.append(Stage(f"{dataset}:process", "process_dump.py",
+                            ["--lang", lang, "--dump", dump, "--outfile", wordlist], [dump_file], [wordlist]))
+        sources[dataset] = wordlist
+        deps[dataset] = [stages[-1].name]
+
+    selected = []
+    for stage in stages:
+        if not patterns or any(fnmatch.fnmatch(stage.name.split(":")[0], p) for p in patterns):
+            selected.append(stage)
+    for dataset in sorted(sources):
+        if patterns and not any(fnmatch.fnmatch(dataset, p) for p in patterns):
+            continue
+        selected += dataset_stages(dataset, data_dir, sources[dataset], deps[dataset], report_dir, **options)
+    return selected
+
+
+def run_stages(stages: list, state: State, jobs: int = 1, force: bool = False, dry_run: bool = False,
+               verbose: bool = False):
+    """
+    Run stages in order of their dependencies, stages that are up to date are skipped. Stages whose dependencies are
+    done run in parallel, unless they hold the same lock.
+    :param stages: list of stages, dependencies outside the list are considered done
+    :param state: state of previous runs, updated after every stage
+    :param jobs: maximal number of stages run at once
+    :param force: run all stages
+    :param dry_run: only report stages that would be run, a stage is reported if any of its dependencies is
+    :param verbose: print standard output and error of scripts
+    :return: dictionary of stage name -> result ('done', 'skipped', 'outdated' in dry run, 'failed', 'blocked' if
+    a dependency failed)
+    """
+    by_name = {stage.name: stage for stage in stages}
+    deps = {stage.name: [d for d in stage.deps if d in by_name] for stage in stages}
+    dependents = {name: [] for name in by_name}
+    waiting = dict()
+    for name in by_name:
+        waiting[name] = len(deps[name])
+        for dep in deps[name]:
+            dependents[dep].append(name)
+    results = dict()
+    print_lock = threading.Lock()
+
+    def log(message: str):
+        with print_lock:
+            print(message, flush=True)
+
+    def execute(stage: Stage):
+        if dry_run:
+            outdated = force or any(results[d] == "outdated" for d in deps[stage.name]) or not state.up_to_date(stage)
+            if outdated:
+                log(f"{stage.name}: outdated")
+            return "outdated" if outdated else "skipped"
+        if not force and state.up_to_date(stage):
+            if verbose:
+                log(f"{stage.name}: up to date")
+            return "skipped"
+        inputs = {path: state.digest(path) for path in stage.inputs}
+        missing = [path for path, digest in inputs.items() if digest is None]
+        if missing:
+            log(f"{stage.name}: failed, missing input {', '.join(missing)}")
+            state.forget(stage)
+            return "failed"
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable] + stage.command, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        missing = [path for path in stage.outputs if path != stage.report and not os.path.isfile(path)]
+        if process.returncode != 0 or missing:
+            reason = f"exit code {process.returncode}" if process.returncode != 0 else f"missing output {', '.join(missing)}"
+            log(f"{stage.name}: failed ({reason})\n{process.stderr.rstrip()}")
+            state.forget(stage)
+            return "failed"
+        if stage.report:
+            os.makedirs(os.path.dirname(stage.report) or ".", exist_ok=True)
+            with open(stage.report, "w") as f:
+                f.write(process.stdout)
+        state.record(stage, inputs)
+        log(f"{stage.name}: done in {elapsed:.1f} s")
+        if verbose and (process.stdout.strip() or process.stderr.strip()):
+            log((process.stdout + process.stderr).rstrip())
+        return "done"
+
+    def finish(name: str, result: str):
+        results[name] = result
+        for dependent in dependents[name]:
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0:
+                ready.append(dependent)
+
+    ready = [name for name in by_name if waiting[name] == 0]
+    running = dict()
+    locked = dict()  # lock -> stages waiting for it, in order in which they became ready
+    with concurrent.futures.ThreadPoolExecutor(max(1, jobs)) as pool:
+        while ready or running:
+            while ready:
+                name = ready.pop(0)
+                lock = by_name[name].lock
+                if any(results[d] in FAILED for d in deps[name]):
+                    log(f"{name}: not run, a stage it depends on failed")
+                    finish(name, "blocked")
+                elif lock and lock in locked:
+                    locked[lock].append(name)
+                else:
+                    if lock:
+                        locked[lock] = []
+                    running[pool.submit(execute, by_name[name])] = name
+            if running:
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    lock = by_name[name].lock
+                    if lock:  # lock is passed to the first waiting stage, its dependencies were checked already
+                        queue = locked.pop(lock)
+                        if queue:
+                            locked[lock] = queue[1:]
+                            running[pool.submit(execute, by_name[queue[0]])] = queue[0]
+                    finish(name, future.result())
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=str, default="./data", required=False, help="Directory with datasets in <lang>/<name> subdirectories")
+    parser.add_argument("--dump", type=str, default="", required=False, help="Zip archive or directory with Wiktionary dump files, ./wikt_dump.zip or ./wikt_dump by default if present")
+    parser.add_argument("--lang", type=str, nargs="+", default=list(process_dump.DUMP_FILES), choices=list(process_dump.DUMP_FILES), required=False, help="Languages of the dump to be parsed")
+    parser.add_argument("-d", "--datasets", type=str, nargs="+", default=[], required=False, help="Glob patterns of datasets to be processed (e.g. cs/* */wiktionary), all by default")
+    parser.add_argument("-j", "--jobs", type=int, default=1, required=False, help="Number of stages run in parallel")
+    parser.add_argument("--stats", action="store_true", help="Compute statistics of disambiguated datasets")
+    parser.add_argument("--validate", type=str, nargs="+", default=[], required=False, help="Parameter profiles to cross-validate datasets with")
+    parser.add_argument("-n", "--nfold", type=int, default=10, required=False, help="Number of cross-validation folds")
+    parser.add_argument("--score-cache", type=str, default="", required=False, help="Directory of persistent patgen score cache")
+    parser.add_argument("-g", "--generator", type=str, default="patgen", choices=["patgen", "python"], required=False, help="Pattern generator used in cross-validation, see train_test.py")
+    parser.add_argument("--dis-memory", type=int, default=0, required=False, help="Memory budget of disambiguation in MiB (in memory if 0)")
+    parser.add_argument("--reports", type=str, default="./reports", required=False, help="Directory to store statistics and cross-validation results to")
+    parser.add_argument("--state", type=str, default="./.pipeline_state.json", required=False, help="File with content hashes of previous runs")
+    parser.add_argument("--force", action="store_true", help="Run all stages even if they are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only list stages that would be run")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose printout")
+    args = parser.parse_args()
+
+    dump = args.dump
+    if not dump:
+        if zipfile.is_zipfile("./wikt_dump.zip"):
+            dump = "./wikt_dump.zip"
+        elif os.path.isdir("./wikt_dump"):
+            dump = "./wikt_dump"
+        else:
+            print("Wiktionary dump not found, only word lists present in data directory are processed", file=sys.stderr)
+
+    stages = build_stages(args.data.rstrip("/"), dump, args.lang, args.datasets, args.reports.rstrip("/"),
+                          stats=args.stats, profiles=args.validate, nfold=args.nfold, score_cache=args.score_cache,
+                          dis_memory=args.dis_memory, generator=args.generator)
+    results = run_stages(stages, State(args.state), jobs=args.jobs, force=args.force, dry_run=args.dry_run,
+                         verbose=args.verbose)
+
+    if not args.dry_run:
+        for stage in stages:  # results of all selected stages, reused ones as well
+            if stage.report and results[stage.name] not in FAILED:
+                with open(stage.report) as f:
+                    print(f.read(), end="")
+    counts = {result: list(results.values()).count(result) for result in sorted(set(results.values()))}
+    print(", ".join(f"{count} {result}" for result, count in counts.items()), file=sys.stderr)
+    if any(result in FAILED for result in results.values()):
+        sys.exit(1)
@@ -0,0 +1,67 @@
+import argparse
+
+from disambiguate import disambiguate, disambiguate_external, disambiguate_parallel
+from hyperparameters import stats
+from make_tr import TranslateInfo
+
+
+def prepare(file: str, hyphenation_mark: str = "-", outfile: str = "", memory_limit: int = 0, workers: int = 1,
+            tmp_dir: str = "", left_hyphen_min: int = None, right_hyphen_min: int = None):
+    """
+    Disambiguate word list and create translate file and statistics of the disambiguated list in a single pass, the
+    disambiguated list is not read again. Results are the same as of disambiguate.py, make_tr.py and statistics.py
+    run one after another.
+    :param file: path to word list to be processed
+    :param hyphenation_mark: string used as hyphenation mark
+    :param outfile: path to disambiguated word list, <file>_dis.wlh if empty, translate file is <outfile>.tra
+    :param memory_limit: memory budget of external sorting in bytes, sorted in memory if 0
+    :param workers: number of disambiguating processes
+    :param tmp_dir: directory for temporary files, system default if empty
+    :param left_hyphen_min: fixed value of left_hyphen_min in translate file, collected from the word list if None
+    :param right_hyphen_min: fixed value of right_hyphen_min in translate file, collected from the word list if None
+    :return: (number of ambiguities before, number of ambiguities after, statistics of disambiguated word list)
+    """
+    if not outfile:
+        outfile = file + "_dis.wlh"
+    translate = TranslateInfo(hyphenation_mark)
+    info = stats.DatasetInfo()
+    accumulators = [translate, info]
+
+    if workers > 1:
+        before, after = disambiguate_parallel(file, hyphenation_mark, outfile, workers, memory_limit, tmp_dir, accumulators)
+    elif memory_limit > 0:
+        before, after = disambiguate_external(file, hyphenation_mark, outfile, memory_limit, tmp_dir, accumulators)
+    else:
+        before, after = disambiguate(file, hyphenation_mark, outfile, accumulators)
+
+    translate.write(outfile + ".tra", left_hyphen_min, right_hyphen_min)
+    info.finish(outfile)
+    return before, after, info
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", type=str, help="Word list to be prepared")
+    parser.add_argument("-m", "--hyphmark", type=str, required=False, default="-", help="String used as hyphenation mark")
+    parser.add_argument("-o", "--outfile", type=str, required=False, default="", help="File to write disambiguated word list to, translate file is <outfile>.tra")
+    parser.add_argument("--memory", type=int, required=False, default=0, help="Memory budget in MiB, word list is sorted externally within the budget (in memory if 0)")
+    parser.add_argument("--tmpdir", type=str, required=False, default="", help="Directory for temporary files of external sorting")
+    parser.add_argument("-j", "--jobs", type=int, required=False, default=1, help="Number of processes, words are partitioned among them")
+    parser.add_argument("--left_hyphen_min", required=False, type=int, help="Fixed value for patgen left_hyphen_min hyperparameter")
+    parser.add_argument("--right_hyphen_min", required=False, type=int, help="Fixed value for patgen right_hyphen_min hyperparameter")
+    parser.add_argument("-s", "--stats", action="store_true", help="Print statistics of disambiguated word list instead of number of ambiguities")
+    parser.add_argument("-t", action="store_true", help="Print statistics in tabular format")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable more verbose printout")
+    args = parser.parse_args()
+
+    outfile = args.outfile if args.outfile else args.file + "_dis.wlh"
+    before, after, info = prepare(args.file, args.hyphmark, outfile, args.memory << 20, args.jobs, args.tmpdir,
+                                  args.left_hyphen_min, args.right_hyphen_min)
+    if args.verbose:
+        print(f"Disambiguated {args.file} into {outfile}, ambiguous hyphenations reduced from {before} to {after}")
+        print(f"Created translate file {outfile}.tra for {outfile}")
+    if args.stats:
+        print(info.report(tabular=args.t))
+    elif not args.verbose:
+        split = args.file.replace("\\", "/").split("/")
+        print("" if len(split) < 3 else split[-3], "" if len(split) < 2 else split[-2], before, after)
@@ -1,6 +1,9 @@
 import argparse
+import collections
 import json
-import re
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 
 
 ALLOWED_HYPHENATORS = "‧·.‐­-"
@@ -23,15 +26,53 @@ ACCENTED = {
     "е": "ѐ",
     "у": "ý"
 }
+DUMP_FILES = {
+    "cs": "cs_wiktionary_251001.jsonl",
+    "de": "de_wiktionary_251001.jsonl",
+    "el": "el_wiktionary_251001.jsonl",
+    "es": "es_wiktionary_251001.jsonl",
+    "it": "it_wiktionary_251001.jsonl",
+    "ms": "ms_wiktionary_251002.jsonl",
+    "nl": "nl_wiktionary_251002.jsonl",
+    "pl": "pl_enwiktionary_251001.jsonl",
+    "pt": "pt_enwiktionary_251001.jsonl",
+    "ru": "ru_wiktionary_251002.jsonl",
+    "tr": "tr_wiktionary_251001.jsonl"
+}
+# languages whose hyphenations may carry accents missing in the base word
+ACCENTED_LANGS = ["it", "ru"]
+
+# accented letters mapped to their base letters, a hyphenation letter matches a word letter equal to it or to its base
+DEACCENT_TABLE = str.maketrans(DEACCENTED)
+# normalization of hyphenation strings: unified hyphenation marks, for Russian also stress marks removed
+MARK_TABLE = str.maketrans({mark: "-" for mark in ALLOWED_HYPHENATORS})
+HYPHENATION_TABLES = {lang: MARK_TABLE for lang in DUMP_FILES}
+HYPHENATION_TABLES["ru"] = str.maketrans({
+    **{mark: "-" for mark in ALLOWED_HYPHENATORS},
+    "•": None, "·": None, "\u0300": None, "\u0301": None,
+    "à": "а", "ó": "о", "é": "е", "á": "а"
+})
+# numbers are reserved for patgen levels, * and . for hyphenation marking
+RESERVED = "*."
 
-def process_accents(hyph, base_word):
+def process_accents(hyph, base_word, word=None):
+    """
+    Remove accents not present in the base word from hyphenated word
+    :param hyph: hyphenated word, possibly with accents
+    :param base_word: word without hyphenation marks
+    :param word: word in which spaces are looked up when hyph has a mark at their position, base_word if None
+    :return: base_word with hyphenation marks of hyph
+    """
     if base_word is None:
         return hyph
+    if word is None:
+        word = base_word
     deaccented = ""
+    folded = hyph.translate(DEACCENT_TABLE)
     i_hyph = 0
     i_word = 0
     while i_word < len(base_word) and i_hyph < len(hyph):
-        if base_word[i_word] == hyph[i_hyph] or base_word[i_word] == DEACCENTED.get(hyph[i_hyph], ""):
+        if base_word[i_word] == hyph[i_hyph] or base_word[i_word] == folded[i_hyph]:
             deaccented += base_word[i_word]
             i_word += 1
         elif hyph[i_hyph] == "-":
@@ -42,121 +83,236 @@ def process_accents(hyph, base_word):
         i_hyph += 1
     return deaccented
 
-def build_regex(base_word: str, has_accents: bool = False):
-    letters = []
-    for letter in base_word:
-        if letter in "()[]":
-            letters.append(f"[\\{letter}]")
-        elif has_accents:
-            letters.append(f"[{letter}{ACCENTED.get(letter, '')}]")
+def align(base_word: str, hyphenations: str, has_accents: bool = False):
+    """
+    Find hyphenations of a word in a string: the letters of the word, each optionally followed by a hyphenation mark
+    (except the last one), followed by a whitespace character. Matches are non-overlapping and searched from left to
+    right, a mark after a letter is taken whenever the rest of the word matches with it. Every (letter, position) pair
+    is tried at most once, so the search takes at most len(base_word) * len(hyphenations) steps.
+    :param base_word: word to be found
+    :param hyphenations: string to be searched, hyphenation marks unified to '-'
+    :param has_accents: accented letters of the string match their base letters in the word
+    :return: list of matched substrings (including the final whitespace)
+    """
+    n, length = len(base_word), len(hyphenations)
+    if n == 0:
+        return [c for c in hyphenations if c.isspace()]
+    folded = hyphenations.translate(DEACCENT_TABLE) if has_accents else hyphenations
+    matches = []
+    # visited (letter, position) pairs, each of them either failed or belongs to a match ending before later searches
+    visited = set()
+    start = 0
+    while start < length:
+        end = -1
+        # i-th letter of the word is matched at position j, choices holds positions where a mark was taken
+        i, j, choices = 0, start, []
+        while True:
+            if i > 0 and (i, j) in visited:
+                i = n  # known to fail
+            elif i > 0:
+                visited.add((i, j))
+            if i < n and j < length and (hyphenations[j] == base_word[i] or folded[j] == base_word[i]):
+                i += 1
+                j += 1
+                if i < n:
+                    if j < length and hyphenations[j] == "-":
+                        choices.append((i, j))
+                        j += 1
+                    continue
+                if j < length and hyphenations[j].isspace():
+                    end = j + 1
+                    break
+            if not choices:
+                break
+            i, j = choices.pop()  # backtrack, do not take the mark
+        if end == -1:
+            start += 1
         else:
-            letters.append(f"[{letter}]")
-    return (f"[-]?".join([letter for letter in letters]))+"\s"
+            matches.append(hyphenations[start:end])
+            start = end
+    return matches
 
 def process_hyph(data: list, base_word: str, has_accents: bool = False):
-    translated = set()
+    translated = dict()  # ordered set, output must not depend on string hashing
     for hyph in data:
-        hyph_tr = re.sub(r"\d+|\*|\.", "",
-                         hyph)  # numbers are reserved for patgen levels, * and . for hyphenation marking
-        hyph_tr = re.sub(r"-+", "-", hyph_tr)
-        hyph_tr = re.sub(r"\s*-\s*", "-", hyph_tr)
+        hyph_tr = hyph
+        if any(c in RESERVED or c.isdecimal() for c in hyph_tr):
+            hyph_tr = "".join(c for c in hyph_tr if c not in RESERVED and not c.isdecimal())
+        while "--" in hyph_tr:
+            hyph_tr = hyph_tr.replace("--", "-")
+        # whitespace around marks is dropped
+        parts = hyph_tr.split("-")
+        if len(parts) > 1:
+            hyph_tr = "-".join([parts[0].rstrip()] + [part.strip() for part in parts[1:-1]] + [parts[-1].lstrip()])
         hyph_tr = hyph_tr.strip(" -")
         if has_accents:
-            hyph_tr = process_accents(hyph_tr, base_word.strip("-"))
-        translated.add(hyph_tr)
+            # spaces are looked up in the unstripped word
+            hyph_tr = process_accents(hyph_tr, base_word.strip("-"), base_word)
+        translated[hyph_tr] = None
     return list(translated)
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--lang",
-                        default="en",
-                        choices=["cs", "de", "el", "es", "it", "ms", "nl", "pl", "pt", "ru", "tr", "TBD"],
-                        required=True,
-                        help="Language to which the dump file belongs")
-    parser.add_argument("--outfile",
-                        default="",
-                        required=False,
-                        help="File to store the output, if not provided ./data/{lang}/wiktionary}/{lang}_{(en)?wiktionary}_{timestamp}.wlh")
-    args = parser.parse_args()
+def entry_hyphenations(parsed: dict, lang: str):
+    """
+    Extract hyphenations of one dump entry
+    :param parsed: decoded JSON entry
+    :param lang: language of the dump
+    :return: list of hyphenated words in order of their appearance, may contain duplicates of other entries
+    """
+    word = parsed.get("word")
+    if word is None:
+        return []
+    word = word.lower()
 
-    dump_files = {
-        "cs": "cs_wiktionary_251001.jsonl",
-        "de": "de_wiktionary_251001.jsonl",
-        "el": "el_wiktionary_251001.jsonl",
-        "es": "es_wiktionary_251001.jsonl",
-        "it": "it_wiktionary_251001.jsonl",
-        "ms": "ms_wiktionary_251002.jsonl",
-        "nl": "nl_wiktionary_251002.jsonl",
-        "pl": "pl_enwiktionary_251001.jsonl",
-        "pt": "pt_enwiktionary_251001.jsonl",
-        "ru": "ru_wiktionary_251002.jsonl",
-        "tr": "tr_wiktionary_251001.jsonl"
-    }
-
-    dump_filepath = "./wikt_dump/" + dump_files[args.lang]
-
-    if not args.outfile:
-        name_long = dump_files[args.lang].split(".")[0]
-        outfilename = "./data/" + args.lang + "/wiktionary/" + name_long + ".wlh"
+    if "hyphenation" in parsed:
+        hyphenations = parsed["hyphenation"]
+        if isinstance(hyphenations, list):
+            hyphenations = " ".join(hyphenations)
+        hyphenations = hyphenations.lower() + " "  # add final space for matching
+    elif "hyphenations" in parsed:
+        hyphenations = " ".join(["-".join(h["parts"]) for h in parsed["hyphenations"]]).lower() + " "
     else:
-        outfilename = args.outfile
-
-    accents = False
-    if args.lang in ["it", "ru"]:
-        accents = True
-
-    counter = 0
-
-    outfile = open(outfilename, "w")  # overwrite all previous content of outfile
-    word_buf = set()
+        return []
 
-    with open(dump_filepath) as file:
-        for line in file:
+    hyphenations = hyphenations.translate(HYPHENATION_TABLES[lang])
+    accents = lang in ACCENTED_LANGS
+    candidates = align(word, hyphenations, accents)
+    processed = process_hyph(candidates, word, has_accents=accents)
 
-            parsed = json.loads(line)
+    hyphenations = []
+    for p in processed:
+        hyphenations += p.split()  # process multi-word entries
+    if lang == "ru":
+        hyphenations = [h for h in hyphenations if "-" in h]
+    return hyphenations
 
-            word = None
-            if "word" in parsed:
-                word = parsed["word"].lower()
+def process_chunk(lines: list, lang: str):
+    """
+    Extract hyphenations from a chunk of dump lines
+    :param lines: raw JSONL lines (bytes)
+    :param lang: language of the dump
+    :return: list of hyphenated words in order of their appearance
+    """
+    hyphenations = []
+    for line in lines:
+        hyphenations += entry_hyphenations(json.loads(line), lang)
+    return hyphenations
 
-            hyphenations = ""
+def open_dump(dump: str, lang: str):
+    """
+    Open dump of given language for binary reading
+    :param dump: zip archive with dump files (streamed without extraction) or directory with extracted dump files
+    :param lang: language of the dump
+    :return: (binary stream, path of the dump file for reporting)
+    """
+    if os.path.isdir(dump):
+        path = f"{dump}/{DUMP_FILES[lang]}"
+        return open(path, "rb"), path
+    with zipfile.ZipFile(dump) as archive:  # opened member stays readable after the archive is closed
+        for member in archive.namelist():
+            if member.rsplit("/", maxsplit=1)[-1] == DUMP_FILES[lang]:
+                return archive.open(member), f"{dump}:{member}"
+    raise FileNotFoundError(f"{DUMP_FILES[lang]} not found in {dump}")
 
-            if "hyphenation" in parsed:
-                hyphenations = parsed["hyphenation"]
-                if isinstance(hyphenations, list):
-                    hyphenations = " ".join(hyphenations)
-                hyphenations = hyphenations.lower() + " "  # add final space regex matching
-            elif "hyphenations" in parsed:
-                hyphenations = " ".join(["-".join(h["parts"]) for h in parsed["hyphenations"]]).lower() + " "
-            else:
-                continue
+def read_chunks(stream, chunk_size: int = 10000):
+    """
+    Read dump lines in chunks, lines without hyphenation are skipped before decoding
+    :param stream: binary stream of JSONL dump
+    :param chunk_size: number of lines in one chunk
+    :return: generator of lists of lines
+    """
+    chunk = []
+    for line in stream:
+        if b"hyphenation" not in line:  # covers "hyphenations" as well
+            continue
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
-            if args.lang == "ru":
-                hyphenations = re.sub("[•·̀́]", "", hyphenations)
-                hyphenations = re.sub("à", "а", hyphenations)
-                hyphenations = re.sub("ó", "о", hyphenations)
-                hyphenations = re.sub("é", "е", hyphenations)
-                hyphenations = re.sub("á", "а", hyphenations)
-            hyphenations = re.sub(f"[{ALLOWED_HYPHENATORS}]", "-", hyphenations)  # different hyphenation marks
-            regex = build_regex(word, accents)
-            candidates = re.findall(regex, hyphenations)
-            processed = process_hyph(candidates, word, has_accents=accents)
-            #if hyphenations and not candidates:
-            #    print(word, hyphenations, candidates)
-
-            hyphenations = []
-            for p in processed:
-                hyphenations += p.split() # process multi-word entries
+def ordered_map(pool: ProcessPoolExecutor, func, chunks, lang: str, ahead: int):
+    """
+    Map function over chunks in a process pool with bounded number of pending chunks
+    :param pool: process pool
+    :param func: function of (chunk, lang)
+    :param chunks: iterable of chunks
+    :param lang: language passed to the function
+    :param ahead: maximal number of chunks submitted and not yet yielded
+    :return: generator of results in order of the chunks
+    """
+    pending = collections.deque()
+    for chunk in chunks:
+        pending.append(pool.submit(func, chunk, lang))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
 
+def process_dump(dump: str, lang: str, outfile: str, pool: ProcessPoolExecutor = None, workers: int = 1, chunk_size: int = 10000):
+    """
+    Parse dump of one language into word list, every hyphenated word is written once in order of first appearance
+    :param dump: zip archive or directory with dump files
+    :param lang: language of the dump
+    :param outfile: path to output word list
+    :param pool: process pool parsing the chunks, parsed in this process if None
+    :param workers: number of processes of the pool
+    :param chunk_size: number of lines parsed at once
+    :return: (number of written words, path of the dump file)
+    """
+    counter = 0
+    word_buf = set()
+    stream, dump_filepath = open_dump(dump, lang)
+    os.makedirs(os.path.dirname(outfile) or ".", exist_ok=True)
+    with stream, open(outfile, "w") as out:  # overwrite all previous content of outfile
+        if pool is None:
+            results = (process_chunk(chunk, lang) for chunk in read_chunks(stream, chunk_size))
+        else:
+            results = ordered_map(pool, process_chunk, read_chunks(stream, chunk_size), lang, 2 * workers)
+        for hyphenations in results:
             for hyphenation in hyphenations:
-                if args.lang == "ru" and "-" not in hyphenation:
-                    continue
                 if hyphenation in word_buf:
                     continue
-                outfile.write(hyphenation + "\n")
+                out.write(hyphenation + "\n")
                 word_buf.add(hyphenation)
                 counter += 1
+    return counter, dump_filepath
 
-    outfile.close()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lang",
+                        nargs="+",
+                        choices=list(DUMP_FILES),
+                        required=True,
+                        help="Languages to which the dump files belong, processed one after another")
+    parser.add_argument("--outfile",
+                        default="",
+                        required=False,
+                        help="File to store the output (single language only), if not provided ./data/{lang}/wiktionary}/{lang}_{(en)?wiktionary}_{timestamp}.wlh")
+    parser.add_argument("--dump",
+                        default="",
+                        required=False,
+                        help="Zip archive (read without extraction) or directory with dump files, ./wikt_dump.zip or ./wikt_dump by default")
+    parser.add_argument("-j", "--jobs", type=int, default=1, required=False, help="Number of processes parsing the dump")
+    parser.add_argument("--chunk-size", type=int, default=10000, required=False, help="Number of dump lines parsed at once by one process")
+    args = parser.parse_args()
 
-    print(f"Parsed {counter} words from {dump_filepath} into {outfilename}.")
+    if args.outfile and len(args.lang) > 1:
+        parser.error("--outfile can be used with a single language only")
+    dump = args.dump
+    if not dump:
+        dump = "./wikt_dump.zip" if zipfile.is_zipfile("./wikt_dump.zip") else "./wikt_dump"
+
+    pool = ProcessPoolExecutor(args.jobs) if args.jobs > 1 else None
+    try:
+        for lang in args.lang:
+            if not args.outfile:
+                name_long = DUMP_FILES[lang].split(".")[0]
+                outfilename = "./data/" + lang + "/wiktionary/" + name_long + ".wlh"
+            else:
+                outfilename = args.outfile
+            counter, dump_filepath = process_dump(dump, lang, outfilename, pool, args.jobs, args.chunk_size)
+            print(f"Parsed {counter} words from {dump_filepath} into {outfilename}.")
+    finally:
+        if pool is not None:
+            pool.shutdown()
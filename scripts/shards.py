@@ -0,0 +1,27 @@
+import os
+
+
+def shard_offsets(file: str, n: int):
+    """
+    Split file into byte ranges of similar size, each starting at the beginning of a line
+    :param file: path to file
+    :param n: number of ranges
+    :return: list of (start, end) byte offsets, possibly fewer than n for small files
+    """
+    size = os.path.getsize(file)
+    boundaries = [0]
+    with open(file, "rb") as f:
+        for i in range(1, n):
+            position = max(size * i // n, boundaries[-1])
+            if position >= size:
+                break
+            f.seek(position)
+            if position > 0:
+                f.seek(position - 1)
+                f.readline()
+            if f.tell() >= size:
+                break
+            if f.tell() > boundaries[-1]:
+                boundaries.append(f.tell())
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
@@ -1,43 +1,139 @@
 import argparse
+import hashlib
+import io
+import json
+import multiprocessing
 import os
+import shutil
 import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from hyperparameters import combine, score, sample, metaheuristic, trace
+from hyphenator.hyphenator import Hyphenator, hyphen_mask
+from shards import shard_offsets
+
+# hyphenator shared with validation worker processes, inherited by fork or loaded once by worker initializer
+_shared_hyphenator = None
+# validator shared with fold worker processes, inherited by fork
+_shared_validator = None
+
+
+def _init_worker(pattern_file: str, hyphenation_mark: str, translate_file: str):
+    """
+    Load patterns in worker process that did not inherit them (platforms without fork)
+    """
+    global _shared_hyphenator
+    _shared_hyphenator = Hyphenator(pattern_file, hyphenation_mark=hyphenation_mark, translate_file=translate_file,
+                                    engine="automaton")
+
+
+def _validate_shard(test_file: str, start: int, end: int):
+    """
+    Evaluate shared hyphenator against part of test split
+    :param test_file: path to test dataset
+    :param start: first byte of the shard
+    :param end: first byte after the shard
+    :return: computed statistics (TP, FP, FN)
+    """
+    with open(test_file, "rb") as test:
+        test.seek(start)
+        shard = io.TextIOWrapper(io.BytesIO(test.read(end - start)))
+        return Validator.count_hyphens(_shared_hyphenator, shard)
+
+
+class FoldFeeder(threading.Thread):
+    """
+    Serve concatenation of fold files through a named pipe, once for every reader that opens the pipe
+    """
+    def __init__(self, fifo: str, files: list):
+        """
+        Create feeder, start it by .start()
+        :param fifo: path to existing named pipe
+        :param files: paths to files to be served, in order
+        """
+        super().__init__(daemon=True)
+        self.fifo = fifo
+        self.files = files
+        self.stopped = False
+
+    def run(self):
+        while not self.stopped:
+            with open(self.fifo, "wb") as out:  # blocks until a reader opens the pipe
+                if self.stopped:
+                    return
+                try:
+                    for file in self.files:
+                        with open(file, "rb") as f:
+                            shutil.copyfileobj(f, out)
+                except BrokenPipeError:
+                    pass
+                # the reader gets end of file only when no writer holds the pipe, replace the pipe before closing it
+                # so that the next writer is not attached to the current reader
+                os.mkfifo(self.fifo + ".next")
+                os.replace(self.fifo + ".next", self.fifo)
+
+    def stop(self):
+        """
+        Stop serving and wait for the feeder to finish
+        """
+        self.stopped = True
+        os.close(os.open(self.fifo, os.O_RDONLY | os.O_NONBLOCK))  # wake up feeder waiting for a reader
+        self.join()
+
+
+def _validate_fold(wordlist_file: str, index: int, verbose: bool):
+    """
+    Run one cross-validation fold with the model copy inherited from parent process
+    :param wordlist_file: path to wordlist
+    :param index: index of the fold
+    :param verbose: enable printing out progress status
+    :return: (computed statistics ((TP, FP, FN), trie nodes), trace records of the fold)
+    """
+    trace.tracer.fork_reset()
+    return _shared_validator.validate_fold(wordlist_file, index, verbose), trace.tracer.take()
 
-from hyperparameters import combine, score, sample, metaheuristic
-from hyphenator.hyphenator import Hyphenator
 
 class Validator:
     """
     Class for evaluation of patgen runs and their parameters. Abstract class, instantiate one of its subclasses
     """
-    def __init__(self, model: combine.Combiner, translate_file: str):
+    def __init__(self, model: combine.Combiner, translate_file: str, workers: int = 1):
         """
         Create superclass validator. Should not be called by itself.
         :param model: model to evaluate
         :param translate_file: path to translate file
+        :param workers: number of processes used to evaluate patterns against test split
         """
         self.model = model
         self.hyphenation_mark = "-"
         self.translate_file = translate_file
+        self.workers = workers
         self.results = None
 
     def process_results(self, results: list):
         """
-        Aggregate results from validation runs by averaging
+        Aggregate results from validation runs by averaging. Runs whose final patgen run failed (trie nodes unknown)
+        are left out of the average number of trie nodes and counted in 'failed'
         :param results: validation run results
         :return: nothing, set .results attribute
         """
         self.results = dict()
         good_total, bad_total, missed_total = 0, 0, 0
-        nodes_total = 0
+        nodes_total, failed = 0, 0
         for (good, bad, missed), trie_nodes in results:
             good_total += good
             bad_total += bad
             missed_total += missed
-            nodes_total += trie_nodes
+            if trie_nodes is None:
+                failed += 1
+            else:
+                nodes_total += trie_nodes
         self.results["good"] = good_total / len(results)
         self.results["bad"] = bad_total / len(results)
         self.results["missed"] = missed_total / len(results)
-        self.results["trie_nodes"] = nodes_total / len(results)
+        self.results["trie_nodes"] = None if failed == len(results) else nodes_total / (len(results) - failed)
+        self.results["failed"] = failed
 
     def precision(self):
         """
@@ -80,8 +176,8 @@ class Validator:
         if not tabular:
             return str(self.precision(), self.recall())
         f_score = round(self.f_score(1/7), 4)
-        trie_nodes = round(self.results["trie_nodes"], 1)
-        return f"{lang} & {name} & {profile} & {f_score:.4f} & {trie_nodes:.1f} \\\\"
+        trie_nodes = "--" if self.results["trie_nodes"] is None else f"{self.results['trie_nodes']:.1f}"
+        return f"{lang} & {name} & {profile} & {f_score:.4f} & {trie_nodes} \\\\"
 
     def train_patterns(self, train_file: str, tmp_suffix: str = ""):
         """
@@ -105,27 +201,50 @@ class Validator:
         :param pattern_file: path to trained patterns
         :return: computed statistics (TP, FP, FN)
         """
-        hyphenator = Hyphenator(pattern_file, hyphenation_mark=self.hyphenation_mark, translate_file=self.translate_file)
+        global _shared_hyphenator
+        with trace.span("load_patterns"):
+            hyphenator = Hyphenator(pattern_file, hyphenation_mark=self.hyphenation_mark, translate_file=self.translate_file, engine="automaton")
+        if self.workers <= 1:
+            with trace.span("count_hyphens"), open(test_file) as test:
+                return Validator.count_hyphens(hyphenator, test)
+
+        shards = shard_offsets(test_file, self.workers)
+        if "fork" in multiprocessing.get_all_start_methods():
+            _shared_hyphenator = hyphenator
+            pool = ProcessPoolExecutor(len(shards), mp_context=multiprocessing.get_context("fork"))
+        else:
+            pool = ProcessPoolExecutor(len(shards), initializer=_init_worker,
+                                       initargs=(pattern_file, self.hyphenation_mark, self.translate_file))
+        with trace.span("count_hyphens", shards=len(shards)), pool:
+            results = list(pool.map(_validate_shard, [test_file] * len(shards), *zip(*shards)))
+        _shared_hyphenator = None
+
+        good, bad, missed = 0, 0, 0
+        for shard_good, shard_bad, shard_missed in results:
+            good += shard_good
+            bad += shard_bad
+            missed += shard_missed
+        return good, bad, missed
+
+    @staticmethod
+    def count_hyphens(hyphenator: Hyphenator, test):
+        """
+        Compare hyphenator output with correct hyphenations
+        :param hyphenator: hyphenator to evaluate
+        :param test: iterable of correctly hyphenated words, e.g. open test dataset
+        :return: computed statistics (TP, FP, FN)
+        """
+        mark = hyphenator.hyphenation_mark
         good, bad, missed = 0, 0, 0
-        with open(test_file) as test:
-            for correct in test:
-                correct = correct.strip()
-                hyphenated = hyphenator.hyphenate(correct)
-                i_corr, i_hyph = 0, 0
-                while i_corr < len(correct) and i_hyph < len(hyphenated):
-                    if correct[i_corr] == self.hyphenation_mark and hyphenated[i_hyph] == self.hyphenation_mark:
-                        good += 1
-                        i_hyph += 1
-                        i_corr += 1
-                    elif hyphenated[i_hyph] == self.hyphenation_mark:
-                        bad += 1
-                        i_hyph += 1
-                    elif correct[i_corr] == self.hyphenation_mark:
-                        missed += 1
-                        i_corr += 1
-                    else:
-                        i_hyph += 1
-                        i_corr += 1
+        for correct in test:
+            correct = correct.strip()
+            reference = hyphen_mask(correct, mark)
+            predicted = hyphenator.hyphenate_mask_cached(correct)
+            good += (reference & predicted).bit_count()
+            bad += (predicted & ~reference).bit_count()
+            missed += (reference & ~predicted).bit_count()
+            # repeated marks (e.g. explicit hyphen followed by hyphenation point) count as missed once more
+            missed += correct.rstrip(mark).count(mark) - reference.bit_count()
         return good, bad, missed
 
     def validate(self, wordlist_file: str, verbose: bool = False):
@@ -141,53 +260,101 @@ class NFoldCrossValidator(Validator):
     """
     N-fold cross-validation
     """
-    def __init__(self, model: combine.Combiner, translate_file: str, n: int):
+    def __init__(self, model: combine.Combiner, translate_file: str, n: int, workers: int = 1, fold_workers: int = 1, pipes: bool = False):
         """
         Create validator
         :param model: model to evaluate
         :param translate_file: path to translate file
         :param n: number of folds
+        :param workers: number of processes used to evaluate patterns against test split
+        :param fold_workers: number of folds run concurrently, each in its own process
+        :param pipes: feed train splits to pattern generator through named pipes instead of writing train files
         """
-        super().__init__(model, translate_file)
+        super().__init__(model, translate_file, workers)
         self.n = n
+        self.fold_workers = fold_workers
+        self.pipes = pipes and hasattr(os, "mkfifo")
 
-    def n_fold_split(self, wordlist_file: str, index: int = 0, outfile_train: str = "", outfile_test: str = "", tmp_suffix: str = ""):
+    def fold_files(self, wordlist_file: str):
         """
-        Split dataset into train and test in 1:<n>-1 ratio
+        Split dataset into n fold files in a single pass (i-th line goes to fold i mod n). Folds are stored in test
+        directory with an index and reused while the dataset is unchanged.
         :param wordlist_file: path to wordlist
-        :param index: which of the n splits to use for test (when used for cross-validation)
-        :param outfile_train: name of output train file (<file>.train by default)
-        :param outfile_test: name of output test file (<file>.test by default)
-        :param tmp_suffix: suffix to temporary directory name
-        :return: (train file name, test file name)
+        :return: list of n fold file names
         """
         p = wordlist_file.rsplit("/", maxsplit=1)
-        if len(p) == 1:
-            wl_dir = "."
-        else:
-            wl_dir = p[0]
-
-        if "test" not in os.listdir(wl_dir):
-            os.mkdir(wl_dir + "/test")
-
-        if not outfile_train:
-            outfile_train = wl_dir + "/test/data.train" + tmp_suffix
-        train = open(outfile_train, "w")
-
-        if not outfile_test:
-            outfile_test = wl_dir + "/test/data.test" + tmp_suffix
-        test = open(outfile_test, "w")
-
-        with open(wordlist_file) as wordlist:
+        wl_dir, wl_name = (".", p[0]) if len(p) == 1 else p
+        os.makedirs(wl_dir + "/test", exist_ok=True)
+        prefix = f"{wl_dir}/test/{wl_name}.n{self.n}"
+        folds = [f"{prefix}.fold{i}" for i in range(self.n)]
+        stat = os.stat(wordlist_file)
+
+        index = dict()
+        if os.path.isfile(prefix + ".index"):
+            with open(prefix + ".index") as f:
+                index = json.load(f)
+        if all(os.path.isfile(fold) for fold in folds) and index.get("folds") == folds:
+            if index.get("size") == stat.st_size and index.get("mtime_ns") == stat.st_mtime_ns:
+                return folds
+            digest = hashlib.sha256()
+            with open(wordlist_file, "rb") as wordlist:
+                for chunk in iter(lambda: wordlist.read(1 << 20), b""):
+                    digest.update(chunk)
+            if index.get("sha256") == digest.hexdigest():
+                index["size"], index["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+                self.write_index(prefix + ".index", index)
+                return folds
+
+        digest = hashlib.sha256()
+        # temporary names are unique, so that concurrent builds of the same folds do not write into each other's files
+        outs = [open(f"{fold}.{os.getpid()}.tmp", "wb") for fold in folds]
+        with trace.span("fold_files", folds=self.n), open(wordlist_file, "rb") as wordlist:
             for i, line in enumerate(wordlist):
-                if i % self.n == index:
-                    test.write(line)
-                else:
-                    train.write(line)
+                digest.update(line)
+                outs[i % self.n].write(line)
+        for out, fold in zip(outs, folds):
+            out.close()
+            os.replace(f"{fold}.{os.getpid()}.tmp", fold)
+        trace.count("fold_bytes_written", stat.st_size)
+        index = {"folds": folds, "sha256": digest.hexdigest(), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        self.write_index(prefix + ".index", index)
+        return folds
+
+    @staticmethod
+    def write_index(path: str, index: dict):
+        """
+        Atomically store fold index
+        :param path: path to index file
+        :param index: index content
+        """
+        with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
 
-        train.close()
-        test.close()
-        return outfile_train, outfile_test
+    def fold_split(self, folds: list, index: int = 0, tmp_suffix: str = ""):
+        """
+        Prepare train and test split from fold files, train split is either written to disk or served through named pipe
+        :param folds: fold file names as returned by fold_files
+        :param index: which of the n folds to use for test
+        :param tmp_suffix: suffix to temporary file names
+        :return: (train file name, test file name, FoldFeeder serving the train split or None)
+        """
+        test = folds[index]
+        train = test.rsplit("/", maxsplit=1)[0] + "/data.train" + tmp_suffix
+        train_folds = [fold for i, fold in enumerate(folds) if i != index]
+        if os.path.exists(train):
+            os.remove(train)
+        if self.pipes:
+            os.mkfifo(train)
+            feeder = FoldFeeder(train, train_folds)
+            feeder.start()
+            return train, test, feeder
+        with open(train, "wb") as out:
+            for fold in train_folds:
+                with open(fold, "rb") as f:
+                    shutil.copyfileobj(f, out)
+        trace.count("split_bytes_written", os.path.getsize(train))
+        return train, test, None
 
     def validate(self, wordlist_file: str, verbose: bool = False):
         """
@@ -196,24 +363,54 @@ class NFoldCrossValidator(Validator):
         :param verbose: enable printing out progress status
         :return: computed statistics
         """
-        results = []
-        for i in range(self.n):
-            suffix = str(i)
+        global _shared_validator
+        self.fold_files(wordlist_file)
+        if self.fold_workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+            print("Parallel folds require fork start method, running folds sequentially", file=sys.stderr)
+        if self.fold_workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+            results = [self.validate_fold(wordlist_file, i, verbose) for i in range(self.n)]
+        else:
+            # every fold process works on its own copy of the model, with own temporary directory (tmp<fold>)
+            _shared_validator = self
+            with ProcessPoolExecutor(min(self.fold_workers, self.n), mp_context=multiprocessing.get_context("fork")) as pool:
+                results = []
+                for result, records in pool.map(_validate_fold, [wordlist_file] * self.n, range(self.n), [verbose] * self.n):
+                    results.append(result)
+                    trace.tracer.merge(*records)
+            _shared_validator = None
+        self.process_results(results)
+        return results
+
+    def validate_fold(self, wordlist_file: str, index: int, verbose: bool = False):
+        """
+        Perform one step of n-fold cross-validation
+        :param wordlist_file: path to wordlist
+        :param index: index of the fold used for test
+        :param verbose: enable printing out progress status
+        :return: computed statistics ((TP, FP, FN), trie nodes)
+        """
+        suffix = str(index)
+        with trace.span("fold", index=index):
             if verbose:
-                print(f"Validation step {i+1}/{self.n}")
+                print(f"Validation step {index+1}/{self.n}")
                 print("Creating train-test split...")
-            train, test = self.n_fold_split(wordlist_file, index=i, tmp_suffix=suffix)
+            with trace.span("split"):
+                train, test, feeder = self.fold_split(self.fold_files(wordlist_file), index=index, tmp_suffix=suffix)
             if verbose:
                 print("Generating patterns...")
-            patterns, trie_nodes = self.train_patterns(train, tmp_suffix=suffix)
+            try:
+                with trace.span("train"):
+                    patterns, trie_nodes = self.train_patterns(train, tmp_suffix=suffix)
+            finally:
+                if feeder is not None:
+                    feeder.stop()
+                os.remove(train)
             if verbose:
                 print("Validation on test set...")
-            results.append((self.validate_patterns(test, patterns), trie_nodes))
-            os.remove(train)
-            os.remove(test)
+            with trace.span("validate"):
+                result = (self.validate_patterns(test, patterns), trie_nodes)
             os.remove(patterns)
-        self.process_results(results)
-        return results
+        return result
 
 
 def extract_files(data_directory: str):
@@ -253,19 +450,42 @@ if __name__ == "__main__":
     parser.add_argument("-p", "--profile", type=str, default="", required=False, help="Parameter profile to use")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose printout")
     parser.add_argument("-t", "--tabular", action="store_true", help="Output in LateX tabular format")
+    parser.add_argument("-g", "--generator", type=str, default="patgen", choices=["patgen", "python"], required=False, help="Pattern generator, patgen binary or in-process Python implementation")
+    parser.add_argument("-j", "--jobs", type=int, default=1, required=False, help="Number of processes used to evaluate patterns on test split")
+    parser.add_argument("--score-cache", type=str, default="", required=False, help="Directory of persistent patgen score cache")
+    parser.add_argument("--score-cache-size", type=int, default=1024, required=False, help="Size limit of persistent score cache in MiB")
+    parser.add_argument("--patgen-timeout", type=float, default=None, required=False, help="Wall-clock limit of one patgen run in seconds")
+    parser.add_argument("--patgen-memory", type=int, default=None, required=False, help="Address space limit of one patgen run in MiB")
+    parser.add_argument("--patgen-logs", action="store_true", help="Keep patgen output of every run in temporary directory")
+    parser.add_argument("--pipes", action="store_true", help="Feed train splits to pattern generator through named pipes")
+    parser.add_argument("-f", "--fold-jobs", type=int, default=1, required=False, help="Number of cross-validation folds run in parallel")
+    parser.add_argument("--trace", type=str, default="", required=False, help="File to write timing trace to (Chrome trace, JSON lines if it ends with .jsonl)")
+    parser.add_argument("--profile-phases", type=str, nargs="+", default=[], required=False, help="Traced phases profiled by cProfile (e.g. train validate)")
+    parser.add_argument("--profile-dir", type=str, default="", required=False, help="Directory to write cProfile output of profiled phases to")
     args = parser.parse_args()
+    if args.trace or args.profile_phases:
+        trace.configure(profile_phases=args.profile_phases, profile_dir=args.profile_dir)
 
     datadir = args.datadir.rstrip("/")
     wl, tr, par = extract_files(datadir)
 
     # wordlist is empty so that error is raised when scorer is used prior to setting it
-    scorer = score.PatgenScorer("patgen", "", tr, verbose=args.verbose)
+    if args.generator == "python":
+        scorer = score.LiangScorer("", tr, verbose=args.verbose)
+    else:
+        scorer = score.PatgenScorer("patgen", "", tr, verbose=args.verbose, cache_dir=args.score_cache,
+                                    cache_size=args.score_cache_size << 20, timeout=args.patgen_timeout,
+                                    memory_limit=None if args.patgen_memory is None else args.patgen_memory << 20,
+                                    keep_logs=args.patgen_logs)
     sampler = sample.FileSampler(par if not args.profile else args.profile)
     meta = metaheuristic.NoMetaheuristic(scorer, sampler)
     combiner = combine.SimpleCombiner(meta, verbose=args.verbose)
 
-    validator = NFoldCrossValidator(combiner, tr, args.nfold)
-    validator.validate(wl, verbose=args.verbose)
+    validator = NFoldCrossValidator(combiner, tr, args.nfold, workers=args.jobs, fold_workers=args.fold_jobs, pipes=args.pipes)
+    with trace.span("cross_validation", dataset=datadir, folds=args.nfold):
+        validator.validate(wl, verbose=args.verbose)
+    if args.trace:
+        trace.tracer.write(args.trace)
 
     path = datadir.split("/")
     language = "" if len(path) < 2 else path[-2]
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import shutil
+import struct
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+from hyphenator import matcher, trie
+from hyphenator.hyphenator import Hyphenator, cached_patterns
+
+DATA_DIR = os.path.join(SCRIPTS_DIR, "..", "data", "is", "hyphenation-is")
+PATTERNS = os.path.join(DATA_DIR, "hyph_is.pat")
+KEY = hashlib.sha256(b"patterns").digest()
+
+
+def same_trie(a: trie.CompiledTrie, b: trie.CompiledTrie):
+    return (a.alphabet == b.alphabet and list(a.base) == list(b.base) and list(a.check) == list(b.check)
+            and list(a.output) == list(b.output) and list(a.levels) == list(b.levels))
+
+
+@pytest.fixture(scope="module")
+def compiled():
+    return trie.CompiledTrie.from_file(PATTERNS)
+
+
+@pytest.fixture
+def patterns(tmp_path):
+    path = tmp_path / "hyph_is.pat"
+    shutil.copy(PATTERNS, path)
+    return str(path)
+
+
+@pytest.fixture
+def dumped(tmp_path, compiled):
+    path = str(tmp_path / "patterns.ctrie")
+    compiled.dump(path, KEY)
+    return path
+
+
+def test_round_trip(compiled, dumped):
+    loaded = trie.CompiledTrie.load(dumped, KEY)
+    assert loaded is not None and loaded.mapped is not None
+    assert same_trie(loaded, compiled)
+    for word in (".hest", "ar", "nir.", "xyzzy", ""):
+        assert loaded.find(word) == compiled.find(word)
+
+
+def test_round_trip_empty(tmp_path):
+    empty = trie.CompiledTrie.from_patterns(dict())
+    empty.dump(str(tmp_path / "empty.ctrie"))
+    loaded = trie.CompiledTrie.load(str(tmp_path / "empty.ctrie"))
+    assert same_trie(loaded, empty) and loaded.find("a") is None
+
+
+def test_dump_leaves_no_temporary_file(tmp_path, dumped):
+    assert os.listdir(tmp_path) == ["patterns.ctrie"]
+
+
+def test_load_missing(tmp_path):
+    assert trie.CompiledTrie.load(str(tmp_path / "missing.ctrie"), KEY) is None
+
+
+def test_load_other_key(dumped):
+    assert trie.CompiledTrie.load(dumped, hashlib.sha256(b"other").digest()) is None
+    assert trie.CompiledTrie.load(dumped) is None
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: data[:-1],
+    lambda data: data[:trie.CACHE_HEADER.size - 1],
+    lambda data: b"",
+    lambda data: data + b"\0",
+    lambda data: b"NOTATRIE" + data[8:],
+    lambda data: data[:8] + struct.pack("=I", trie.CACHE_VERSION + 1) + data[12:],
+], ids=["truncated", "header", "empty", "appended", "magic", "version"])
+def test_load_corrupted(dumped, corrupt):
+    with open(dumped, "rb") as f:
+        data = f.read()
+    with open(dumped, "wb") as f:
+        f.write(corrupt(data))
+    assert trie.CompiledTrie.load(dumped, KEY) is None
+
+
+def test_cache_beside_patterns(patterns, compiled):
+    built = cached_patterns(patterns)
+    assert same_trie(built, compiled) and built.mapped is None
+    assert os.path.isfile(patterns + ".ctrie")
+    stamp = os.stat(patterns + ".ctrie").st_mtime_ns
+    reused = cached_patterns(patterns)
+    assert reused.mapped is not None and same_trie(reused, compiled)
+    assert os.stat(patterns + ".ctrie").st_mtime_ns == stamp
+
+
+def test_cache_dir(tmp_path, patterns):
+    cache_dir = str(tmp_path / "cache")
+    cached_patterns(patterns, cache_dir=cache_dir)
+    with open(patterns, "rb") as f:
+        key = hashlib.sha256(f.read() + b"\0").hexdigest()
+    assert os.listdir(cache_dir) == [f"{key}.ctrie"]
+    assert not os.path.exists(patterns + ".ctrie")
+    assert cached_patterns(patterns, cache_dir=cache_dir).mapped is not None
+
+
+def test_stale_patterns(patterns):
+    cached_patterns(patterns)
+    with open(patterns, "a") as f:
+        f.write("xy1z\n")
+    rebuilt = cached_patterns(patterns)
+    assert rebuilt.mapped is None and rebuilt.find("xyz") == [(2, "1")]
+    assert cached_patterns(patterns).find("xyz") == [(2, "1")]
+
+
+def test_stale_translate_file(tmp_path, patterns):
+    translate = tmp_path / "hyph_is.tra"
+    translate.write_text(" 1 2\n")
+    cached_patterns(patterns, str(translate))
+    assert cached_patterns(patterns, str(translate)).mapped is not None
+    translate.write_text(" 2 2\n")
+    assert cached_patterns(patterns, str(translate)).mapped is None
+    # cache of patterns alone is keyed without the translate file
+    assert cached_patterns(patterns).mapped is None
+
+
+def test_same_content_reuses_cache(patterns):
+    cached_patterns(patterns)
+    with open(patterns, "rb") as f:
+        data = f.read()
+    os.remove(patterns)
+    with open(patterns, "wb") as f:
+        f.write(data)
+    assert cached_patterns(patterns).mapped is not None
+
+
+def test_corrupted_cache_is_rebuilt(patterns, compiled):
+    cached_patterns(patterns)
+    with open(patterns + ".ctrie", "r+b") as f:
+        f.truncate(os.path.getsize(patterns + ".ctrie") // 2)
+    rebuilt = cached_patterns(patterns)
+    assert rebuilt.mapped is None and same_trie(rebuilt, compiled)
+    assert cached_patterns(patterns).mapped is not None
+
+
+@pytest.mark.parametrize("engine", list(matcher.MATCHERS))
+def test_cached_hyphenator(patterns, engine):
+    with open(os.path.join(DATA_DIR, "hyph_is_list.wlh")) as wl:
+        words = [line.strip() for i, line in enumerate(wl) if i % 200 == 0]
+    plain = Hyphenator(patterns, right_hyphen_min=2, engine=engine)
+    for _ in range(2):  # building the cache and loading it
+        cached = Hyphenator(patterns, right_hyphen_min=2, engine=engine, cache=True)
+        assert [cached.hyphenate(word) for word in words] == [plain.hyphenate(word) for word in words]
@@ -0,0 +1,86 @@
+import os
+import re
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+from hyphenator import matcher, trie
+from hyphenator.hyphenator import Hyphenator
+
+DATA_DIR = os.path.join(SCRIPTS_DIR, "..", "data", "is", "hyphenation-is")
+PATTERNS = os.path.join(DATA_DIR, "hyph_is.pat")
+LEFT_HYPHEN_MIN, RIGHT_HYPHEN_MIN = 1, 2
+EDGE_CASES = ["", "a", "ab", "Aach-en", "aaað-eins", "-ab-", "xyzzy"]
+
+
+def reference_levels(patterns: trie.Trie, word_bounded: str, hyphenation_mark: str = "-"):
+    """
+    Levels as computed by the original Hyphenator.hyphenate over Trie
+    """
+    levels = [0 for _ in range(len(word_bounded)-1)]
+    for i in range(len(word_bounded)-1):
+        for j in range(i+1, len(word_bounded) + 1):
+            subword = word_bounded[i:] if j == len(word_bounded) else word_bounded[i:j]
+            outputs = patterns.find(subword, hyphenation_mark)
+            if outputs is None:
+                continue
+            for index, value in outputs:
+                levels[i + index - 1] = max(int(value), levels[i + index - 1])
+    return levels
+
+
+def reference_hyphenate(patterns: trie.Trie, word: str, hyphenation_mark: str = "-"):
+    """
+    The original Hyphenator.hyphenate
+    """
+    word_bounded = "." + re.sub(hyphenation_mark, "", word.lower()) + "."
+    levels = reference_levels(patterns, word_bounded, hyphenation_mark)
+    hyphenated = ""
+    for i, letter in enumerate(re.sub(hyphenation_mark, "", word)):
+        if levels[i] > 0 and levels[i] % 2 == 1 and LEFT_HYPHEN_MIN <= i <= len(word) - RIGHT_HYPHEN_MIN:
+            hyphenated += hyphenation_mark
+        hyphenated += letter
+    return hyphenated
+
+
+@pytest.fixture(scope="module")
+def reference():
+    patterns = trie.Trie()
+    patterns.populate(PATTERNS)
+    return patterns
+
+
+@pytest.fixture(scope="module")
+def words():
+    with open(os.path.join(DATA_DIR, "hyph_is_list.wlh")) as wl:
+        return [line.strip() for i, line in enumerate(wl) if i % 250 == 0] + EDGE_CASES
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+@pytest.mark.parametrize("engine", list(matcher.MATCHERS))
+def test_engine_levels(reference, words, engine, compiled):
+    patterns = trie.CompiledTrie.from_file(PATTERNS) if compiled else reference
+    m = matcher.MATCHERS[engine](patterns, "-")
+    for word in words:
+        word_bounded = "." + word.replace("-", "").lower() + "."
+        assert m.levels(word_bounded) == reference_levels(reference, word_bounded), word
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+@pytest.mark.parametrize("engine", list(matcher.MATCHERS))
+def test_engine_hyphenations(reference, words, engine, compiled):
+    hyphenator = Hyphenator(PATTERNS, left_hyphen_min=LEFT_HYPHEN_MIN, right_hyphen_min=RIGHT_HYPHEN_MIN,
+                            compiled=compiled, engine=engine)
+    for word in words:
+        assert hyphenator.hyphenate(word) == reference_hyphenate(reference, word), word
+
+
+@pytest.mark.parametrize("engine", list(matcher.MATCHERS))
+def test_multi_letter_mark(reference, engine):
+    hyphenator = Hyphenator(PATTERNS, hyphenation_mark="==", left_hyphen_min=LEFT_HYPHEN_MIN,
+                            right_hyphen_min=RIGHT_HYPHEN_MIN, engine=engine)
+    for word in EDGE_CASES + ["aach==en", "aa==að==eins"]:
+        assert hyphenator.hyphenate(word) == reference_hyphenate(reference, word, "=="), word
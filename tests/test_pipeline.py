@@ -0,0 +1,119 @@
+import os
+import sys
+import zipfile
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+import pipeline
+
+PROFILES = [os.path.join(SCRIPTS_DIR, "..", "profiles", name) for name in ("base.in", "cshyphen.in")]
+
+
+def make_dataset(data_dir, lines: int = 300, name: str = "small"):
+    """
+    Create small dataset from the first lines of bundled Czech word list
+    """
+    os.makedirs(data_dir / "cs" / name)
+    with open(os.path.join(SCRIPTS_DIR, "..", "data", "cs", "cshyphen_ujc", "cs-lemma-ujc-1.wlh")) as src:
+        words = [next(src) for _ in range(lines)]
+    (data_dir / "cs" / name / f"{name}.wlh").write_text("".join(words))
+    return data_dir / "cs" / name / f"{name}.wlh"
+
+
+def run(tmp_path, **options):
+    stages = pipeline.build_stages(str(tmp_path / "data"), "", [], [], str(tmp_path / "reports"), stats=True)
+    return pipeline.run_stages(stages, pipeline.State(str(tmp_path / "state.json")), jobs=2, **options)
+
+
+def test_validate_stages_of_dataset_share_lock(tmp_path):
+    make_dataset(tmp_path / "data")
+    stages = pipeline.build_stages(str(tmp_path / "data"), "", [], [], str(tmp_path / "reports"), profiles=PROFILES)
+    validate = [stage for stage in stages if ":validate:" in stage.name]
+    assert len(validate) == 2
+    assert validate[0].lock and validate[0].lock == validate[1].lock
+
+
+def test_two_profiles_in_parallel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # train_test.py creates temporary directory in working directory
+    make_dataset(tmp_path / "data")
+    stages = pipeline.build_stages(str(tmp_path / "data"), "", [], [], str(tmp_path / "reports"), profiles=PROFILES,
+                                   nfold=2, generator="python")
+    state = pipeline.State(str(tmp_path / "state.json"))
+    results = pipeline.run_stages(stages, state, jobs=2)
+    assert results == {
+        "cs/small:prepare": "done",
+        "cs/small:validate:base": "done",
+        "cs/small:validate:cshyphen": "done",
+    }
+    for profile in ("base", "cshyphen"):
+        report = (tmp_path / "reports" / "cs" / "small" / f"{profile}.txt").read_text()
+        assert report.startswith("cs & small &")
+
+    # nothing changed, everything is reused
+    results = pipeline.run_stages(stages, pipeline.State(str(tmp_path / "state.json")), jobs=2)
+    assert set(results.values()) == {"skipped"}
+
+
+def test_find_sources(tmp_path):
+    data = tmp_path / "data"
+    make_dataset(data, 10, "plain")
+    (data / "cs" / "plain" / "plain.wlh_dis.wlh").write_text("")
+    os.makedirs(data / "de" / "weighted")
+    (data / "de" / "weighted" / "weighted.wlhw").write_text("")
+    (data / "de" / "weighted" / "weighted.wlhw_expanded.wlh").write_text("")
+    os.makedirs(data / "de" / "two")
+    (data / "de" / "two" / "a.wlh").write_text("")
+    (data / "de" / "two" / "b.wlh").write_text("")
+    assert pipeline.find_sources(str(data)) == {
+        "cs/plain": f"{data}/cs/plain/plain.wlh",
+        "de/weighted": f"{data}/de/weighted/weighted.wlhw",
+    }
+
+
+def test_only_changed_dataset_is_rerun(tmp_path):
+    first = make_dataset(tmp_path / "data", 300, "first")
+    make_dataset(tmp_path / "data", 200, "second")
+    assert run(tmp_path) == {"cs/first:prepare": "done", "cs/second:prepare": "done"}
+    assert (tmp_path / "reports" / "cs" / "first" / "stats.txt").read_text().startswith("cs & first &")
+    assert run(tmp_path) == {"cs/first:prepare": "skipped", "cs/second:prepare": "skipped"}
+
+    # rewriting the same content changes modification time only
+    first.write_text(first.read_text())
+    assert run(tmp_path) == {"cs/first:prepare": "skipped", "cs/second:prepare": "skipped"}
+
+    with open(first, "a") as f:
+        f.write("xy-lo-fon\n")
+    assert run(tmp_path, dry_run=True) == {"cs/first:prepare": "outdated", "cs/second:prepare": "skipped"}
+    assert run(tmp_path) == {"cs/first:prepare": "done", "cs/second:prepare": "skipped"}
+
+    # changed or missing outputs are rebuilt as well
+    os.remove(f"{first}_dis.wlh.tra")
+    assert run(tmp_path) == {"cs/first:prepare": "done", "cs/second:prepare": "skipped"}
+    assert run(tmp_path, force=True) == {"cs/first:prepare": "done", "cs/second:prepare": "done"}
+
+
+def test_failed_stage_blocks_dependents(tmp_path):
+    source = make_dataset(tmp_path / "data")
+    stages = pipeline.build_stages(str(tmp_path / "data"), "", [], [], str(tmp_path / "reports"), profiles=PROFILES)
+    os.remove(source)  # source removed after the stages were planned, its stage fails on missing input
+    results = pipeline.run_stages(stages, pipeline.State(str(tmp_path / "state.json")), jobs=2)
+    assert results == {
+        "cs/small:prepare": "failed",
+        "cs/small:validate:base": "blocked",
+        "cs/small:validate:cshyphen": "blocked",
+    }
+
+
+def test_digest_of_archive_member(tmp_path):
+    archive = tmp_path / "dump.zip"
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("cs.jsonl", "{}\n")
+    state = pipeline.State(str(tmp_path / "state.json"))
+    digest = state.digest(f"{archive}:cs.jsonl")
+    assert digest is not None and digest.startswith("crc32:")
+    assert state.digest(f"{archive}:de.jsonl") is None
+    assert state.digest(str(tmp_path / "missing.zip:cs.jsonl")) is None
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("cs.jsonl", "{}\n{}\n")
+    assert state.digest(f"{archive}:cs.jsonl") != digest
@@ -0,0 +1,100 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+from prepare import prepare
+
+SOURCE = os.path.join(SCRIPTS_DIR, "..", "data", "cs", "cshyphen_ujc", "cs-lemma-ujc-1.wlh")
+# memory budget in bytes small enough to sort the word list in many runs
+SMALL_MEMORY = 1 << 12
+MODES = {
+    "memory": dict(),
+    "external": dict(memory_limit=SMALL_MEMORY),
+    "parallel": dict(workers=3),
+    "parallel_external": dict(workers=3, memory_limit=SMALL_MEMORY),
+}
+
+
+def script(*args):
+    """
+    Run script of the scripts directory and return its standard output
+    """
+    result = subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, args[0]), *args[1:]], capture_output=True,
+                            text=True, check=True)
+    return result.stdout
+
+
+def dataset(root, lines: int = 3000):
+    """
+    Create dataset cs/small from the first lines of bundled Czech word list, some words there are ambiguous
+    """
+    os.makedirs(root / "cs" / "small")
+    with open(SOURCE) as src:
+        words = [next(src) for _ in range(lines)]
+    path = root / "cs" / "small" / "small.wlh"
+    path.write_text("".join(words))
+    return str(path)
+
+
+def read(path: str):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def separate(tmp_path_factory):
+    """
+    Results of disambiguate.py, make_tr.py and statistics.py run one after another
+    """
+    wordlist = dataset(tmp_path_factory.mktemp("separate"))
+    outfile = wordlist + "_dis.wlh"
+    counts = script("disambiguate.py", wordlist, "-o", outfile).split()[2:]
+    script("make_tr.py", outfile)
+    return {
+        "counts": tuple(int(count) for count in counts),
+        "wordlist": read(outfile),
+        "translate": read(outfile + ".tra"),
+        "stats": script("statistics.py", "-d", outfile).rstrip("\n"),
+        "table": script("statistics.py", "-d", "-t", outfile).rstrip("\n"),
+    }
+
+
+def test_word_list_is_ambiguous(separate):
+    before, after = separate["counts"]
+    assert before > after
+
+
+@pytest.mark.parametrize("mode", list(MODES))
+def test_prepare_as_separate_scripts(tmp_path, separate, mode):
+    wordlist = dataset(tmp_path)
+    outfile = wordlist + "_dis.wlh"
+    before, after, info = prepare(wordlist, outfile=outfile, tmp_dir=str(tmp_path), **MODES[mode])
+    assert (before, after) == separate["counts"]
+    assert read(outfile) == separate["wordlist"]
+    assert read(outfile + ".tra") == separate["translate"]
+    assert str(info) == separate["stats"]
+    assert info.report(tabular=True) == separate["table"]
+    assert sorted(os.listdir(tmp_path / "cs" / "small")) == ["small.wlh", "small.wlh_dis.wlh", "small.wlh_dis.wlh.tra"]
+
+
+def test_prepare_script(tmp_path, separate):
+    wordlist = dataset(tmp_path)
+    assert script("prepare.py", wordlist, "-s", "-t", "-j", "2").rstrip("\n") == separate["table"]
+    assert read(wordlist + "_dis.wlh") == separate["wordlist"]
+    assert read(wordlist + "_dis.wlh.tra") == separate["translate"]
+    assert script("prepare.py", wordlist).split()[2:] == [str(count) for count in separate["counts"]]
+
+
+def test_fixed_hyphen_min(tmp_path):
+    wordlist = dataset(tmp_path, 500)
+    outfile = wordlist + "_dis.wlh"
+    prepare(wordlist, outfile=outfile, left_hyphen_min=3, right_hyphen_min=4)
+    prepared = read(outfile + ".tra")
+    script("make_tr.py", outfile, "--left_hyphen_min", "3", "--right_hyphen_min", "4")
+    assert prepared == read(outfile + ".tra")
+    assert prepared.startswith(b" 3 4")
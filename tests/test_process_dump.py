@@ -0,0 +1,119 @@
+import os
+import random
+import re
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+import process_dump
+
+# (language, word, hyphenation string of the dump entry)
+ENTRIES = [
+    ("it", "perché", "per-ché"),
+    ("it", "citta", "cit-tà"),
+    ("it", "ancora", "àn-co-ra, an-có-ra"),
+    ("it", "a", "a"),
+    ("it", "casa", "ca‧sa · ca·sa ca.sa"),
+    ("it", "l'acqua", "l'àc-qua"),
+    ("it", "sotto voce", "sot-to vo-ce"),
+    ("it", "sotto voce", "sòt-to-vó-ce"),
+    ("it", "(bene)", "(be-ne)"),
+    ("it", "perche", "perché per-che per--che"),
+    ("ru", "молоко", "мо-ло́-ко"),
+    ("ru", "молоко", "мо·ло·ко́"),
+    ("ru", "и", "ѝ"),
+    ("ru", "уже", "ý-же у•же"),
+    ("ru", "сказать", "ска-за̀ть ска‐зать"),
+    ("ru", "дом", "дом"),
+    ("cs", "kolo", "ko-lo ko‐lo ko­lo"),
+    ("cs", "na-příklad", "na-pří-klad"),
+    ("cs", "abc", "a-b-c-d a-b-c"),
+    ("cs", "a3b", "a-3b a3-b"),
+    ("de", "aaa", "a-a-a-a-a"),
+    ("de", "Haus", "Haus"),
+    ("de", "", "x y"),
+]
+
+
+def old_build_regex(base_word: str, has_accents: bool = False):
+    """
+    Regular expression matching hyphenations of a word, as it was used before align
+    """
+    letters = []
+    for letter in base_word:
+        if letter in "()[]":
+            letters.append(f"[\\{letter}]")
+        elif has_accents:
+            letters.append(f"[{letter}{process_dump.ACCENTED.get(letter, '')}]")
+        else:
+            letters.append(f"[{letter}]")
+    return "[-]?".join(letters) + r"\s"
+
+
+def old_normalize(hyphenations: str, lang: str):
+    """
+    Normalization of hyphenation string of an entry, as it was done before HYPHENATION_TABLES
+    """
+    if lang == "ru":
+        hyphenations = re.sub("[•·̀́]", "", hyphenations)
+        hyphenations = re.sub("à", "а", hyphenations)
+        hyphenations = re.sub("ó", "о", hyphenations)
+        hyphenations = re.sub("é", "е", hyphenations)
+        hyphenations = re.sub("á", "а", hyphenations)
+    return re.sub(f"[{process_dump.ALLOWED_HYPHENATORS}]", "-", hyphenations)
+
+
+def old_process_hyph(data: list, base_word: str, has_accents: bool = False):
+    """
+    Cleanup of matched hyphenations, as it was done with regular expressions
+    """
+    translated = dict()
+    for hyph in data:
+        hyph_tr = re.sub(r"\d+|\*|\.", "", hyph)
+        hyph_tr = re.sub(r"-+", "-", hyph_tr)
+        hyph_tr = re.sub(r"\s*-\s*", "-", hyph_tr)
+        hyph_tr = hyph_tr.strip(" -")
+        if has_accents:
+            hyph_tr = process_dump.process_accents(hyph_tr, base_word.strip("-"), base_word)
+        translated[hyph_tr] = None
+    return list(translated)
+
+
+@pytest.mark.parametrize("lang, word, hyphenations", ENTRIES)
+def test_mark_tables(lang, word, hyphenations):
+    assert hyphenations.translate(process_dump.HYPHENATION_TABLES[lang]) == old_normalize(hyphenations, lang)
+
+
+@pytest.mark.parametrize("lang, word, hyphenations", ENTRIES)
+def test_align_entries(lang, word, hyphenations):
+    accents = lang in process_dump.ACCENTED_LANGS
+    normalized = old_normalize(hyphenations.lower() + " ", lang)
+    word = word.lower()
+    expected = re.findall(old_build_regex(word, accents), normalized)
+    assert process_dump.align(word, normalized, accents) == expected
+    assert process_dump.process_hyph(expected, word, accents) == old_process_hyph(expected, word, accents)
+
+
+def test_align_examples():
+    assert process_dump.align("citta", "cit-tà ", True) == ["cit-tà "]
+    assert process_dump.align("citta", "cit-tà ", False) == []
+    assert process_dump.entry_hyphenations({"word": "Perché", "hyphenation": ["per-ché", "pèr-che"]}, "it") == \
+        ["per-ché"]
+    assert process_dump.entry_hyphenations({"word": "молоко", "hyphenation": "мо-ло́-ко"}, "ru") == ["мо-ло-ко"]
+
+
+@pytest.mark.parametrize("has_accents", [False, True])
+def test_align_random(has_accents):
+    rng = random.Random(1)
+    alphabet = "abeà-é \t.*1èиѝ()"
+    for _ in range(20000):
+        word = "".join(rng.choice("abeи-(") for _ in range(rng.randint(0, 5)))
+        hyphenations = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 16))) + " "
+        hyphenations = hyphenations.translate(process_dump.MARK_TABLE)
+        expected = re.findall(old_build_regex(word, has_accents), hyphenations)
+        assert process_dump.align(word, hyphenations, has_accents) == expected, (word, hyphenations)
+        assert process_dump.process_hyph(expected, word, has_accents) == \
+            old_process_hyph(expected, word, has_accents), (word, expected)
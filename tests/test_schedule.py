@@ -0,0 +1,101 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+from hyperparameters import schedule
+
+MEMORY_LIMIT = 1 << 32
+
+
+def python_job(tmp_path, code: str, **kwargs):
+    """
+    Create job running Python code with empty standard input
+    """
+    stdin = tmp_path / "empty.in"
+    stdin.write_text("")
+    return schedule.Job([sys.executable, "-c", code], str(stdin), **kwargs)
+
+
+def run_all(scheduler: schedule.Scheduler, jobs: list):
+    """
+    Run jobs and check that no reader of their output is left behind
+    """
+    async def run():
+        results = await scheduler.run_jobs(jobs)
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+        return results
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("memory_limit", [None, MEMORY_LIMIT])
+def test_statuses(tmp_path, memory_limit):
+    jobs = [
+        python_job(tmp_path, "print('ok')"),
+        python_job(tmp_path, "import sys; print('bad input', file=sys.stderr); sys.exit(3)"),
+        python_job(tmp_path, "import time; time.sleep(10)"),
+        python_job(tmp_path, "import sys, time; print('line', flush=True); time.sleep(10)", on_line=lambda line: True),
+    ]
+    results = run_all(schedule.Scheduler(workers=4, timeout=1, memory_limit=memory_limit), jobs)
+    assert [result.status for result in results] == ["ok", "failed", "timeout", "aborted"]
+    assert results[1].returncode == 3
+    assert results[2].elapsed < 5 and results[3].elapsed < 5
+
+
+def test_memory_statuses(tmp_path):
+    jobs = [
+        python_job(tmp_path, "import os, signal; os.kill(os.getpid(), signal.SIGKILL)"),
+        python_job(tmp_path, "import os, signal; os.kill(os.getpid(), signal.SIGSEGV)"),
+        python_job(tmp_path, "import sys; print('fatal: memory exhausted (xmalloc of 64 bytes).', file=sys.stderr); "
+                             "sys.exit(1)"),
+        python_job(tmp_path, "import os, signal; os.kill(os.getpid(), signal.SIGTERM)"),
+        python_job(tmp_path, "import sys; print('no memory involved', file=sys.stderr); sys.exit(1)"),
+    ]
+    results = run_all(schedule.Scheduler(workers=2, timeout=10, memory_limit=MEMORY_LIMIT), jobs)
+    assert [result.status for result in results] == ["memory", "memory", "memory", "failed", "failed"]
+    assert results[2].message == "fatal: memory exhausted (xmalloc of 64 bytes)."
+    assert results[4].message == "no memory involved"
+
+
+def test_signal_without_memory_limit(tmp_path):
+    job = python_job(tmp_path, "import os, signal; os.kill(os.getpid(), signal.SIGKILL)")
+    assert run_all(schedule.Scheduler(), [job])[0].status == "failed"
+
+
+def test_output_and_callbacks(tmp_path):
+    lines, finished = [], []
+    jobs = [
+        python_job(tmp_path, "print('a'); print('b')", stdout_path=str(tmp_path / "out.log"), on_line=lines.append,
+                   on_exit=finished.append),
+        python_job(tmp_path, "print('c')", stdout_path=str(tmp_path / "plain.log")),
+    ]
+    results = schedule.Scheduler(workers=2).run(jobs)
+    assert lines == ["a\n", "b\n"]
+    assert finished == [results[0]]
+    assert (tmp_path / "out.log").read_text() == "a\nb\n"
+    assert (tmp_path / "plain.log").read_text() == "c\n"
+
+
+def test_missing_program(tmp_path):
+    stdin = tmp_path / "empty.in"
+    stdin.write_text("")
+    result = schedule.Scheduler().run([schedule.Job([str(tmp_path / "missing")], str(stdin))])[0]
+    assert result.status == "error" and not result.ok()
+
+
+def test_error_reader_does_not_outlive_job(tmp_path, monkeypatch):
+    async def endless_tail(stream, size: int = 1 << 12):
+        await asyncio.sleep(3600)
+    # reader of error output that would never finish on its own
+    monkeypatch.setattr(schedule.Scheduler, "tail", staticmethod(endless_tail))
+    jobs = [
+        python_job(tmp_path, "print('ok')"),
+        python_job(tmp_path, "import time; time.sleep(10)"),
+        python_job(tmp_path, "import time; print('line', flush=True); time.sleep(10)", on_line=lambda line: True),
+    ]
+    results = run_all(schedule.Scheduler(workers=3, timeout=1, memory_limit=MEMORY_LIMIT), jobs)
+    assert [result.status for result in results] == ["ok", "timeout", "aborted"]
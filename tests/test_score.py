@@ -0,0 +1,195 @@
+import os
+import stat
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+from hyperparameters import combine, metaheuristic, sample, score
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# lines of pattern file written by the run, patterns sharing letters are written on one line
+PATTERN_LINES = {1: 70, 2: 290}
+FINAL = {
+    1: {"tp": 2190, "fp": 5050, "fn": 81, "trie_nodes": 337, "level_patterns": 72},
+    2: {"tp": 1840, "fp": 150, "fn": 431, "trie_nodes": 700, "level_patterns": 235},
+}
+# stands in for patgen: prints output of patgen for the level given on standard input and writes pattern file
+STUB_PATGEN = """import sys
+level = int(sys.stdin.readline().split()[0])
+with open({data_dir!r} + f"/patgen_level{{level}}.log") as log:
+    for line in log:
+        print(line, end="", flush=True)
+with open(sys.argv[3], "w") as out:
+    out.write("".join(f"p{{i}}\\n" for i in range({lines!r}[level])))
+open(f"pattmp.{{level}}", "w").close()
+"""
+
+
+def transcript(level: int):
+    with open(os.path.join(DATA_DIR, f"patgen_level{level}.log")) as log:
+        return log.readlines()
+
+
+def make_sample(level: int, stats: dict = None):
+    s = sample.Sample({"level": level, "prev": 0, "pat_start": level, "pat_finish": level + 1})
+    if stats is not None:
+        s.stats = stats
+    return s
+
+
+@pytest.mark.parametrize("level", [1, 2])
+def test_parser_stats(level):
+    parser = score.PatgenLogParser(level)
+    for line in transcript(level):
+        parser.feed(line)
+    assert parser.stats() == FINAL[level]
+
+
+@pytest.mark.parametrize("level", [1, 2])
+def test_parser_bounds_hold_on_every_line(level):
+    final = make_sample(level, dict(FINAL[level], n_patterns=PATTERN_LINES[level]))
+    parser = score.PatgenLogParser(level)
+    for line in transcript(level):
+        parser.feed(line)
+        bounds = parser.bounds()
+        assert bounds["precision"] + 1e-12 >= final.precision(), line
+        assert bounds["recall"] + 1e-12 >= final.recall(), line
+        assert bounds["n_patterns"] <= final.n_patterns(), line
+
+
+def test_parser_bounds_values():
+    parser = score.PatgenLogParser(1)
+    updates = [parser.feed(line) for line in transcript(1)]
+    assert updates.count(True) == 8  # patterns read, 4 accuracy summaries, 3 passes
+    assert parser.bounds() == {"precision": 2271 / (2271 + 5050), "recall": 1.0, "n_patterns": 57}
+
+    parser = score.PatgenLogParser(2)
+    for line in transcript(2):
+        parser.feed(line)
+    assert parser.bounds() == {"precision": 1.0, "recall": 1840 / 2271, "n_patterns": 140}
+
+
+def first_stop(level: int, prune):
+    """
+    Index of the output line the scorer stops the run at, None if the run is not stopped
+    """
+    parser = score.PatgenLogParser(level)
+    for i, line in enumerate(transcript(level)):
+        if parser.feed(line) and prune(parser.bounds()):
+            return i
+    return None
+
+
+def test_f_score_dominated():
+    lines = transcript(1)
+    strong = make_sample(1, {"tp": 2000, "fp": 100, "fn": 271, "n_patterns": 100})
+    assert lines[first_stop(1, lambda bounds: metaheuristic.f_score_dominated(bounds, strong))] == "1380 good, 4020 bad, 891 missed\n"
+    small = make_sample(1, {"tp": 100, "fp": 9000, "fn": 2171, "n_patterns": 30})
+    assert lines[first_stop(1, lambda bounds: metaheuristic.f_score_dominated(bounds, small))] == "57 good and 554 bad patterns added (more to come)\n"
+    # the run ends better than a weak incumbent, it must not be stopped
+    weak = make_sample(1, {"tp": 100, "fp": 9000, "fn": 2171, "n_patterns": 500})
+    final = make_sample(1, dict(FINAL[1], n_patterns=PATTERN_LINES[1]))
+    assert metaheuristic.HillClimbing(None, None).eval_func(final, weak)
+    assert first_stop(1, lambda bounds: metaheuristic.f_score_dominated(bounds, weak)) is None
+    # a failed incumbent has unknown size and no true positives, any run may beat it
+    failed = make_sample(1, {"tp": 0, "fp": 0, "fn": 0, "n_patterns": None, "status": "failed"})
+    assert first_stop(1, lambda bounds: metaheuristic.f_score_dominated(bounds, failed)) is None
+
+
+def test_outranked():
+    lines = transcript(2)
+    finished = [{"n_patterns": 60}, {"n_patterns": 120}, {"n_patterns": 400}]
+    assert lines[first_stop(2, lambda bounds: combine.outranked(bounds, finished, 1))] == "70 patterns read in\n"
+    assert lines[first_stop(2, lambda bounds: combine.outranked(bounds, finished, 2))] == "140 good and 1490 bad patterns added\n"
+    assert first_stop(2, lambda bounds: combine.outranked(bounds, finished, 3)) is None
+
+
+@pytest.fixture
+def stub_scorer(tmp_path):
+    stub = tmp_path / "patgen"
+    stub.write_text(f"#!{sys.executable}\n" + STUB_PATGEN.format(data_dir=DATA_DIR, lines=PATTERN_LINES))
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+    (tmp_path / "words.wlh").write_text("ab-c\n")
+    (tmp_path / "words.tra").write_text(" 2 2\n")
+    scorer = score.PatgenScorer(str(stub), str(tmp_path / "words.wlh"), str(tmp_path / "words.tra"))
+    yield scorer
+    scorer.clean()
+
+
+def test_scorer_statistics(stub_scorer):
+    first = make_sample(1)
+    stub_scorer.score(first)
+    assert first.stats == dict(FINAL[1], n_patterns=PATTERN_LINES[1])
+    second = make_sample(2)
+    second.prev = first.run_id
+    stub_scorer.score(second)
+    assert second.stats == dict(FINAL[2], n_patterns=PATTERN_LINES[2])
+    assert os.path.isfile(f"{stub_scorer.temp_dir}/{second.run_id}.pattmp")
+
+
+def test_scorer_stops_dominated_run(stub_scorer):
+    incumbent = make_sample(1, {"tp": 2000, "fp": 100, "fn": 271, "n_patterns": 100})
+    stub_scorer.prune = lambda s, bounds, finished: metaheuristic.f_score_dominated(bounds, incumbent)
+    s = make_sample(1)
+    stub_scorer.score(s)
+    assert s.stats["status"] == "dominated"
+    assert s.stats["n_patterns"] is None and s.n_patterns() == sys.maxsize
+    # patterns of a stopped run are those of the previous level
+    assert os.path.getsize(f"{stub_scorer.temp_dir}/{s.run_id}.pat") == 0
+
+
+def liang_scorer(tmp_path, words: list, translate: str):
+    (tmp_path / "words.wlh").write_text("".join(word + "\n" for word in words))
+    (tmp_path / "words.tra").write_text(translate)
+    return score.LiangScorer(str(tmp_path / "words.wlh"), str(tmp_path / "words.tra"))
+
+
+def test_liang_letters_of_translate_file(tmp_path):
+    scorer = liang_scorer(tmp_path, ["Cha-ta", "á-ch", "chach"], " 1 1  -\n a A á\n ch CH Ch\n t T\n /h/H//\n")
+    words, hyphens = scorer.load_wordlist()
+    ch = "\ue000"  # letter of two characters
+    assert words == [f".{ch}ata.", f".a{ch}.", f".{ch}a{ch}."]
+    # hyphen positions count letters, not characters
+    assert hyphens == [1 << 2, 1 << 1, 0]
+    s = make_sample(1)
+    s.pat_start, s.pat_finish = 1, 2
+    scorer.score(s)
+    scorer.export_patterns(s.run_id, str(tmp_path / "out.pat"))
+    patterns = (tmp_path / "out.pat").read_text().split()
+    assert patterns and all(set(p) <= set("1ach.t") for p in patterns)
+    scorer.clean()
+
+
+def test_liang_same_as_folded_word_list(tmp_path):
+    folded = tmp_path / "folded"
+    folded.mkdir()
+    words = ["ko-lo", "KO-LO-BĚŽ-KA", "Kó-la", "běž-kó", "lo-ka"]
+    classes = liang_scorer(tmp_path, words, " 1 1  -\n b B\n ě Ě\n k K\n l L\n o O ó Ó\n ž Ž\n a A\n")
+    plain = liang_scorer(folded, [w.lower().replace("ó", "o") for w in words], " 1 1  -\n a\n b\n ě\n k\n l\n o\n ž\n")
+    for scorer in (classes, plain):
+        s = make_sample(1)
+        s.pat_start, s.pat_finish = 1, 3
+        scorer.score(s)
+        scorer.export_patterns(s.run_id, str(scorer.temp_dir) + "/out.pat")
+    assert classes.load_wordlist() == plain.load_wordlist()
+    with open(classes.temp_dir + "/out.pat") as a, open(plain.temp_dir + "/out.pat") as b:
+        patterns = a.read()
+        assert patterns and patterns == b.read()
+    classes.clean()
+    plain.clean()
+
+
+def test_liang_letter_missing_in_translate_file(tmp_path):
+    scorer = liang_scorer(tmp_path, ["ab-c"], " 1 1  -\n a\n b\n")
+    with pytest.raises(ValueError):
+        scorer.load_wordlist()
+    scorer.clean()
+
+
+def test_liang_translate_file_without_letters(tmp_path):
+    scorer = liang_scorer(tmp_path, ["Ab-c"], " 1 1  -\n")
+    assert scorer.load_wordlist() == ([".abc."], [1 << 2])
+    scorer.clean()
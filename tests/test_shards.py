@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+from shards import shard_offsets
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 7, 50])
+@pytest.mark.parametrize("lines", [[], ["a"], ["a", "bb", "ccc"], ["word-%d" % i * (i % 5 + 1) for i in range(40)]])
+def test_shards_cover_whole_lines(tmp_path, n, lines):
+    path = tmp_path / "words.wlh"
+    content = "".join(line + "\n" for line in lines).encode()
+    path.write_bytes(content)
+    shards = shard_offsets(str(path), n)
+    assert len(shards) <= n
+    assert shards[0][0] == 0 and shards[-1][1] == len(content)
+    for (_, end), (start, _) in zip(shards, shards[1:]):
+        assert end == start and content[start - 1:start] == b"\n"
+    assert all(start < end for start, end in shards) or content == b""
@@ -0,0 +1,100 @@
+import os
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+from hyphenator import trie
+
+DATA_DIR = os.path.join(SCRIPTS_DIR, "..", "data", "is", "hyphenation-is")
+PATTERNS = os.path.join(DATA_DIR, "hyph_is.pat")
+# prefixes, full patterns, hyphenation marks inside, letters not in the alphabet
+QUERIES = ["", ".", ".a", "a", "a1", "ab", "a-b", "--", "xyzzy", "q", "þ", "ð", ".ö", "é", "5", "a3b"]
+
+
+def read_patterns(path: str):
+    with open(path) as f:
+        return [line.strip() for line in f]
+
+
+def same_structure(reference: trie.Trie, compiled: trie.CompiledTrie):
+    """
+    Walk both tries side by side and compare outputs and transitions of all states
+    :return: number of compared states
+    """
+    stack = [(reference.start(), compiled.start())]
+    states = 0
+    while stack:
+        node, state = stack.pop()
+        states += 1
+        assert compiled.output_at(state) == reference.output_at(node)
+        children = dict(compiled.children(state))
+        assert sorted(children) == sorted(letter for letter, _ in reference.children(node))
+        for letter, child in reference.children(node):
+            assert compiled.step(state, letter) == children[letter]
+            stack.append((child, children[letter]))
+    return states
+
+
+@pytest.fixture(scope="module")
+def reference():
+    patterns = trie.Trie()
+    patterns.populate(PATTERNS)
+    return patterns
+
+
+@pytest.fixture(scope="module", params=["from_file", "from_trie", "from_patterns"])
+def compiled(request, reference):
+    if request.param == "from_file":
+        return trie.CompiledTrie.from_file(PATTERNS)
+    if request.param == "from_trie":
+        return trie.CompiledTrie.from_trie(reference)
+    return trie.CompiledTrie.from_patterns(dict(trie.split_pattern(p, "12345678") for p in read_patterns(PATTERNS)))
+
+
+def test_same_structure(reference, compiled):
+    assert same_structure(reference, compiled) > len(read_patterns(PATTERNS))
+
+
+def test_find_patterns(reference, compiled):
+    for pattern in read_patterns(PATTERNS):
+        letters, output = trie.split_pattern(pattern, "12345678")
+        # header lines of the file (UTF-8, ...) are read as patterns, their marks are letters
+        assert compiled.find(letters, "") == reference.find(letters, "") == output, pattern
+        # every proper prefix is found as well, with or without output
+        assert compiled.find(letters[:-1], "") == reference.find(letters[:-1], ""), pattern
+
+
+@pytest.mark.parametrize("word", QUERIES)
+def test_find_queries(reference, compiled, word):
+    assert compiled.find(word) == reference.find(word)
+    assert compiled.find(word, ignore="") == reference.find(word, ignore="")
+
+
+def test_step_outside_alphabet(compiled):
+    assert compiled.step(compiled.start(), "€") is None
+    assert compiled.step(compiled.start(), "") is None
+
+
+def test_small_tries():
+    cases = [[], ["a1"], ["1a", "a1b", "b2c", ".a3b4c5."], ["b1", "a1", "2c", "ab1c", "abcd3", "ca1"]]
+    for patterns in cases:
+        reference = trie.Trie()
+        for pattern in patterns:
+            reference.insert(pattern)
+        for compiled in (trie.CompiledTrie.from_trie(reference),
+                         trie.CompiledTrie.from_patterns(dict(trie.split_pattern(p) for p in patterns))):
+            same_structure(reference, compiled)
+
+
+def test_duplicate_pattern_stops_reading(tmp_path):
+    # Trie.populate stops at the first pattern whose output was already set, compiled trie does the same
+    wordlist = tmp_path / "dup.pat"
+    wordlist.write_text("a1b\n2ab\nc1d\n")
+    reference = trie.Trie()
+    reference.populate(str(wordlist))
+    compiled = trie.CompiledTrie.from_file(str(wordlist))
+    same_structure(reference, compiled)
+    assert compiled.find("cd") is None
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+from hyphenator.hyphenator import Hyphenator
+from train_test import Validator
+
+DATA_DIR = os.path.join(SCRIPTS_DIR, "..", "data", "is", "hyphenation-is")
+# repeated, adjacent, leading and trailing marks
+FIXTURE = ["hest-ar-nir", "hest--arnir", "hes-t-arnir", "h-e-s-t", "-hestar", "hestar-", "hestar--", "--hestar",
+           "a--b", "ab", "a", "-", "--", "", "aaað-eins", "aach---en"]
+
+
+def baseline_counts(hyphenator: Hyphenator, test):
+    """
+    Counts of the original Validator.validate_patterns, walking correct and predicted hyphenations side by side
+    """
+    mark = hyphenator.hyphenation_mark
+    good, bad, missed = 0, 0, 0
+    for correct in test:
+        correct = correct.strip()
+        hyphenated = hyphenator.hyphenate(correct)
+        i_corr, i_hyph = 0, 0
+        while i_corr < len(correct) and i_hyph < len(hyphenated):
+            if correct[i_corr] == mark and hyphenated[i_hyph] == mark:
+                good += 1
+                i_hyph += 1
+                i_corr += 1
+            elif hyphenated[i_hyph] == mark:
+                bad += 1
+                i_hyph += 1
+            elif correct[i_corr] == mark:
+                missed += 1
+                i_corr += 1
+            else:
+                i_hyph += 1
+                i_corr += 1
+    return good, bad, missed
+
+
+@pytest.fixture(scope="module")
+def hyphenator():
+    return Hyphenator(os.path.join(DATA_DIR, "hyph_is.pat"), right_hyphen_min=2, engine="automaton")
+
+
+@pytest.mark.parametrize("word", FIXTURE)
+def test_count_hyphens_word(hyphenator, word):
+    assert Validator.count_hyphens(hyphenator, [word + "\n"]) == baseline_counts(hyphenator, [word])
+
+
+def test_count_hyphens_fixture(hyphenator):
+    assert Validator.count_hyphens(hyphenator, FIXTURE) == baseline_counts(hyphenator, FIXTURE) == (5, 7, 13)
+
+
+def test_count_hyphens_word_list(hyphenator):
+    with open(os.path.join(DATA_DIR, "hyph_is_list.wlh")) as wl:
+        words = [line for i, line in enumerate(wl) if i % 100 == 0]
+    assert Validator.count_hyphens(hyphenator, words) == baseline_counts(hyphenator, words)